@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+from server import FIXTURES, SITES, Fixtures, MockServer
+
+try:
+    import resource
+except ImportError:         # not available on Windows, peak memory is not reported there
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = Path(__file__).parent / "results"
+
+### benchmark settings ###
+"""Every site is benchmarked in its own processes (the projects use the same module names),
+parse benchmarks run once per parser backend, end-to-end benchmarks once per concurrency level."""
+
+CRITERIA = {
+    "housing": ["wtorny", "warszawa", 36],
+    "cars": "audi",
+    "job_offers": "backend",
+}
+WORKERS = (1, 4, 16)
+COMMANDS = {"housing": "housing", "cars": "cars", "job_offers": "jobs"}
+STARTUP_TARGET = 0.5        # seconds from starting the interpreter to a scraper ready to send requests
+
+
+### parse throughput ###
+def extractors(site: str, offer: bytes, results: bytes) -> dict:
+    """Function returns the benchmarked extractors of a site, as functions without arguments.
+    Extractors working on parsed documents get the document parsed in advance."""
+
+    import functions
+    from scraper.parsers import parse_html
+
+    document = parse_html(offer)
+    cases = {"parse_html": lambda: parse_html(offer)}
+
+    if site == "housing":
+        listing = functions.LISTING
+        listings = parse_html(results).find_all(listing.element, class_=listing.class_)
+        cases["extract_detailed_info"] = lambda: functions.extract_detailed_info(document)
+        cases["listings"] = lambda: [(functions.extract_main_info(item), functions.extract_location_info(item),
+                                      functions.get_offer_url(item)) for item in listings]
+    elif site == "cars":
+        listings = parse_html(results).find_all("div", class_="ooa-1nvnpye e1b25f6f5")
+        cases["extract_table_info"] = lambda: functions.extract_table_info(document)
+        cases["extract_price"] = lambda: functions.extract_price(document)
+        cases["listings"] = lambda: [functions.extract_offer_url(item) for item in listings]
+    else:
+        cases["gather_all_info"] = lambda: functions.gather_all_info(document)
+
+    cases["parse_offer_page"] = lambda: functions.parse_offer_page(offer)
+    if hasattr(functions, "parse_offer_json"):
+        cases["parse_offer_json"] = lambda: functions.parse_offer_json(offer)
+
+    # real pages saved with record.py
+    for path in sorted((FIXTURES / site / "recorded").glob("*.html")):
+        content = path.read_bytes()
+        cases[f"parse_offer_page[{path.stem}]"] = lambda content=content: functions.parse_offer_page(content)
+    return cases
+
+
+def measure(function, min_time: float, repeat: int) -> dict:
+    """Function times given function the way timeit does: the number of loops is calibrated,
+    so one round takes at least min_time seconds, then the best and median of repeat rounds are reported"""
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    rounds = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        rounds.append((time.perf_counter() - start) / loops)
+
+    median = statistics.median(rounds)
+    return {"value": 1 / median, "unit": "ops/s", "median_ms": median * 1000, "best_ms": min(rounds) * 1000,
+            "loops": loops, "rounds": repeat}
+
+
+def parse_benchmarks(site: str, args: argparse.Namespace) -> list[dict]:
+    import scraper.parsers as parsers
+
+    fixtures = Fixtures(site, pages=1, listings_per_page=args.listings)
+    offer, results = fixtures.offer_page("oferta-1"), fixtures.results_page(1)
+
+    measurements = []
+    for backend in parsers.BACKENDS:
+        try:
+            parsers.set_backend(backend)
+            cases = extractors(site, offer, results)
+        except (ImportError, ValueError):
+            continue        # backend library is not installed
+        for name, function in cases.items():
+            result = measure(function, args.min_time, args.repeat)
+            measurements.append({"site": site, "name": f"parse:{backend}:{name}", **result})
+    return measurements
+
+
+### end-to-end throughput ###
+def route_session(session, site: str, server: MockServer) -> None:
+    """Function mounts an adapter sending requests for the site host to the mock server
+    (keeping the retry policy and pool size of the adapter it replaces), the rest of the scraper -
+    urls, host scheduler, cache keys - still sees the original urls"""
+
+    from requests.adapters import HTTPAdapter
+
+    class RedirectAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            parts = urlsplit(request.url)
+            request.url = urlunsplit(("http", urlsplit(server.url).netloc, parts.path, parts.query, ""))
+            return super().send(request, **kwargs)
+
+    host = SITES[site]["host"]
+    current = session.get_adapter(f"https://{host}/")
+    session.mount(f"https://{host}", RedirectAdapter(pool_connections=current._pool_connections,
+                                                     pool_maxsize=current._pool_maxsize,
+                                                     max_retries=current.max_retries))
+
+
+def count_rows(file_name: str) -> int:
+    with open(file_name, encoding="utf8", newline="") as file:
+        return max(0, sum(1 for _ in csv.reader(file)) - 1)
+
+
+def peak_memory() -> dict:
+    """Peak resident memory of the benchmark process and of its largest child (parser process), in MiB"""
+    if resource is None:
+        return {}
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024       # ru_maxrss is in bytes on macOS, KiB elsewhere
+    return {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+
+def end_to_end_benchmark(site: str, workers: int, args: argparse.Namespace) -> list[dict]:
+    """Function runs download_data of a site against the mock server. Host limits are lifted
+    to the benchmarked concurrency level, so the result shows what the scraper itself can do."""
+
+    import functions
+    import scraper.session as session
+    from scraper.limiter import SCHEDULER, HostPolicy
+    from scraper.metrics import METRICS
+
+    SCHEDULER.configure(SITES[site]["host"], HostPolicy(rate=10_000.0, max_in_flight=workers,
+                                                        initial_in_flight=workers, latency_target=60.0))
+
+    with MockServer(site, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    pages=args.pages, listings_per_page=args.listings, seed=args.seed) as server, \
+         tempfile.TemporaryDirectory() as directory:
+        route_session(session.SESSION, site, server)
+        file_name = os.path.join(directory, "benchmark.csv")
+
+        # extraction engine is chosen only by the sites having more than one
+        options = {"engine": args.engine} if hasattr(functions, "ENGINES") else {}
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            functions.download_data(file_name, CRITERIA[site], args.pages, workers=workers,
+                                    parse_workers=args.parse_workers, **options)
+        elapsed = time.perf_counter() - start
+        records = count_rows(file_name)
+
+    # time spent in every stage of the scraper, to see where the time goes
+    stages = {stage: {"count": stats["count"], "p50": stats["p50"], "p95": stats["p95"], "sum": stats["sum"]}
+              for stage, stats in METRICS.summary()["stages"].items()}
+    return [{"site": site, "name": f"e2e:workers={workers}", "value": records / elapsed, "unit": "records/s",
+             "records": records, "seconds": elapsed, **peak_memory(), "stages": stages}]
+
+
+### cold start ###
+def startup_benchmark(site: str, args: argparse.Namespace) -> list[dict]:
+    """Function measures cold start of the command line interface - python -m scraper --dry-run imports
+    everything the scraper needs before its first request and exits. Every run is a fresh interpreter,
+    the result is the median of the runs (scheduled scrapes are short, so they pay this time every run)."""
+
+    command = [sys.executable, "-m", "scraper", COMMANDS[site], "--dry-run"]
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            raise RuntimeError(f"Benchmark {site} startup has failed:\n{process.stderr}")
+    return [{"site": site, "name": "startup:dry-run", "value": statistics.median(timings), "unit": "s",
+             "target": args.startup_target}]
+
+
+### runner ###
+def run_case(site: str, case: str, args: argparse.Namespace, workers: int | None = None) -> list[dict]:
+    """Function runs a single benchmark case in a fresh interpreter (started in the project directory),
+    so cases do not share imported modules, warmed up caches or peak memory"""
+
+    command = [sys.executable, str(Path(__file__).resolve()), "--case", case, "--sites", site]
+    command += settings_arguments(args)
+    if workers is not None:
+        command += ["--workers", str(workers)]
+    environment = {**os.environ, "TQDM_DISABLE": "1"}
+    process = subprocess.run(command, cwd=ROOT / site, env=environment, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Benchmark {site} {case} has failed:\n{process.stderr}")
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def settings_arguments(args: argparse.Namespace) -> list[str]:
+    return ["--pages", str(args.pages), "--listings", str(args.listings), "--latency", str(args.latency),
+            "--jitter", str(args.jitter), "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+            "--parse-workers", str(args.parse_workers), "--engine", args.engine, "--min-time", str(args.min_time),
+            "--repeat", str(args.repeat)]
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> list[str]:
+    """Function returns descriptions of the results that are worse than the baseline by more than tolerance
+    (lower throughput, longer startup or higher peak memory)"""
+
+    previous = {(result["site"], result["name"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["site"], result["name"]))
+        if old is None:
+            continue
+        if result["unit"] == "s":
+            if result["value"] > old["value"] * (1 + tolerance):
+                regressions.append(f"{result['site']} {result['name']}: {result['value']:.3f} s "
+                                   f"(baseline {old['value']:.3f})")
+        elif result["value"] < old["value"] * (1 - tolerance):
+            regressions.append(f"{result['site']} {result['name']}: {result['value']:.1f} {result['unit']} "
+                               f"(baseline {old['value']:.1f})")
+        if "peak_rss_mb" in result and "peak_rss_mb" in old and \
+                result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{result['site']} {result['name']}: peak memory {result['peak_rss_mb']:.1f} MiB "
+                               f"(baseline {old['peak_rss_mb']:.1f})")
+    return regressions
+
+
+def summary(report: dict) -> str:
+    lines = [f"{'site':<12}{'benchmark':<52}{'result':>22}{'peak memory':>16}"]
+    for result in report["results"]:
+        memory = f"{result['peak_rss_mb']:.1f} MiB" if "peak_rss_mb" in result else ""
+        lines.append(f"{result['site']:<12}{result['name']:<52}{result['value']:>12.1f} {result['unit']:<9}"
+                     f"{memory:>16}")
+    return "\n".join(lines)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scraper benchmarks: parse throughput of the extractors, "
+                                                 "end-to-end records / sec against a local mock server "
+                                                 "and peak memory")
+    parser.add_argument("--sites", nargs="+", choices=SITES, default=list(SITES))
+    parser.add_argument("--workers", nargs="+", type=int, default=list(WORKERS),
+                        help="concurrency levels of the end-to-end benchmarks")
+    parser.add_argument("--pages", type=int, default=5, help="result pages scraped in end-to-end benchmarks")
+    parser.add_argument("--listings", type=int, default=36, help="offers on a result page")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server response time (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="standard deviation of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parser processes in end-to-end benchmarks (0 - parsing in the main process)")
+    parser.add_argument("--engine", choices=("html", "json"), default="html",
+                        help="extraction engine of cars and job offers in end-to-end benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimal duration of a parse benchmark round")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds of every parse benchmark")
+    parser.add_argument("--skip-parse", action="store_true")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--startup-target", type=float, default=STARTUP_TARGET,
+                        help="maximal cold start time of the command line interface (seconds)")
+    parser.add_argument("--output", help="report file (default: benchmarks/results/<date>.json)")
+    parser.add_argument("--compare", help="baseline report, exit code is 1 when any result is worse")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative difference from the baseline")
+    parser.add_argument("--case", choices=("parse", "e2e"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    # single case, run by the runner in the project directory
+    if args.case is not None:
+        site = args.sites[0]
+        sys.path[:0] = [str(ROOT / site), str(ROOT)]
+        if args.case == "parse":
+            results = parse_benchmarks(site, args)
+        else:
+            results = end_to_end_benchmark(site, args.workers[0], args)
+        print(json.dumps(results))
+        sys.exit(0)
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"),
+              "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                          "processor": platform.processor(), "cpus": os.cpu_count()},
+              "settings": {key: value for key, value in vars(args).items() if key not in ("case", "output", "compare")},
+              "results": []}
+
+    for site in args.sites:
+        if not args.skip_parse:
+            report["results"] += run_case(site, "parse", args)
+        if not args.skip_e2e:
+            for workers in args.workers:
+                report["results"] += run_case(site, "e2e", args, workers)
+        if not args.skip_startup:
+            report["results"] += startup_benchmark(site, args)
+
+    print(summary(report))
+
+    output = Path(args.output) if args.output else RESULTS / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf8")
+    print(f"\nReport saved to: {output}")
+
+    # startup has an absolute target, regardless of the baseline
+    slow = [f"{result['site']} startup: {result['value']:.3f} s (target {result['target']:.3f})"
+            for result in report["results"] if "target" in result and result["value"] > result["target"]]
+    if slow:
+        print("\nSlow startup:\n" + "\n".join(slow))
+
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text(encoding="utf8")), report, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions")
+    if slow:
+        sys.exit(1)
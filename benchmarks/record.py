@@ -0,0 +1,27 @@
+import argparse
+import hashlib
+import sys
+from pathlib import Path
+from server import FIXTURES, SITES
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+if __name__ == "__main__":
+
+    # saves real offer pages as fixtures, parse benchmarks run every recorded page
+    # (synthetic templates in fixtures/<site> only follow the selectors, real pages show real costs)
+    parser = argparse.ArgumentParser(description="Records real offer pages as benchmark fixtures")
+    parser.add_argument("site", choices=SITES)
+    parser.add_argument("urls", nargs="+", help="offer page urls")
+    args = parser.parse_args()
+
+    sys.path[:0] = [str(ROOT / args.site), str(ROOT)]
+    from functions import download_offer_page
+
+    directory = FIXTURES / args.site / "recorded"
+    directory.mkdir(exist_ok=True)
+    for url in args.urls:
+        path = directory / f"offer_{hashlib.sha1(url.encode()).hexdigest()[:10]}.html"
+        path.write_bytes(download_offer_page(url))
+        print(f"{url} -> {path}")
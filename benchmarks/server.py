@@ -0,0 +1,164 @@
+import argparse
+import gzip
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+### mocked sites ###
+"""Every site is served from its fixtures directory: results.html is a result page template
+(listings are rendered from listing.html), offer.html is an offer page template.
+Path prefix of the request decides which of them is served, the first matching prefix wins."""
+
+SITES = {
+    "housing": {"host": "www.otodom.pl", "routes": (("/pl/oferta/", "offer"), ("/pl/oferty/", "results"))},
+    "cars": {"host": "www.otomoto.pl", "routes": (("/osobowe/oferta/", "offer"), ("/osobowe/", "results"))},
+    "job_offers": {"host": "nofluffjobs.com", "routes": (("/pl/job/", "offer"), ("/pl/", "results"))},
+}
+
+OFFER_NUMBER = re.compile(r"oferta-(\d+)")
+
+
+class Fixtures:
+    """Renders pages of one site. Result pages up to number of pages contain listings_per_page
+    listings with unique offer urls, the next result pages are empty (end of results)."""
+
+    def __init__(self, site: str, pages: int = 10, listings_per_page: int = 36):
+        directory = FIXTURES / site
+        self.results = Template((directory / "results.html").read_text(encoding="utf8"))
+        self.listing = Template((directory / "listing.html").read_text(encoding="utf8"))
+        self.offer = Template((directory / "offer.html").read_text(encoding="utf8"))
+        self.pages = pages
+        self.listings_per_page = listings_per_page
+
+    def results_page(self, page: int) -> bytes:
+        listings = ""
+        if page <= self.pages:
+            listings = "\n".join(self.listing.substitute(page=page, n=n, id=f"{page:03d}{n:02d}")
+                                 for n in range(1, self.listings_per_page + 1))
+        return self.results.substitute(page=page, listings=listings).encode("utf8")
+
+    def offer_page(self, path: str) -> bytes:
+        match = OFFER_NUMBER.search(path)
+        return self.offer.substitute(n=match.group(1) if match else 1).encode("utf8")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: "MockServer"
+    protocol_version = "HTTP/1.1"       # keep-alive connections, the same as the real sites
+
+    def do_GET(self) -> None:
+        server = self.server
+        server.delay()
+        if server.fail():
+            self.respond(503, b"", "text/plain")
+            return
+
+        parts = urlsplit(self.path)
+        for prefix, kind in SITES[server.site]["routes"]:
+            if parts.path.startswith(prefix):
+                break
+        else:
+            self.respond(404, b"Not found", "text/plain")
+            return
+
+        if kind == "results":
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+            body = server.fixtures.results_page(page)
+        else:
+            body = server.fixtures.offer_page(parts.path)
+
+        if server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            self.respond(200, gzip.compress(body, compresslevel=5), "text/html; charset=utf-8", encoding="gzip")
+        else:
+            self.respond(200, body, "text/html; charset=utf-8")
+
+    def respond(self, status: int, body: bytes, content_type: str, encoding: str | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        if status == 503:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    """Local stand-in of a scraped site. Every response is delayed by latency (seconds,
+    normally distributed with jitter standard deviation) and error_rate of the requests
+    get 503 responses. Random numbers are seeded, so the runs are reproducible."""
+
+    daemon_threads = True
+
+    def __init__(self, site: str, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 pages: int = 10, listings_per_page: int = 36, compress: bool = True, seed: int = 0,
+                 port: int = 0):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.site = site
+        self.fixtures = Fixtures(site, pages, listings_per_page)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> None:
+        with self.lock:
+            latency = max(0.0, self.random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+
+    # the server can be started on its own, e.g. to try the scrapers against it by hand
+    parser = argparse.ArgumentParser(description="Local stand-in of a scraped site")
+    parser.add_argument("site", choices=SITES)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+
+    server = MockServer(args.site, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        pages=args.pages, port=args.port)
+    print(f"Serving {args.site} ({SITES[args.site]['host']}) fixtures at {server.url}")
+    server.serve_forever()
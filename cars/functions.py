@@ -1,11 +1,16 @@
+import os
+import sys
+import time
+from functools import partial
 from dataclasses import dataclass
 from email import generator
-from bs4 import BeautifulSoup
-from bs4 import ResultSet, Tag
-import requests
-from csv import writer
-from numpy import nan
-from tqdm import tqdm
+from scraper.session import get_page
+from scraper.parsers import parse_html, next_data, dig, Node
+from scraper.pipeline import Pipeline
+from scraper.sinks import Column, open_sink
+from scraper.frontier import Frontier, Task
+from scraper.metrics import timed
+from scraper import driver
 
 
 @dataclass(slots=True)
@@ -15,27 +20,70 @@ class SearchCriteria:
     def generate_url(self, page_number=1) -> str:
         url = f"https://www.otomoto.pl/osobowe/{self.brand}?page={page_number}"
         return url   
+
+
+# missing values (the same as numpy nan, numpy is not needed for it)
+nan = float("nan")
+
+# columns of the offer data parsed from the offer pages
+OFFER_COLUMNS = ['Cena', 'Marka pojazdu', 'Model pojazdu', 'Wersja', 
+                 'Rok produkcji', 'Przebieg', 'Rodzaj paliwa', 'Moc', 
+                 'Skrzynia biegów', 'Napęd', 'Spalanie W Mieście', 'Stan']
+# typed columns of the output files (and of the merged file), url of the offer page is the key of the offer
+# (deduplication of merged files, versions of offers in the sqlite history store)
+OUTPUT_COLUMNS = [Column(name) for name in OFFER_COLUMNS] + [Column("url")]
+KEY = "url"
+
+
+# scraped car offer, fields follow the columns of the output file (Cena, Marka pojazdu, ..., url),
+# missing values are nan
+@dataclass(slots=True)
+class Offer:
+    price: str | float
+    brand: str | float
+    model: str | float
+    version: str | float
+    year: str | float
+    mileage: str | float
+    fuel_type: str | float
+    power: str | float
+    gearbox: str | float
+    drive: str | float
+    city_consumption: str | float
+    condition: str | float
+    url: str = ""
     
+    def row(self) -> list:
+        return [self.price, self.brand, self.model, self.version, self.year, self.mileage, self.fuel_type,
+                self.power, self.gearbox, self.drive, self.city_consumption, self.condition, self.url]
     
-def get_all_page_listings(url: SearchCriteria) -> ResultSet:
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, "lxml")
+    
+@timed()
+def get_all_page_listings(url: SearchCriteria) -> list[Node]:
+    page = get_page(url)
+    soup = parse_html(page.content)
     listings = soup.find_all("div", class_="ooa-1nvnpye e1b25f6f5")
     return listings
 
 
-def extract_offer_url(list_item: Tag) -> str:
+def extract_offer_url(list_item: Node) -> str:
     offer_link = list_item.find('a', href=True)['href'] 
     return offer_link
 
 
-def offer_page_content(url: str) -> BeautifulSoup:
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, "lxml")
+def download_offer_page(url: str) -> bytes:
+    page = get_page(url)
+    return page.content
+
+
+@timed()
+def offer_page_content(url: str) -> Node:
+    soup = parse_html(download_offer_page(url))
     return soup
 
 
-def extract_table_info(offer_soup: BeautifulSoup) -> dict:
+@timed()
+def extract_table_info(offer_soup: Node) -> dict:
     listings = offer_soup.find_all("li", class_="offer-params__item")
     
     categories = [i.find("span", class_="offer-params__label").text for i in listings]
@@ -45,21 +93,19 @@ def extract_table_info(offer_soup: BeautifulSoup) -> dict:
     return offer_dictionary
 
 
-def extract_price(offer_soup: BeautifulSoup) -> dict:
+@timed()
+def extract_price(offer_soup: Node) -> dict:
     price = offer_soup.find("span", class_="offer-price__number")
     price_cleaned = price.text.strip().replace(" ", "")
     return {"Cena": price_cleaned}
 
 
+@timed()
 def gather_offer_data(price: dict, offer_details:dict) -> list:
     all_offer_data = {**price, **offer_details}
     
-    selected_columns = ['Cena', 'Marka pojazdu', 'Model pojazdu', 'Wersja', 
-               'Rok produkcji', 'Przebieg', 'Rodzaj paliwa', 'Moc', 
-               'Skrzynia biegów', 'Napęd', 'Spalanie W Mieście', 'Stan']
-    
     offer_data_list = []
-    for key in selected_columns:
+    for key in OFFER_COLUMNS:
         try: 
             offer_data_list.append(all_offer_data[key])
         except KeyError: 
@@ -67,47 +113,150 @@ def gather_offer_data(price: dict, offer_details:dict) -> list:
     return offer_data_list
 
 
+# runs in parser worker processes, takes raw page and returns a ready csv row
+@timed()
+def parse_offer_page(content: bytes) -> list:
+    offer_soup = parse_html(content)
+    offer_details = extract_table_info(offer_soup)
+    price = extract_price(offer_soup)
+    return gather_offer_data(price, offer_details)
+
+
+# json engine - offer data is read from the advert embedded in __NEXT_DATA__ json instead of 
+# the css classes of the page (no html tree is built), details are matched by their labels 
+# (the same as the column names) or by their keys, pages without the json are parsed as html
+ADVERT = ("props", "pageProps", "advert")
+
+DETAIL_KEYS = {"make": "Marka pojazdu", "model": "Model pojazdu", "version": "Wersja", 
+               "year": "Rok produkcji", "mileage": "Przebieg", "fuel_type": "Rodzaj paliwa", 
+               "engine_power": "Moc", "gearbox": "Skrzynia biegów", "transmission": "Napęd", 
+               "urban_consumption": "Spalanie W Mieście", "new_used": "Stan"}
+
+
+def extract_advert_details(advert: dict) -> dict:
+    offer_dictionary = {}
+    for detail in dig(advert, "details", default=[]):
+        label = dig(detail, "label") or DETAIL_KEYS.get(dig(detail, "key"))
+        value = dig(detail, "value")
+        if label is not None and value is not None:
+            offer_dictionary[label] = str(value).strip()
+    return offer_dictionary
+
+
+def extract_advert_price(advert: dict) -> dict:
+    value = dig(advert, "price", "value")
+    if value is None:
+        return {}
+    currency = dig(advert, "price", "currency", default="")
+    return {"Cena": f"{value}{currency}".replace(" ", "").replace(u"\xa0", "")}
+
+
+# runs in parser worker processes, the json counterpart of parse_offer_page
+@timed()
+def parse_offer_json(content: bytes) -> list:
+    advert = dig(next_data(content), *ADVERT)
+    if not isinstance(advert, dict):
+        return parse_offer_page(content)
+    return gather_offer_data(extract_advert_price(advert), extract_advert_details(advert))
+
+
+ENGINES = {"html": parse_offer_page, "json": parse_offer_json}
+
+
 def generate_url_list(criteria: SearchCriteria, pages: int) -> generator: 
     url_list = (criteria.generate_url(i) for i in list(range(1, pages+1)))
     return url_list
 
 
-def download_data(file_name: str, search_criteria: str, number_of_pages: str) -> None:
+# urls of the result pages of a search (search criteria is a brand)
+def search_pages(search_criteria: str, number_of_pages: int) -> generator:
+    return generate_url_list(criteria=SearchCriteria(search_criteria), pages=number_of_pages)
 
-    with open(file_name, 'w', encoding='utf8', newline='') as f:
-        thewriter = writer(f)
 
-        header = ['Cena', 'Marka pojazdu', 'Model pojazdu', 'Wersja', 
-                  'Rok produkcji', 'Przebieg', 'Rodzaj paliwa', 'Moc', 
-                  'Skrzynia biegów', 'Napęd', 'Spalanie W Mieście', 'Stan']
-        thewriter.writerow(header)
-        
-        print(f"\nFile: {file_name} has been created.\n")
+# offer urls of a result page, car listings carry no offer data (it is read from the offer pages)
+def page_offers(page_url: str, health: None = None) -> list[tuple[str, None]]:
+    return [(extract_offer_url(offer), None) for offer in get_all_page_listings(page_url)]
 
-        search = SearchCriteria(search_criteria)
-        search_pages = generate_url_list(criteria=search, pages=number_of_pages)
-        
-        page_num = 1
-        for page_url in search_pages:
-            offer_list = get_all_page_listings(page_url)
-            
-            num_results = len(offer_list)
-            print(f"Adding page {page_num} content >>>")
-            page_num += 1
-            
-            pbar = tqdm(total=num_results)
-            
-            for offer in offer_list:
-                offer_link = extract_offer_url(offer)
 
-                offer_soup = offer_page_content(offer_link)
-                offer_details = extract_table_info(offer_soup)
-                price = extract_price(offer_soup)
+# record of an offer from the row parsed from its page
+def offer_record(offer_url: str, listing_info: None, offer_data: list, health: None = None) -> Offer:
+    return Offer(*offer_data, url=offer_url)
+
+
+# result pages are walked, offer pages downloaded and records written by the driver shared by the projects
+# (see scraper/driver.py), bound to this module:
+# scrape_offers(search_criteria, number_of_pages, ...) yields (result page url, Offer) pairs,
+# iter_offers / aiter_offers - public lazy (and async) api yielding Offer records of given brand,
+# download_data(file_name, search_criteria, number_of_pages, ...) writes the offers to the file
+SITE = sys.modules[__name__]
+scrape_offers = partial(driver.scrape_offers, SITE)
+iter_offers = partial(driver.iter_offers, SITE)
+aiter_offers = partial(driver.aiter_offers, SITE)
+download_data = partial(driver.download_data, SITE)
+
 
-                all_offer_data = gather_offer_data(price, offer_details)
+# distributed crawl - result pages are queued in a frontier shared by many workers (see frontier.py),
+# returns the number of newly queued pages
+def seed_frontier(frontier: Frontier, search_criteria: str, number_of_pages: int) -> int:
+    return frontier.add(Task("page", url) for url in search_pages(search_criteria, number_of_pages))
 
-                thewriter.writerow(all_offer_data)
-                
-                pbar.update()
-                
-            pbar.close()
\ No newline at end of file
+
+# runs one worker of a distributed crawl: leases batches of urls from the shared frontier until it is finished,
+# offers of leased result pages are queued back to the frontier, leased offer pages are downloaded and parsed
+# by the pipeline (the same as in download_data) and written to the worker's own file (shard, see 
+# frontier.shard_name), offers are acknowledged only once their rows are flushed to the shard and failed urls
+# are given back for a retry, workers may run as processes or on different hosts (with unique names),
+# returns the number of written rows
+def crawl_worker(frontier: Frontier, file_name: str, worker: str, workers: int = 8, 
+                 parse_workers: int | None = None, engine: str = "html", batch_size: int = 32, 
+                 lease_seconds: float = 300.0, poll_interval: float = 5.0) -> int:
+    
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown extraction engine: {engine}, available engines: {list(ENGINES)}")
+    append = os.path.exists(file_name) and os.path.getsize(file_name) > 0
+    written = 0
+    
+    with Pipeline(download_offer_page, ENGINES[engine], io_workers=workers, parse_workers=parse_workers) as pipeline, \
+         open_sink(file_name, OUTPUT_COLUMNS, append=append, key=KEY) as sink:
+        
+        pending = []
+        
+        def commit() -> None:
+            frontier.ack(worker, pending)
+            pending.clear()
+        
+        sink.on_flush = commit
+        
+        while True:
+            tasks = frontier.lease(worker, batch_size, lease_seconds)
+            if not tasks:
+                if frontier.finished():
+                    break
+                # other workers still hold leases, they are either finished or requeued when they expire
+                time.sleep(poll_interval)
+                continue
+            
+            for task in (task for task in tasks if task.kind == "page"):
+                try:
+                    offer_urls = [extract_offer_url(offer) for offer in get_all_page_listings(task.url)]
+                except Exception as error:
+                    print(f"\nResult page {task.url} has failed: {error!r}\n")
+                    frontier.fail(worker, [task.url])
+                    continue
+                frontier.add(Task("offer", url) for url in offer_urls)
+                frontier.ack(worker, [task.url])
+            
+            offers = [task for task in tasks if task.kind == "offer"]
+            for task, offer_data in pipeline.run(offers, key=lambda task: task.url, return_exceptions=True):
+                if isinstance(offer_data, Exception):
+                    # only the failed offer is given back for a retry, the rest of the batch is kept
+                    print(f"\nOffer {task.url} has failed: {offer_data!r}\n")
+                    frontier.fail(worker, [task.url])
+                    continue
+                sink.write(offer_data + [task.url])
+                pending.append(task.url)
+                written += 1
+            # rows are flushed (and acknowledged) after every batch, long before their leases expire
+            sink.flush()
+    
+    return written
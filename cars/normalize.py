@@ -0,0 +1,49 @@
+import sys
+from functools import partial
+from typing import Iterable, Iterator
+import pandas as pd
+from scraper.normalize import normalize_frame, normalize_records, normalize_csv, to_number
+
+### normalization ###
+"""Scraped values are raw texts ("89900PLN", "148 000 km", "190 KM", "6,8 l/100km"). Normalization turns
+them into typed numeric columns with vectorized pandas string operations (see scraper/normalize.py),
+this module describes only the typed columns of car offers."""
+
+CURRENCY = r"([A-Z]{3}|zł|€)"
+CURRENCIES = {"zł": "PLN", "€": "EUR"}
+
+
+def to_currency(column: pd.Series) -> pd.Series:
+    currency = column.astype("string").str.extract(CURRENCY, expand=False)
+    return currency.replace(CURRENCIES).astype("string")
+
+
+# typed columns added to the frames of scraped offers: price, currency, year of production,
+# mileage in km, power in hp and city fuel consumption in l/100km
+TYPED_COLUMNS = {
+    "price_value": lambda frame: to_number(frame["Cena"]),
+    "price_currency": lambda frame: to_currency(frame["Cena"]),
+    "year": lambda frame: to_number(frame["Rok produkcji"]).astype("Int64"),
+    "mileage_km": lambda frame: to_number(frame["Przebieg"]),
+    "power_hp": lambda frame: to_number(frame["Moc"]).astype("Int64"),
+    "city_consumption_l_100km": lambda frame: to_number(frame["Spalanie W Mieście"]),
+}
+
+# normalize(frame) adds the typed columns to a frame of scraped offers (columns of the output file),
+# normalize_file(source, destination) normalizes csv file chunk by chunk, returns the number of rows
+normalize = partial(normalize_frame, TYPED_COLUMNS)
+normalize_file = partial(normalize_csv, TYPED_COLUMNS)
+
+
+# pipeline step - groups Offer records (e.g. from iter_offers) into frames of batch_size rows
+# and yields them normalized
+def normalize_offers(offers: Iterable, batch_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    from functions import OUTPUT_COLUMNS
+    return normalize_records(TYPED_COLUMNS, OUTPUT_COLUMNS, offers, batch_size)
+
+
+if __name__ == '__main__':
+
+    # python normalize.py cars.csv cars_normalized.csv
+    source, destination = sys.argv[1], sys.argv[2]
+    print(f"Normalized rows: {normalize_file(source, destination)}")
@@ -7,10 +7,33 @@ CITIES = ["warszawa", "lodz", "krakow", "poznan",
 
 @dataclass
 class CssStyle:
-    """Css element types."""
-    element: str
-    class_: str
+    """Css element types. Elements can be also selected by other attributes (e.g. data-cy), 
+    fallbacks are alternative styles used when no element matches the style itself."""
+    element: str | None
+    class_: str | None = None
+    attrs: dict | None = None
+    fallbacks: tuple["CssStyle", ...] = ()
     
+    def candidates(self) -> list["CssStyle"]:
+        return [self, *self.fallbacks]
+    
+    def find(self, node, fallback: bool = True):
+        """Method finds the first element matching the style or (fallback=True) the first matching fallback"""
+        for style in self.candidates() if fallback else [self]:
+            found = node.find(style.element, class_=style.class_, **(style.attrs or {}))
+            if found is not None:
+                return found
+        return None
+    
+    def find_all(self, node, fallback: bool = True) -> list:
+        """Method finds all elements matching the style or (fallback=True) the first matching fallback"""
+        for style in self.candidates() if fallback else [self]:
+            found = node.find_all(style.element, class_=style.class_, **(style.attrs or {}))
+            if found:
+                return found
+        return []
+    
+
 class MarketType:
     """Market types.""" 
     PRIMARY = "pierwotny"
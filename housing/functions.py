@@ -1,50 +1,115 @@
-from bs4 import BeautifulSoup
-from bs4 import ResultSet, Tag
-import requests
+import json
+import os
+import sys
+import time
+from functools import partial
+from dataclasses import dataclass, fields
+from scraper.session import get_page
+from scraper.parsers import parse_html, next_data, dig, Node
 from elements import CssStyle, SearchCriteria
-from csv import writer
-from tqdm import tqdm
-import pandas as pd
+from health import SelectorHealth
+from scraper.pipeline import Pipeline
+from scraper.sinks import Column, open_sink
+from scraper.merge import StreamingMerger
+from scraper.frontier import Frontier, Task
+from errors import HtmlElementNotFoundError
+from scraper.metrics import timed
+from scraper import driver
 
 ### defining css properties ### 
 """otodom.pl website changes frequently. This means the structure of html is modified, 
 and therefore its necessary to change CSS element descriptions. Defining these elements at the beginnig
-allows quicker adjustments"""
+allows quicker adjustments. Fallbacks select the elements by data-cy / data-testid attributes 
+or by a part of their classes, they are used when the main classes stop matching (see health.py)"""
 
-LISTING = CssStyle("li", "css-p74l73 es62z2j17")
-TITLE = CssStyle("div", "css-jeloly es62z2j12")
-PRICE = CssStyle("span", "css-rmqm02 eclomwz0")
-LOCATION = CssStyle("span", "css-17o293g es62z2j9")
-GRID = CssStyle("div", "css-1qzszy5 estckra8")
+LISTING = CssStyle("li", "css-p74l73 es62z2j17", 
+                   fallbacks=(CssStyle(None, attrs={"data-cy": "listing-item"}),))
+TITLE = CssStyle("div", "css-jeloly es62z2j12", 
+                 fallbacks=(CssStyle(None, attrs={"data-cy": "listing-item-title"}),))
+PRICE = CssStyle("span", "css-rmqm02 eclomwz0", 
+                 fallbacks=(CssStyle(None, attrs={"data-testid": "listing-item-price"}), CssStyle("span", "css-rmqm02")))
+LOCATION = CssStyle("span", "css-17o293g es62z2j9", 
+                    fallbacks=(CssStyle(None, attrs={"data-testid": "advert-card-address"}), CssStyle("span", "css-17o293g")))
+GRID = CssStyle("div", "css-1qzszy5 estckra8", fallbacks=(CssStyle("div", "css-1qzszy5"),))
+
+SELECTORS = {"listing": LISTING, "title": TITLE, "price": PRICE, "location": LOCATION, "grid": GRID}
+
+
+### offer record ###
+@dataclass(slots=True)
+class Offer:
+    """Scraped housing offer. Fields follow the columns of the output file, 
+    url of the offer page is kept in the record only. Missing values are "NA"."""
+    id: str
+    title: str
+    price: str
+    city: str
+    district: str
+    street: str
+    area: str
+    rooms: str
+    rent: str
+    floor: str
+    year: str
+    balcony: str
+    garage: str
+    elevator: str
+    furnishing: str
+    extra_info: str
+    seller_type: str
+    market: str
+    ownership: str
+    url: str = ""
+    
+    def row(self) -> list:
+        """Values of the record in the order of the output file columns"""
+        return [getattr(self, name) for name in OFFER_COLUMNS]
+
+
+OFFER_COLUMNS = [field.name for field in fields(Offer) if field.name != "url"]
+# typed columns of the output files (and of the merged file), id is the key of the offer
+# (deduplication of merged files, versions of offers in the sqlite history store)
+OUTPUT_COLUMNS = [Column(name) for name in OFFER_COLUMNS]
+KEY = "id"
 
 
 ### webscrapper functions ###
-def get_all_page_listings(url: str) -> ResultSet:
+def find_text(node: Node, name: str, health: SelectorHealth | None = None) -> str:
+    """Function returns text of the element of given field (see SELECTORS) or "NA" when it is not found.
+    Lookups are counted by the selector health monitor, if there is one"""
+    element = SELECTORS[name].find(node) if health is None else health.find(name, node)
+    return "NA" if element is None else element.text
+
+
+@timed()
+def get_all_page_listings(url: str, health: SelectorHealth | None = None) -> list[Node]:
     """Function scrapes data from otodom.pl and gathers html code containing
     list of offers on given result page"""
     
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, "lxml")
-    listings = soup.find_all(LISTING.element, class_=LISTING.class_)
+    page = get_page(url)
+    soup = parse_html(page.content)
+    listings = LISTING.find_all(soup) if health is None else health.find_all("listing", soup)
     return listings
 
 
-def extract_main_info(list_element: Tag) -> dict:
+@timed()
+def extract_main_info(list_element: Node, health: SelectorHealth | None = None) -> dict:
     """Function extracts main info from a list element 
     (that is a part of all listings on given page). Returning dict with title and price"""
     
-    title = list_element.find(TITLE.element, class_=TITLE.class_).text
-    price = list_element.find(PRICE.element, class_=PRICE.class_).text
+    title = find_text(list_element, "title", health)
+    price = find_text(list_element, "price", health)
     main_info = {"Tytuł": title, "Cena": price}
     return main_info
 
 
-def extract_location_info(list_element: Tag) -> dict:
+@timed()
+def extract_location_info(list_element: Node, health: SelectorHealth | None = None) -> dict:
     """Functions finds listings's location. Location elements such as 
     city, district and street are separated by coma. Location_info function
     extracts each element and stores the values in dictionary"""
     
-    location = list_element.find(LOCATION.element, class_=LOCATION.class_).text
+    location = find_text(list_element, "location", health)
     location_split = location.split(",")
     
     # try-except structere is required becouse 
@@ -62,7 +127,103 @@ def extract_location_info(list_element: Tag) -> dict:
     return location_info
 
 
-def get_offer_url(list_element: Tag) -> str:
+### listing-only (shallow) mode ###
+"""Result pages embed the data of all their listings in __NEXT_DATA__ json. In shallow mode rows
+are built from result pages only - one request per result page instead of one per offer, details 
+available only on offer pages (year of construction, balcony, elevator etc.) are left as "NA".
+Values are formatted the same way as on the offer pages. The json may change with any site release, 
+so every key is optional and result pages without the json fall back to the css listing elements."""
+
+LISTING_ITEMS = (("props", "pageProps", "data", "searchAds", "items"), 
+                 ("props", "pageProps", "searchAds", "items"))
+
+ROOMS = {"ONE": "1", "TWO": "2", "THREE": "3", "FOUR": "4", "FIVE": "5", 
+         "SIX": "6", "SEVEN": "7", "EIGHT": "8", "NINE": "9", "TEN": "10", "MORE": "więcej niż 10"}
+
+FLOORS = {"CELLAR": "suterena", "GROUND": "parter", "FIRST": "1", "SECOND": "2", "THIRD": "3", 
+          "FOURTH": "4", "FIFTH": "5", "SIXTH": "6", "SEVENTH": "7", "EIGHTH": "8", "NINTH": "9", 
+          "TENTH": "10", "ABOVE_TENTH": "> 10", "GARRET": "poddasze"}
+
+CURRENCIES = {"PLN": "zł", "EUR": "€", "USD": "$"}
+
+
+def format_amount(amount: dict | None) -> str | None:
+    """Function formats json amount ({"value": 650000, "currency": "PLN"}) as displayed on the site (650 000 zł)"""
+    value = dig(amount, "value")
+    if value is None:
+        return None
+    currency = dig(amount, "currency", default="PLN")
+    text = f"{value:,.0f}".replace(",", " ") if isinstance(value, (int, float)) else str(value)
+    return f"{text} {CURRENCIES.get(currency, currency)}"
+
+
+def format_area(area) -> str | None:
+    if not isinstance(area, (int, float)):
+        return None
+    return f"{area:g} m²".replace(".", ",")
+
+
+def listing_item_info(item: dict) -> tuple[str, tuple] | None:
+    """Function maps a listing from __NEXT_DATA__ json to offer url and listing info 
+    (main info, location info, offer id and detailed info) with the same keys as in the full mode"""
+    
+    slug = dig(item, "slug")
+    if not isinstance(slug, str):
+        return None
+    offer_url = f"https://www.otodom.pl/pl/oferta/{slug}"
+    
+    main_info = {"Tytuł": dig(item, "title", default="NA"), 
+                 "Cena": format_amount(dig(item, "totalPrice")) or "Zapytaj o cenę"}
+    
+    address = dig(item, "location", "address", default={})
+    street = " ".join(str(part) for part in (dig(address, "street", "name"), dig(address, "street", "number")) if part)
+    districts = [dig(location, "name") or dig(location, "fullName") 
+                 for location in dig(item, "location", "reverseGeocoding", "locations", default=[])
+                 if dig(location, "locationLevel") == "district"]
+    location_info = {"Miasto": dig(address, "city", "name", default="NA"), 
+                     "Dzielnica": districts[0] if districts and districts[0] else "NA", 
+                     "Ulica": street or "NA"}
+    
+    rooms, floor = dig(item, "roomsNumber"), dig(item, "floorNumber")
+    if dig(item, "isPrivateOwner") is True:
+        seller_type = "prywatny"
+    elif dig(item, "agency") is not None:
+        seller_type = "biuro nieruchomości"
+    else:
+        seller_type = None
+    details = {"Powierzchnia": format_area(dig(item, "areaInSquareMeters")),
+               "Liczba pokoi": ROOMS.get(rooms, str(rooms)) if rooms is not None else None,
+               "Piętro": FLOORS.get(floor, str(floor)) if floor is not None else None,
+               "Czynsz": format_amount(dig(item, "rentPrice")),
+               "Typ ogłoszeniodawcy": seller_type}
+    detailed_info = {key: value for key, value in details.items() if value is not None}
+    
+    return offer_url, (main_info, location_info, generate_offer_id(offer_url), detailed_info)
+
+
+@timed()
+def get_listing_data(url: str, health: SelectorHealth | None = None) -> list[tuple[str, tuple]]:
+    """Function downloads a result page and returns (offer url, listing info) of all its listings,
+    read from __NEXT_DATA__ json or, when the page has no json, from the css listing elements"""
+    
+    content = get_page(url).content
+    data = next_data(content)
+    for path in LISTING_ITEMS:
+        items = dig(data, *path)
+        if isinstance(items, list):
+            return [info for info in map(listing_item_info, items) if info is not None]
+    
+    soup = parse_html(content)
+    offers = []
+    for listing in LISTING.find_all(soup) if health is None else health.find_all("listing", soup):
+        offer_url = get_offer_url(listing)
+        listing_info = (extract_main_info(listing, health), extract_location_info(listing, health), 
+                        generate_offer_id(offer_url), {})
+        offers.append((offer_url, listing_info))
+    return offers
+
+
+def get_offer_url(list_element: Node) -> str:
     """Function extracts the link form particular listing, allowing the programme 
     to acess additional info. """
     
@@ -77,19 +238,37 @@ def generate_offer_id(offer_url: str) -> str:
     return {"ID": offer_url[-7:]}
 
 
-def get_offer_page_content(offer_url: str) -> BeautifulSoup:
+def download_offer_page(offer_url: str) -> bytes:
+    """Function downloads raw html code of specific offer page"""
+    offer_page = get_page(offer_url)
+    return offer_page.content
+
+
+@timed()
+def get_offer_page_content(offer_url: str) -> Node:
     """Function acesses html code of specific offer page"""
-    offer_page = requests.get(offer_url)
-    offer_soup = BeautifulSoup(offer_page.content, 'html.parser')
+    offer_soup = parse_html(download_offer_page(offer_url))
     return offer_soup
 
 
-def extract_detailed_info(offer_soup: ResultSet) -> dict:
+@timed()
+def parse_offer_page(offer_content: bytes) -> dict:
+    """Function parses raw offer page and extracts detailed info. 
+    It runs in parser worker processes, so it has to take and return picklable objects"""
+    return extract_detailed_info(parse_html(offer_content))
+
+
+# parse functions of the offer pages by extraction engine name
+ENGINES = {"html": parse_offer_page}
+
+
+@timed()
+def extract_detailed_info(offer_soup: Node) -> dict:
     """Function extracts data form grid and table layout on specific offer page.
     Then cateory and values are appended to appropriate lists. The last step is matching
     category - value pairs in a dictionary format"""
     
-    grid = offer_soup.find_all(GRID.element, class_=GRID.class_)
+    grid = GRID.find_all(offer_soup)
     
     categories = [item.text for index, item in enumerate(grid) if index % 2 == 0]
     values = [item.text for index, item in enumerate(grid) if index % 2 != 0]
@@ -98,6 +277,7 @@ def extract_detailed_info(offer_soup: ResultSet) -> dict:
     return offer_data
     
     
+@timed()
 def gather_offer_data(main_info: dict, location_info: dict, detailed_info: dict, id: dict) -> list: 
     """Function is responsible for gathering all the data. Try-except structure is required 
     to ensure there are no errors when information about specific category is not provided on the offer page. 
@@ -127,62 +307,156 @@ def generate_url_list(criteria: SearchCriteria, pages: int) -> list:
     url_list = [criteria.generate_url(i) for i in list(range(1, pages + 1))]
     return url_list    
 
-def download_data(file_name: str, search_criteria: list, number_of_pages: str) -> None:
-    """Functions is implementation-ready web scraper, combining all the assets described above. 
-    Creates a csv file with downloaded offer data records, filtered by provided search_criteria.
-    User can specify the number of result pages to scrape."""
-    
-    with open(file_name, 'w', encoding='utf8', newline='') as f:
-        thewriter = writer(f)
+def search_pages(search_criteria: list, number_of_pages: int) -> list:
+    """Function returns urls of the result pages matching search_criteria ([market type, city, limit])"""
+    search = SearchCriteria(search_criteria[0], search_criteria[1], search_criteria[2])
+    return generate_url_list(criteria=search, pages=number_of_pages)
+
+
+def page_offers(page_url: str, health: SelectorHealth | None = None) -> list[tuple[str, tuple]]:
+    """Function returns (offer url, listing info) of all the listings of a result page. Listing info is
+    (main info, location info, offer id, None), details are read from the offer page"""
+    offers = []
+    for listing in get_all_page_listings(page_url, health):
+        offer_url = get_offer_url(listing)
+        listing_info = (extract_main_info(listing, health), extract_location_info(listing, health),
+                        generate_offer_id(offer_url), None)
+        offers.append((offer_url, listing_info))
+    return offers
+
+
+def shallow_page_offers(page_url: str, health: SelectorHealth | None = None) -> list[tuple[str, tuple]]:
+    """Function returns (offer url, listing info) of all the listings of a result page in shallow mode,
+    listing info contains the details available on the result page (see get_listing_data)"""
+    return get_listing_data(page_url, health)
+
+
+def offer_record(offer_url: str, listing_info: tuple, detailed_info: dict | None,
+                 health: SelectorHealth | None = None) -> Offer:
+    """Function builds the record of an offer from its listing info and the details parsed from
+    the offer page (None in shallow mode - the details of the listing are used). Offer pages are parsed 
+    in parser processes, so only the result of their grid lookup is counted by the health monitor"""
+    main_info, location_info, offer_id, listing_details = listing_info
+    if detailed_info is None:
+        detailed_info = listing_details
+    elif health is not None:
+        health.observe("grid", bool(detailed_info))
+    return Offer(*gather_offer_data(main_info, location_info, detailed_info, offer_id), url=offer_url)
+
+
+def seen_key(offer_url: str) -> str:
+    """Offers are tracked in the seen index (incremental mode) by their id"""
+    return generate_offer_id(offer_url)["ID"]
+
+
+def selector_health() -> SelectorHealth:
+    """Function creates the monitor of the css selectors used during one run (see health.py). 
+    HtmlElementNotFoundError is raised as soon as the selectors stop matching."""
+    return SelectorHealth(SELECTORS)
 
-        header = ["id", "title", "price", "city", "district", "street", 
-                  "area", "rooms", "rent", "floor", "year", 
-                  "balcony", "garage", "elevator", "furnishing", "extra_info",
-                  "seller_type", "market", "ownership"]
-        thewriter.writerow(header)
-        
-        print(f"\nFile: {file_name} has been created.\n")
 
-        search = SearchCriteria(search_criteria[0], search_criteria[1], search_criteria[2])
-        search_pages = generate_url_list(criteria=search, pages=number_of_pages)
+### scraping ###
+"""Result pages are walked, offer pages downloaded and records written by the driver shared 
+by the projects (see scraper/driver.py), bound to this module:
+scrape_offers(search_criteria, number_of_pages, ...) yields (result page url, Offer) pairs,
+iter_offers / aiter_offers - public lazy (and async) api yielding Offer records matching search_criteria,
+download_data(file_name, search_criteria, number_of_pages, ...) writes the offers to the file,
+shallow=True builds rows from result pages only (no offer pages are downloaded, see get_listing_data), 
+which is enough for e.g. price tracking."""
+
+SITE = sys.modules[__name__]
+scrape_offers = partial(driver.scrape_offers, SITE)
+iter_offers = partial(driver.iter_offers, SITE)
+aiter_offers = partial(driver.aiter_offers, SITE)
+download_data = partial(driver.download_data, SITE)
+
+
+### distributed crawl ###
+def seed_frontier(frontier: Frontier, search_criteria: list, number_of_pages: int) -> int:
+    """Function queues result pages matching search_criteria in the frontier (see frontier.py),
+    returns the number of newly queued pages"""
+    return frontier.add(Task("page", url) for url in search_pages(search_criteria, number_of_pages))
+
+
+def process_result_page(frontier: Frontier, page_url: str, health: SelectorHealth) -> None:
+    """Function queues offers of a leased result page, with their listing info as the payload"""
+    frontier.add(Task("offer", offer_url, json.dumps(listing_info[:3], ensure_ascii=False))
+                 for offer_url, listing_info in page_offers(page_url, health))
+    health.page_done()
+
+
+def crawl_worker(frontier: Frontier, file_name: str, worker: str, workers: int = 8, 
+                 parse_workers: int | None = None, batch_size: int = 32, lease_seconds: float = 300.0,
+                 poll_interval: float = 5.0) -> int:
+    """Function runs one worker of a distributed crawl: it leases batches of urls from the shared frontier
+    until the frontier is finished, offers of leased result pages are queued back to the frontier,
+    leased offer pages are downloaded and parsed by the pipeline (the same as in download_data) 
+    and written to the worker's own file (shard, see frontier.shard_name). Offers are acknowledged 
+    only once their rows are flushed to the shard, failed urls are given back for a retry. 
+    Workers may run as processes or on different hosts, worker names have to be unique.
+    Returns the number of written rows."""
+    
+    health = SelectorHealth(SELECTORS)
+    append = os.path.exists(file_name) and os.path.getsize(file_name) > 0
+    written = 0
+    
+    with Pipeline(download_offer_page, parse_offer_page, io_workers=workers, parse_workers=parse_workers) as pipeline, \
+         open_sink(file_name, OUTPUT_COLUMNS, append=append, key=KEY) as sink:
         
-        page_num = 1
-        for page_url in search_pages:
-            offer_list = get_all_page_listings(page_url)
-            
-            num_results = len(offer_list)
-            print(f"Adding page {page_num} content >>>")
-            page_num += 1
+        pending = []
+        
+        def commit() -> None:
+            frontier.ack(worker, pending)
+            pending.clear()
+        
+        sink.on_flush = commit
+        
+        while True:
+            tasks = frontier.lease(worker, batch_size, lease_seconds)
+            if not tasks:
+                if frontier.finished():
+                    break
+                # other workers still hold leases, they are either finished or requeued when they expire
+                time.sleep(poll_interval)
+                continue
             
-            pbar = tqdm(total=num_results)
+            for task in (task for task in tasks if task.kind == "page"):
+                try:
+                    process_result_page(frontier, task.url, health)
+                except HtmlElementNotFoundError:
+                    raise
+                except Exception as error:
+                    print(f"\nResult page {task.url} has failed: {error!r}\n")
+                    frontier.fail(worker, [task.url])
+                    continue
+                frontier.ack(worker, [task.url])
             
-            for offer in offer_list:
-                main_info = extract_main_info(offer)
-                location_info = extract_location_info(offer)
-
-                # offer link + id 
-                offer_url = get_offer_url(offer)
-                offer_id = generate_offer_id(offer_url)
-
-                # accessing offer data
-                offer_soup = get_offer_page_content(offer_url)
-                detailed_info = extract_detailed_info(offer_soup)
-
-                # all info
-                all_info = gather_offer_data(main_info, location_info, detailed_info, offer_id)
-
-                # add data to csv
-                thewriter.writerow(all_info)
-                
-                pbar.update()
-                
-            pbar.close()
+            offers = [task for task in tasks if task.kind == "offer"]
+            for task, detailed_info in pipeline.run(offers, key=lambda task: task.url, return_exceptions=True):
+                if isinstance(detailed_info, HtmlElementNotFoundError):
+                    raise detailed_info
+                if isinstance(detailed_info, Exception):
+                    # only the failed offer is given back for a retry, the rest of the batch is kept
+                    print(f"\nOffer {task.url} has failed: {detailed_info!r}\n")
+                    frontier.fail(worker, [task.url])
+                    continue
+                health.observe("grid", bool(detailed_info))
+                main_info, location_info, offer_id = json.loads(task.payload)
+                sink.write(gather_offer_data(main_info, location_info, detailed_info, offer_id))
+                pending.append(task.url)
+                written += 1
+            # rows are flushed (and acknowledged) after every batch, long before their leases expire
+            sink.flush()
+    
+    return written
+
             
-def merge_files(file_format: str, file_identicators: list[str], name: str) -> None:
-    """Merges all the separate files. Creates new csv file containing all the data."""
+def merge_files(file_format: str, file_identicators: list[str], name: str, extension: str = "csv") -> None:
+    """Merges all the separate files. Creates new file containing all the data (csv by default).
+    Files are streamed row by row, offers repeated in several files are written only once (by ID)."""
     try: 
-        dataframes = [pd.read_csv(f"{file_format}_{i}.csv") for i in file_identicators]
-        all_data = pd.concat(dataframes).reset_index()
-        all_data.to_csv(f"{name}.csv")
+        with StreamingMerger(f"{name}.{extension}", key=KEY) as merger:
+            for i in file_identicators:
+                merger.add(f"{file_format}_{i}.csv")
     except FileNotFoundError:
-        print("Wrong file_format or file_identificators have been provided")    
\ No newline at end of file
+        print("Wrong file_format or file_identificators have been provided")
\ No newline at end of file
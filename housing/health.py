@@ -0,0 +1,99 @@
+import threading
+from elements import CssStyle
+from errors import HtmlElementNotFoundError
+
+### selector health ###
+"""Css classes of otodom.pl change often and outdated selectors do not fail loudly - the scraper keeps
+downloading pages which give "NA" rows. During the first result pages of a run every lookup is counted,
+once a field has enough lookups its hit rate is checked: the selector matching the most elements
+(the main one or one of its fallbacks) is tried first from then on, and when even the best selector
+matches less than min_hit_rate of the elements the run is aborted with HtmlElementNotFoundError,
+so a broken run costs a few requests instead of the whole crawl."""
+
+
+class SelectorHealth:
+    """Per field hit rates of the selectors used during one run (thread-safe).
+    Fields are checked once - after min_checks lookups or at the end of the sampled result pages."""
+
+    def __init__(self, selectors: dict[str, CssStyle], sample_pages: int = 3, min_hit_rate: float = 0.5,
+                 min_checks: int = 20, abort: bool = True):
+        self.selectors = {name: style.candidates() for name, style in selectors.items()}
+        self.order = {name: list(range(len(candidates))) for name, candidates in self.selectors.items()}
+        self.hits = {name: [0] * len(candidates) for name, candidates in self.selectors.items()}
+        self.checks = dict.fromkeys(selectors, 0)
+        self.checked: set[str] = set()
+        self.pages = 0
+        self.sample_pages = sample_pages
+        self.min_hit_rate = min_hit_rate
+        self.min_checks = min_checks
+        self.abort = abort
+        self.lock = threading.Lock()
+
+    def find(self, name: str, node):
+        """Finds the element of the field, trying the selectors in the order of their hit rates"""
+        for index in self.order[name]:
+            found = self.selectors[name][index].find(node, fallback=False)
+            if found is not None:
+                self.observe(name, True, index)
+                return found
+        self.observe(name, False)
+        return None
+
+    def find_all(self, name: str, node) -> list:
+        for index in self.order[name]:
+            found = self.selectors[name][index].find_all(node, fallback=False)
+            if found:
+                self.observe(name, True, index)
+                return found
+        self.observe(name, False)
+        return []
+
+    def observe(self, name: str, hit: bool, index: int = 0) -> None:
+        """Counts one lookup of the field, fields looked up elsewhere (e.g. in parser processes)
+        report only whether their elements were found"""
+        with self.lock:
+            self.checks[name] += 1
+            if hit:
+                self.hits[name][index] += 1
+            ready = name not in self.checked and self.checks[name] >= self.min_checks
+        if ready:
+            self.check(name)
+
+    def page_done(self) -> None:
+        """Called after every result page, the fields are checked at the end of the sampled pages"""
+        with self.lock:
+            self.pages += 1
+            finished = self.pages == self.sample_pages
+        if finished:
+            self.finish()
+
+    def finish(self) -> None:
+        """Checks all the fields looked up so far (e.g. when there are fewer result pages than sample_pages)"""
+        for name in self.selectors:
+            self.check(name)
+
+    def check(self, name: str) -> None:
+        with self.lock:
+            if name in self.checked or not self.checks[name]:
+                return
+            self.checked.add(name)
+            hits, checks = self.hits[name], self.checks[name]
+            best = max(range(len(hits)), key=hits.__getitem__)
+            switched = best != self.order[name][0] and hits[best] > 0
+            if switched:
+                self.order[name] = [best] + [index for index in self.order[name] if index != best]
+            hit_rate = sum(hits) / checks
+
+        if switched:
+            print(f"\nSelector of {name} is outdated, switched to fallback: {self.selectors[name][best]}\n")
+        if hit_rate < self.min_hit_rate:
+            message = (f"Selectors of {name} matched {hit_rate:.0%} of {checks} elements "
+                       f"(expected at least {self.min_hit_rate:.0%}), css classes have probably changed")
+            if self.abort:
+                raise HtmlElementNotFoundError(message)
+            print(f"\n{message}\n")
+
+    def report(self) -> str:
+        with self.lock:
+            return "\n".join(f"{name}: {sum(hits) / self.checks[name]:.0%} of {self.checks[name]} lookups"
+                             for name, hits in self.hits.items() if self.checks[name])
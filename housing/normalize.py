@@ -0,0 +1,64 @@
+import sys
+from functools import partial
+from typing import Iterable, Iterator
+import pandas as pd
+from scraper.normalize import normalize_frame, normalize_records, normalize_csv, to_number
+
+### normalization ###
+"""Scraped values are raw texts ("650 000 zł", "54,2 m²", "2/4"). Normalization turns them into typed
+numeric columns with vectorized pandas string operations (see scraper/normalize.py),
+this module describes only the typed columns of housing offers."""
+
+CURRENCY = r"(zł|PLN|€|EUR|\$|USD)"
+CURRENCIES = {"zł": "PLN", "PLN": "PLN", "€": "EUR", "EUR": "EUR", "$": "USD", "USD": "USD"}
+FLOORS = {"suterena": -1, "parter": 0}
+
+
+def to_currency(column: pd.Series) -> pd.Series:
+    return column.astype("string").str.extract(CURRENCY, expand=False).map(CURRENCIES).astype("string")
+
+
+def floor_number(column: pd.Series) -> pd.Series:
+    """Function turns floors into numbers (parter = 0, suterena = -1, "2/4" -> 2)"""
+    floor = column.astype("string").str.strip().str.lower()
+    named_floors = floor.str.extract(f"^({'|'.join(FLOORS)})", expand=False).map(FLOORS).astype("float64")
+    return named_floors.fillna(to_number(floor)).astype("Int64")
+
+
+def year_built(column: pd.Series) -> pd.Series:
+    """Function extracts years of construction, implausible years become NA"""
+    year = to_number(column)
+    return year.where(year.between(1000, 2100)).astype("Int64")
+
+
+# typed columns added to the frames of scraped offers: price, currency, area, price per m²,
+# rent, number of rooms, floor and year of construction
+TYPED_COLUMNS = {
+    "price_value": lambda frame: to_number(frame["price"]),
+    "price_currency": lambda frame: to_currency(frame["price"]),
+    "area_m2": lambda frame: to_number(frame["area"]),
+    "price_per_m2": lambda frame: (frame["price_value"] / frame["area_m2"]).round(2),
+    "rent_value": lambda frame: to_number(frame["rent"]),
+    "rooms_count": lambda frame: to_number(frame["rooms"]).astype("Int64"),
+    "floor_number": lambda frame: floor_number(frame["floor"]),
+    "year_built": lambda frame: year_built(frame["year"]),
+}
+
+# normalize(frame) adds the typed columns to a frame of scraped offers (columns of the output file),
+# normalize_file(source, destination) normalizes csv file chunk by chunk and returns the number of rows
+normalize = partial(normalize_frame, TYPED_COLUMNS)
+normalize_file = partial(normalize_csv, TYPED_COLUMNS)
+
+
+def normalize_offers(offers: Iterable, batch_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    """Pipeline step - function groups Offer records (e.g. from iter_offers) into frames of batch_size
+    rows and yields them normalized"""
+    from functions import OUTPUT_COLUMNS
+    return normalize_records(TYPED_COLUMNS, OUTPUT_COLUMNS, offers, batch_size)
+
+
+if __name__ == '__main__':
+
+    # python normalize.py ALL_DATA.csv ALL_DATA_normalized.csv
+    source, destination = sys.argv[1], sys.argv[2]
+    print(f"Normalized rows: {normalize_file(source, destination)}")
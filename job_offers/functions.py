@@ -1,197 +1,244 @@
+import re
+import sys
+import html
+from functools import partial
 from dataclasses import dataclass
-from bs4 import BeautifulSoup
-from bs4 import ResultSet, Tag
 from elements import SearchCriteria
-import requests
-from csv import writer
-from numpy import nan
-from tqdm import tqdm
+from scraper.session import get_page
+from scraper.parsers import parse_html, script_content, load_json, dig, Node
+from schema import Schema, Field, Selector
+from scraper.sinks import Column
+from scraper.metrics import timed
+from scraper import driver
 
 
+@timed()
 def get_all_page_listings(url: str) -> list:
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, "lxml")
+    page = get_page(url)
+    soup = parse_html(page.content)
     listings = soup.find_all('a', href=True)
     
     unedited_links = [j['href'] for i, j in enumerate(listings) if ("job" in j['href']) and (i > 7)]
-    links = [f"https://nofluffjobs.com{link}" for link in unedited_links]
+    # the same offer is linked several times on a page, links are deduplicated keeping their order
+    links = list(dict.fromkeys(f"https://nofluffjobs.com{link}" for link in unedited_links))
     return links
 
-def get_offer_page_content(url: str) -> BeautifulSoup:
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, "lxml")
+def download_offer_page(url: str) -> bytes:
+    page = get_page(url)
+    return page.content
+
+@timed()
+def get_offer_page_content(url: str) -> Node:
+    soup = parse_html(download_offer_page(url))
     return soup
 
-def extract_position(page_content: BeautifulSoup) -> dict:
-    
-    try:
-        position = page_content.find("h1", class_="font-weight-bold bigger")
-        position_name = position.text.strip()
-    except AttributeError:
-        try:
-            position = page_content.find("h1", class_="font-weight-bold")
-            position_name = position.text.strip()
-        except AttributeError:
-            position_name = "unknown"
-            
-    return {"position": position_name}
-   
-def extract_company(page_content: BeautifulSoup) -> dict:
-    try: 
-        company = page_content.find("a", class_="inline-info d-flex align-items-center text-primary")
-        company_name = company.text.strip()
-    except AttributeError:
-        try:
-            company = page_content.find("a", class_="inline-info d-flex align-items-center")
-            company_name = company.text.strip()
-        except AttributeError:
-            company_name = "Unknown company"
-    
-    return {"company": company_name}
+### offer schema ###
+"""Every column of the output file is described by a Field: elements that contain it, fallback elements
+(used when the main ones are missing), post-processing of the element text and a default value.
+Site redesign only requires changes of this schema."""
 
-def extract_salary(page_content: BeautifulSoup) -> dict:
-    salary = page_content.find_all("h4", class_="mb-0")
-    salary_info = [i.text.strip().replace(" ", "").replace(u"\xa0", u"") for i in salary]
-    
-    return {"salary": salary_info}
-     
-def extract_requirements(page_content: BeautifulSoup) -> dict:
-    requirements = page_content.find_all("common-posting-item-tag")
-    types = page_content.find_all("common-posting-requirements")
-    
-    all_reqs= [i.text.strip() for i in requirements]
-    reqs_by_type = [i.text for i in types]
-    
-    main = [i for i in all_reqs if i in reqs_by_type[0]]
-    
-    length = len(reqs_by_type)
-    if length == 2:
-        secondary = [i for i in all_reqs if i in reqs_by_type[1]]
-    else:
-        secondary = ["No secondary requirements"]
-    
-    return {"requirements_main": main, "requirements_secondary": secondary}
-
-def extract_description(page_content: BeautifulSoup) -> dict:
-    description = page_content.find("nfj-read-more", class_="font-weight-normal")
-    try: 
-        text = description.text
-    except AttributeError:
-        text = "No description"
-        
-    return {"description": text}
-    
-def extract_tasks(page_content: BeautifulSoup) -> dict:
-    tasks_top5 = page_content.find_all("p", class_="d-flex align-items-center mb-0 mb-3")
-    tasks_last = page_content.find("p", class_="d-flex align-items-center mb-0")
-    
-    tasks = [i.text.strip() for i in tasks_top5]
-    
-    try:
-        last_item = tasks_last.text.strip()
-        tasks.append(last_item)
-    except AttributeError:
-        pass
-    
-    return {"tasks": tasks}
+def clean_salary(text: str) -> str:
+    return text.strip().replace(" ", "").replace(u"\xa0", u"")
 
-def extract_specs(page_content: BeautifulSoup) -> dict:
-    specs = page_content.find_all("p", class_="d-inline-flex align-items-center font-size-14 detail mr-10 mb-10")
-    spec_list = [i.text for i in specs]
-    
-    return {"posting_specs": spec_list}
-    
-def extract_methodology(page_content: BeautifulSoup) -> dict:
-    methodologies = page_content.find_all("div", class_="d-flex position-relative font-size-14 mb-10")
-    methodologies_last = page_content.find("div", class_="d-flex position-relative font-size-14")
-    
-    methodologies_list = [i.text.strip() for i in methodologies]
-    try:
-        methodologies_list.append(methodologies_last.text.strip())
-    except AttributeError:
-        pass
-    
-    return {"methodology": methodologies_list}
-    
-def extract_benefits(page_content: BeautifulSoup) -> dict:
-    benefits = page_content.find_all("div", class_="col-sm-6 perk mt-10")
-    benefits_list = [i.text.strip() for i in benefits]
-    
-    return {"benefits": benefits_list}
+OFFER_SCHEMA = Schema([
+    Field("position", (Selector("h1", "font-weight-bold bigger", limit=1),), 
+          fallbacks=(Selector("h1", "font-weight-bold", limit=1),), many=False, default="unknown"),
+    Field("company", (Selector("a", "inline-info d-flex align-items-center text-primary", limit=1),),
+          fallbacks=(Selector("a", "inline-info d-flex align-items-center", limit=1),), many=False, 
+          default="Unknown company"),
+    Field("salary", (Selector("h4", "mb-0"),), process=clean_salary),
+    Field("requirements_main", (Selector("common-posting-item-tag", within="common-posting-requirements", nth=0),)),
+    Field("requirements_secondary", (Selector("common-posting-item-tag", within="common-posting-requirements", nth=1),),
+          default=("No secondary requirements",)),
+    Field("description", (Selector("nfj-read-more", "font-weight-normal", limit=1),), many=False, 
+          process=str, default="No description"),
+    Field("tasks", (Selector("p", "d-flex align-items-center mb-0 mb-3"), 
+                    Selector("p", "d-flex align-items-center mb-0", limit=1))),
+    Field("specs", (Selector("p", "d-inline-flex align-items-center font-size-14 detail mr-10 mb-10"),), process=str),
+    Field("methodology", (Selector("div", "d-flex position-relative font-size-14 mb-10"), 
+                          Selector("div", "d-flex position-relative font-size-14", limit=1))),
+    Field("benefits", (Selector("div", "col-sm-6 perk mt-10"),)),
+    Field("equipment", (Selector("p", "mobile-text mb-0 mt-1 font-size-11 text-center"),)),
+])
+# typed columns of the output files (and of the merged file), url of the offer page is the key of the offer
+# (deduplication of merged files, versions of offers in the sqlite history store)
+OUTPUT_COLUMNS = [Column(field.name, "list" if field.many else "string") for field in OFFER_SCHEMA.fields]
+OUTPUT_COLUMNS.append(Column("url"))
+KEY = "url"
 
-def extract_equipment(page_content: BeautifulSoup) -> dict:
-    equipment = page_content.find_all("p", class_="mobile-text mb-0 mt-1 font-size-11 text-center")
-    equipment_list = [i.text.strip() for i in equipment]
-    
-    return {"equipment": equipment_list}
 
-def gather_all_info(position: dict, company: dict, salary: dict, requirements: dict,
-                    description: dict, tasks: dict, specs: dict, methodology: dict, 
-                    benefits: dict, equipment: dict) -> list: 
-    all_data = position | company | salary | requirements | description | tasks | specs | methodology | \
-        benefits | equipment
-    
-    offer_data_list = []
-    for key in all_data.keys():
-        try: 
-            offer_data_list.append(all_data[key])
-        except KeyError: 
-            offer_data_list.append(nan)
-    return offer_data_list
+# scraped job offer, fields follow the columns of the output file (OFFER_SCHEMA and url of the offer page)
+@dataclass(slots=True)
+class Offer:
+    position: str
+    company: str
+    salary: list[str]
+    requirements_main: list[str]
+    requirements_secondary: list[str]
+    description: str
+    tasks: list[str]
+    specs: list[str]
+    methodology: list[str]
+    benefits: list[str]
+    equipment: list[str]
+    url: str = ""
+    
+    def row(self) -> list:
+        return [getattr(self, name) for name in OFFER_SCHEMA.columns] + [self.url]
+
+
+@timed()
+def gather_all_info(page_content: Node) -> list:
+    offer_data = OFFER_SCHEMA.extract(page_content)
+    return [offer_data[column] for column in OFFER_SCHEMA.columns]
+
+# runs in parser worker processes, takes raw page and returns a ready csv row
+@timed()
+def parse_offer_page(content: bytes) -> list:
+    return gather_all_info(parse_html(content))
+
+### json engine ###
+"""Offer pages embed the state of the site app (serverApp-state script) containing the same posting json
+the frontend gets from the api. The json engine maps the posting to the schema columns without building
+an html tree and without relying on css classes. Columns missing in the posting get their schema defaults,
+pages without the state are parsed as html."""
+
+STATE_ESCAPES = (("&q;", '"'), ("&s;", "'"), ("&l;", "<"), ("&g;", ">"), ("&a;", "&"))
+TAG = re.compile(r"<[^>]+>")
+
+
+def load_app_state(content: bytes) -> dict | None:
+    text = script_content(content, "serverApp-state")
+    if text is None:
+        return None
+    text = text.decode("utf8")
+    # older versions of the app escape the state
+    if text.startswith("{&q;"):
+        for escaped, character in STATE_ESCAPES:
+            text = text.replace(escaped, character)
+    return load_json(text)
+
+
+def find_posting(state) -> dict | None:
+    """The posting is stored under a key made of the api url, so it is found by its content"""
+    stack = [state]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if "title" in value and "requirements" in value:
+                return value
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return None
+
+
+def item_values(items) -> list[str]:
+    """Posting lists contain either strings or objects with value (name) key"""
+    if not isinstance(items, list):
+        return []
+    values = [item if isinstance(item, str) else dig(item, "value") or dig(item, "name") for item in items]
+    return [value.strip() for value in values if isinstance(value, str) and value.strip()]
+
+
+def strip_tags(text) -> str | None:
+    """Description of the posting is html, the html engine takes the text of the element"""
+    if not isinstance(text, str):
+        return None
+    return html.unescape(TAG.sub("", text))
+
+
+def spec_items(posting: dict) -> list[str]:
+    """Specs are shown on the page as "label: value" paragraphs"""
+    specs = dig(posting, "specs", "details")
+    if not isinstance(specs, list):
+        return []
+    return [f"{dig(spec, 'name')}: {dig(spec, 'value')}" for spec in specs
+            if isinstance(spec, dict) and dig(spec, "name") and dig(spec, "value") is not None]
+
+
+def salary_ranges(posting: dict) -> list[str]:
+    salary = dig(posting, "essentials", "originalSalary", default={})
+    currency = dig(salary, "currency", default="")
+    ranges = []
+    for contract in dig(salary, "types", default={}).values():
+        bounds = [f"{bound:.0f}" if isinstance(bound, (int, float)) else str(bound) 
+                  for bound in dig(contract, "range", default=[])]
+        if bounds:
+            ranges.append(clean_salary("–".join(dict.fromkeys(bounds)) + currency))
+    return ranges
+
+
+def equipment_items(posting: dict) -> list[str]:
+    equipment = dig(posting, "benefits", "equipment")
+    if isinstance(equipment, dict):
+        # the page shows only the values (e.g. "Laptop"), keys are internal names
+        return [str(value).strip() for value in equipment.values() if value and isinstance(value, (str, int))]
+    return item_values(equipment)
+
+
+POSTING_FIELDS = {
+    "position": lambda posting: dig(posting, "title"),
+    "company": lambda posting: dig(posting, "company", "name"),
+    "salary": salary_ranges,
+    "requirements_main": lambda posting: item_values(dig(posting, "requirements", "musts")),
+    "requirements_secondary": lambda posting: item_values(dig(posting, "requirements", "nices")),
+    "description": lambda posting: strip_tags(dig(posting, "details", "description") 
+                                              or dig(posting, "requirements", "description")),
+    "tasks": lambda posting: item_values(dig(posting, "specs", "dailyTasks")),
+    "specs": spec_items,
+    "methodology": lambda posting: item_values(dig(posting, "methodology")),
+    "benefits": lambda posting: item_values(dig(posting, "benefits", "benefits")),
+    "equipment": equipment_items,
+}
+
+
+# runs in parser worker processes, the json counterpart of parse_offer_page
+@timed()
+def parse_offer_json(content: bytes) -> list:
+    posting = find_posting(load_app_state(content))
+    if posting is None:
+        return parse_offer_page(content)
+    
+    row = []
+    for field in OFFER_SCHEMA.fields:
+        value = POSTING_FIELDS[field.name](posting) if field.name in POSTING_FIELDS else None
+        if not value:
+            # the same defaults as the html engine gives
+            value = list(field.default) if field.many else field.default
+        row.append(value)
+    return row
+
+
+ENGINES = {"html": parse_offer_page, "json": parse_offer_json}
+
 
 def generate_search_url_list(criteria: SearchCriteria, pages: int) -> list: 
     url_list = (criteria.generate_url(i) for i in list(range(1, pages+1)))
     return url_list
  
-def download_data(file_name: str, search_criteria: str, number_of_pages: str) -> None:
-
-    with open(file_name, 'w', encoding='utf8', newline='') as f:
-        thewriter = writer(f)
-
-        header = ['position', 'company', 'salary', 'requirements_main', 
-                  'requirements_secondary',
-                  'description', 'tasks', 'specs', 'methodology', 
-                  'benefits', 'equipment']
-        thewriter.writerow(header)
-        
-        print(f"\nFile: {file_name} has been created.\n")
-
-        search = SearchCriteria(search_criteria)
-        search_pages = generate_search_url_list(criteria=search, pages=number_of_pages)
-        
-        page_num = 1
-        for page_url in search_pages:
-            offer_url_list = get_all_page_listings(page_url)
-            
-            num_results = len(offer_url_list)
-            print(f"Adding page {page_num} content >>>")
-            page_num += 1
-            
-            pbar = tqdm(total=num_results)
-            
-            for offer in offer_url_list:
-                soup = get_offer_page_content(offer)
-                
-                
-                position = extract_position(soup)
-                company = extract_company(soup)
-                salary = extract_salary(soup)
-                
-                requirements = extract_requirements(soup)
-                description = extract_description(soup)
-                tasks = extract_tasks(soup)
-                
-                specs = extract_specs(soup)
-                methodology = extract_methodology(soup)
-                benefits = extract_benefits(soup)
-                equipment = extract_equipment(soup)
-                
-                all_offer_data = gather_all_info(position, company, salary, requirements,
-                                                 description, tasks, specs, methodology, 
-                                                 benefits, equipment)
-                
-                thewriter.writerow(all_offer_data)
-                
-                pbar.update()
-  
-            pbar.close()
\ No newline at end of file
+# urls of the result pages of a search (search criteria is a job category)
+def search_pages(search_criteria: str, number_of_pages: int) -> list:
+    return generate_search_url_list(criteria=SearchCriteria(search_criteria), pages=number_of_pages)
+
+
+# offer urls of a result page, job listings carry no offer data (it is read from the offer pages)
+def page_offers(page_url: str, health: None = None) -> list[tuple[str, None]]:
+    return [(offer_url, None) for offer_url in get_all_page_listings(page_url)]
+
+
+# record of an offer from the row parsed from its page
+def offer_record(offer_url: str, listing_info: None, offer_data: list, health: None = None) -> Offer:
+    return Offer(*offer_data, url=offer_url)
+
+
+# result pages are walked, offer pages downloaded and records written by the driver shared by the projects
+# (see scraper/driver.py), bound to this module:
+# scrape_offers(search_criteria, number_of_pages, ...) yields (result page url, Offer) pairs,
+# iter_offers / aiter_offers - public lazy (and async) api yielding Offer records of given category,
+# download_data(file_name, search_criteria, number_of_pages, ...) writes the offers to the file
+SITE = sys.modules[__name__]
+scrape_offers = partial(driver.scrape_offers, SITE)
+iter_offers = partial(driver.iter_offers, SITE)
+aiter_offers = partial(driver.aiter_offers, SITE)
+download_data = partial(driver.download_data, SITE)
@@ -0,0 +1,58 @@
+import sys
+from functools import partial
+from typing import Iterable, Iterator
+import pandas as pd
+from scraper.normalize import normalize_frame, normalize_records, normalize_csv
+
+### normalization ###
+"""Salaries are scraped as lists of raw texts, one per contract type (["15000–20000PLN", "12000–16000PLN"]),
+in csv files the lists are stored as their text. Normalization turns them into typed salary_min, salary_max
+and salary_currency columns, parsing the whole column at once with vectorized pandas string operations
+(see scraper/normalize.py), this module describes only the typed columns of job offers."""
+
+SALARY = r"(?P<low>\d+(?:[.,]\d+)?)(?:\s*[–-]\s*(?P<high>\d+(?:[.,]\d+)?))?\s*(?P<currency>[A-Z]{3})"
+
+
+def to_number(column: pd.Series) -> pd.Series:
+    return pd.to_numeric(column.str.replace(",", ".", regex=False), errors="coerce").astype("float64")
+
+
+# salary ranges of every offer: the lowest lower bound, the highest upper bound (single amounts are
+# both) and the currency of the first range, offers without salary get NaN / NA
+def salary_columns(column: pd.Series) -> pd.DataFrame:
+    ranges = column.astype("string").str.replace(r"\s", "", regex=True).str.extractall(SALARY)
+    low = to_number(ranges["low"])
+    high = to_number(ranges["high"]).fillna(low)
+
+    offers = ranges.index.get_level_values(0)
+    salary = pd.DataFrame({"salary_min": low.groupby(offers).min(),
+                           "salary_max": high.groupby(offers).max(),
+                           "salary_currency": ranges["currency"].groupby(offers).first()})
+    salary = salary.reindex(column.index)
+    salary["salary_currency"] = salary["salary_currency"].astype("string")
+    return salary
+
+
+# typed salary columns added to the frames of scraped offers
+TYPED_COLUMNS = {
+    ("salary_min", "salary_max", "salary_currency"): lambda frame: salary_columns(frame["salary"]),
+}
+
+# normalize(frame) adds the typed columns to a frame of scraped offers (columns of the output file),
+# normalize_file(source, destination) normalizes csv file chunk by chunk, returns the number of rows
+normalize = partial(normalize_frame, TYPED_COLUMNS)
+normalize_file = partial(normalize_csv, TYPED_COLUMNS)
+
+
+# pipeline step - groups Offer records (e.g. from iter_offers) into frames of batch_size rows
+# and yields them normalized
+def normalize_offers(offers: Iterable, batch_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    from functions import OUTPUT_COLUMNS
+    return normalize_records(TYPED_COLUMNS, OUTPUT_COLUMNS, offers, batch_size)
+
+
+if __name__ == '__main__':
+
+    # python normalize.py job_offers.csv job_offers_normalized.csv
+    source, destination = sys.argv[1], sys.argv[2]
+    print(f"Normalized rows: {normalize_file(source, destination)}")
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Callable
+from scraper.parsers import walk
+
+
+@dataclass(frozen=True)
+class Selector:
+    element: str
+    class_: str | None = None
+    limit: int | None = None        # None - all matching elements, 1 - only the first one
+    within: str | None = None       # name of an ancestor element the match has to be placed in
+    nth: int = 0                    # which occurrence of the ancestor element (counting from 0)
+
+    def matches(self, class_value: str) -> bool:
+        if self.class_ is None:
+            return True
+        if " " in self.class_:
+            return class_value == self.class_
+        return self.class_ in class_value.split()
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    selectors: tuple[Selector, ...]
+    fallbacks: tuple[Selector, ...] = ()    # used only when none of the selectors matched
+    many: bool = True
+    process: Callable[[str], object] = str.strip
+    default: object = ()
+
+
+class Schema:
+    """Declarative description of offer fields compiled into a single-pass extractor.
+    Selectors are indexed by element name, so the document is walked once and every element
+    is checked only against the selectors that may match it."""
+
+    def __init__(self, fields: list[Field]):
+        self.fields = fields
+        self.columns = [field.name for field in fields]
+        self.scopes = set()
+        self.index: dict[str, list[tuple[int, int, Selector]]] = {}
+
+        for field_number, field in enumerate(fields):
+            for slot, selector in enumerate(field.selectors + field.fallbacks):
+                self.index.setdefault(selector.element, []).append((field_number, slot, selector))
+                if selector.within is not None:
+                    self.scopes.add(selector.within)
+
+    def extract(self, document) -> dict:
+        """Function fills all the fields in one walk over the document"""
+        found = [[[] for _ in field.selectors + field.fallbacks] for field in self.fields]
+        scope_counts = dict.fromkeys(self.scopes, 0)
+        open_scopes = []
+
+        for event, node in walk(document):
+            name = node.name
+            if event == "end":
+                if name in self.scopes:
+                    open_scopes.pop()
+                continue
+
+            if name in self.scopes:
+                open_scopes.append((name, scope_counts[name]))
+                scope_counts[name] += 1
+
+            candidates = self.index.get(name)
+            if candidates is None:
+                continue
+
+            class_value = " ".join(node.get("class") or ())
+            for field_number, slot, selector in candidates:
+                matches = found[field_number][slot]
+                if selector.limit is not None and len(matches) >= selector.limit:
+                    continue
+                if selector.within is not None and (selector.within, selector.nth) not in open_scopes:
+                    continue
+                if selector.matches(class_value):
+                    matches.append(node)
+
+        offer_data = {}
+        for field, matches in zip(self.fields, found):
+            primary = [node for slot in matches[:len(field.selectors)] for node in slot]
+            nodes = primary or [node for slot in matches[len(field.selectors):] for node in slot]
+            values = [field.process(node.text) for node in nodes]
+
+            if not values:
+                offer_data[field.name] = list(field.default) if field.many else field.default
+            else:
+                offer_data[field.name] = values if field.many else values[0]
+        return offer_data
@@ -0,0 +1,3 @@
+"""Modules shared by the scrapers (http session, rate limiter, cache, parsers, pipeline, output sinks, merge,
+orchestrator, metrics, ...) and their command line interface: python -m scraper cars|housing|jobs
+(see __main__.py). Site specific code (extractors, search criteria) stays in the project directories."""
@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+### command line interface ###
+"""python -m scraper cars|housing|jobs --pages N --workers M --format csv
+Every site is a separate project with its own modules (functions, elements, ...), so the project directory
+is put first on the module search path and the project is imported only once the arguments are parsed
+(--help and wrong arguments cost no imports). Heavy dependencies are imported only by the features
+that need them: tqdm by the progress bar, pyarrow by parquet files, pandas by normalize.py."""
+
+SITES = {
+    "cars": {"directory": "cars", "searches": ["audi", "bmw", "volkswagen"], "pages": 2, "output": "TEST_DATA",
+             "engines": True},
+    "housing": {"directory": "housing", "searches": None, "pages": 1, "output": "ALL_DATA", "engines": False},
+    "jobs": {"directory": "job_offers", "searches": ["backend", "frontend", "devops"], "pages": 5,
+             "output": "TEST_DATA", "engines": True},
+}
+FORMATS = ("csv", "csv.gz", "jsonl", "jsonl.gz", "parquet", "sqlite")
+MARKETS = {"primary": "pierwotny", "secondary": "wtorny"}
+
+
+def parse_arguments(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m scraper", description="Downloads offer data of one site: "
+                                     "every search is a separate job, jobs run in parallel and their files are "
+                                     "merged into one dataset")
+    parser.add_argument("site", choices=SITES)
+    parser.add_argument("--search", nargs="+", help="car brands, cities (housing) or job categories "
+                                                    "(default: searches of the site)")
+    parser.add_argument("--market", nargs="+", choices=MARKETS, default=list(MARKETS), help="housing market types")
+    parser.add_argument("--limit", type=int, default=24, help="housing offers on a result page")
+    parser.add_argument("--pages", type=int, help="result pages of every search (default: pages of the site)")
+    parser.add_argument("--workers", type=int, default=8, help="threads downloading offer pages")
+    parser.add_argument("--parse-workers", type=int, help="processes parsing offer pages "
+                                                          "(default: one per CPU core, 0 - main process)")
+    parser.add_argument("--max-jobs", type=int, default=4, help="searches downloaded at the same time")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="format of the merged file")
+    parser.add_argument("--output", help="name of the merged file without extension")
+    parser.add_argument("--engine", choices=("html", "json"), default="html",
+                        help="extraction engine of cars and jobs (json reads the data embedded in the pages)")
+    parser.add_argument("--shallow", action="store_true", help="housing rows from result pages only")
+    parser.add_argument("--cache", metavar="DIR", help="cache responses in DIR (off by default, result pages "
+                                                       "change every few minutes)")
+    parser.add_argument("--cache-ttl", type=float, default=3600, help="seconds cached responses are fresh")
+    parser.add_argument("--offline", action="store_true", help="re-parse cached pages without any requests")
+    parser.add_argument("--prometheus", help="Prometheus textfile the metrics are exported to")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="import the scraper and list the jobs without downloading anything")
+    args = parser.parse_args(argv)
+    if args.offline and args.cache is None:
+        parser.error("--offline requires --cache")
+    return args
+
+
+def search_criteria(args: argparse.Namespace) -> list[tuple[str, object]]:
+    """Function returns (name, search criteria) of every job, criteria are in the form download_data
+    of the site accepts"""
+    settings = SITES[args.site]
+    if args.site != "housing":
+        return [(search, search) for search in args.search or settings["searches"]]
+
+    from elements import CITIES
+    return [(f"{city}_{MARKETS[market]}", [MARKETS[market], city, args.limit])
+            for city in args.search or CITIES for market in args.market]
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_arguments(argv)
+    settings = SITES[args.site]
+    sys.path[:0] = [str(ROOT / settings["directory"]), str(ROOT)]
+
+    start = time.perf_counter()
+    import functions
+    from scraper.orchestrator import Job, run_jobs
+    from scraper.session import use_cache
+    from scraper.cache import ResponseCache
+    from scraper.metrics import METRICS
+
+    # files of the jobs have to be read back by the merge, so they are jsonl for parquet and sqlite output
+    # (jsonl keeps list columns, the merge writes them with the typed columns of the site), sqlite output
+    # is the history store keeping the versions of offers by the key column of the site
+    extension = args.format if args.format not in ("parquet", "sqlite") else "jsonl"
+    pages = args.pages if args.pages is not None else settings["pages"]
+    jobs = [Job(search_criteria=criteria, number_of_pages=pages, file_name=f"d_{name}.{extension}")
+            for name, criteria in search_criteria(args)]
+    merged_file = f"{args.output or settings['output']}.{args.format}"
+
+    if args.dry_run:
+        print(f"{len(jobs)} jobs ({pages} pages each) would be merged into {merged_file}, "
+              f"ready in {time.perf_counter() - start:.3f} s")
+        return 0
+
+    # responses are cached on disk only on request, offline mode re-parses cached pages without any requests
+    if args.cache is not None:
+        use_cache(ResponseCache(args.cache, ttl=args.cache_ttl, offline=args.offline))
+
+    options = {"engine": args.engine} if settings["engines"] else {"shallow": args.shallow}
+    failed = run_jobs(functions, jobs, merged_file=merged_file, key=functions.KEY, max_jobs=args.max_jobs,
+                      workers=args.workers, parse_workers=args.parse_workers, **options)
+    end = time.perf_counter()
+
+    if os.path.exists(merged_file):
+        from performance import performance
+        print(performance(start, end, file_name=merged_file))
+
+    # time spent in every stage (download, parsing, extractors, writes) and per host statistics
+    print(METRICS.report())
+    METRICS.export(json_file=f"{args.output or settings['output']}.metrics.json", prometheus_file=args.prometheus)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
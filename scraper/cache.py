@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+
+class CacheMissError(Exception):
+    def __init__(self, url: str):
+        self.url = url
+        super().__init__(f"{url} is not cached and the cache works in offline (replay only) mode")
+
+
+class ResponseCache:
+    """On-disk cache of response bodies. Bodies are gzip compressed and stored once per content
+    (file name is a sha256 of the body), small json entries map urls to the stored bodies together
+    with ETag / Last-Modified validators. Entries older than ttl are revalidated with a conditional
+    request, least recently used entries are evicted when the cache grows over max_bytes.
+    In offline mode only cached responses are served and nothing is downloaded."""
+
+    def __init__(self, directory: str = ".http_cache", ttl: float = 24 * 3600,
+                 max_bytes: int = 1024 ** 3, offline: bool = False):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.objects = self.directory / "objects"
+        self.entries = self.directory / "entries"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.entries.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.size = sum(path.stat().st_size for path in self.objects.iterdir())
+
+    def _entry_path(self, url: str) -> Path:
+        return self.entries / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / f"{digest}.gz"
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        # write + rename, so a crash never leaves half written files behind
+        temporary = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+
+    def get(self, url: str) -> dict | None:
+        """Returns cache entry of the url (or None) and marks it as recently used.
+        Files may be evicted by other threads at any time, missing files are cache misses"""
+        path = self._entry_path(url)
+        try:
+            entry = json.loads(path.read_text(encoding="utf8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if not self._object_path(entry["digest"]).exists():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] < self.ttl
+
+    def load_body(self, entry: dict) -> bytes | None:
+        """Returns the cached body, None when it has been evicted since the entry was read"""
+        try:
+            return gzip.decompress(self._object_path(entry["digest"]).read_bytes())
+        except OSError:
+            return None
+
+    def validators(self, entry: dict) -> dict:
+        """Returns headers of a conditional request revalidating the entry"""
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def store(self, url: str, body: bytes, headers: dict, encoding: str | None) -> dict:
+        digest = hashlib.sha256(body).hexdigest()
+        entry = {"url": url, "digest": digest, "encoding": encoding, "stored_at": time.time(),
+                 "headers": {key: headers[key] for key in ("ETag", "Last-Modified", "Content-Type") if key in headers}}
+
+        with self.lock:
+            object_path = self._object_path(digest)
+            if not object_path.exists():
+                compressed = gzip.compress(body, compresslevel=6)
+                self._write(object_path, compressed)
+                self.size += len(compressed)
+            self._write(self._entry_path(url), json.dumps(entry).encode("utf8"))
+            if self.size > self.max_bytes:
+                self._evict()
+        return entry
+
+    def refresh(self, url: str, entry: dict) -> dict:
+        """Marks revalidated (304 Not Modified) entry as fresh again"""
+        entry = entry | {"stored_at": time.time()}
+        with self.lock:
+            self._write(self._entry_path(url), json.dumps(entry).encode("utf8"))
+        return entry
+
+    def _evict(self) -> None:
+        """Removes least recently used entries (and bodies nobody refers to) until cache
+        takes less than 90% of max_bytes"""
+        entries = []
+        for path in sorted(self.entries.glob("*.json"), key=lambda path: path.stat().st_mtime):
+            try:
+                entries.append((path, json.loads(path.read_text(encoding="utf8"))["digest"]))
+            except (FileNotFoundError, ValueError, KeyError):
+                path.unlink(missing_ok=True)
+
+        references = Counter(digest for _, digest in entries)
+        sizes = {path.name[:-3]: path.stat().st_size for path in self.objects.glob("*.gz")}
+        for digest in set(sizes) - set(references):
+            self._object_path(digest).unlink(missing_ok=True)
+            del sizes[digest]
+
+        total = sum(sizes.values())
+        for path, digest in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            path.unlink(missing_ok=True)
+            references[digest] -= 1
+            if references[digest] == 0 and digest in sizes:
+                self._object_path(digest).unlink(missing_ok=True)
+                total -= sizes.pop(digest)
+        self.size = total
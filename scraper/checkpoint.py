@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+class Checkpoint:
+    """Append-only journal of finished result pages and offers of a single crawl.
+    Every line is "page<TAB>url" or "offer<TAB>url". Fresh runs truncate the journal, resumed runs
+    load it and skip everything that is already recorded, so no row is downloaded (or written) twice."""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.pages: set[str] = set()
+        self.offers: set[str] = set()
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf8') as journal:
+                for line in journal:
+                    kind, _, url = line.rstrip("\n").partition("\t")
+                    if kind == "page":
+                        self.pages.add(url)
+                    elif kind == "offer":
+                        self.offers.add(url)
+
+        self.journal = open(path, 'a' if resume else 'w', encoding='utf8')
+
+    def page_done(self, url: str) -> bool:
+        return url in self.pages
+
+    def offer_done(self, url: str) -> bool:
+        return url in self.offers
+
+    def complete(self, entries: list[tuple[str, str]]) -> None:
+        """Records ("offer", url) and ("page", url) entries. Offers should be recorded once their rows 
+        are written to the output file, pages once all of their offers are recorded"""
+        with self.lock:
+            for kind, url in entries:
+                (self.pages if kind == "page" else self.offers).add(url)
+                self.journal.write(f"{kind}\t{url}\n")
+            self.journal.flush()
+
+    def close(self) -> None:
+        self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
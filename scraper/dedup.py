@@ -0,0 +1,71 @@
+import hashlib
+import math
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from scraper.merge import HashSet
+
+### url normalization ###
+"""The same offer is often linked with different tracking parameters, fragments or trailing slashes.
+Urls are normalized before deduplication, so such links are recognized as one offer."""
+
+TRACKING_PARAMETERS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+                       "fbclid", "gclid", "ref", "search_reason", "searchBarPosition"}
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in TRACKING_PARAMETERS)
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+class BloomFilter:
+    """Probabilistic set for very large crawls - uses about 14.4 bits (1.8 bytes) per url at 0.1% false positive rate,
+    false positive means an offer is (rarely) treated as a duplicate and not downloaded"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def add(self, key: str) -> bool:
+        """Adds the key, returns False when it (probably) has already been added before"""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        new = False
+        for number in range(self.hashes):
+            position = (first + number * second) % self.size
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+class UrlDeduplicator:
+    """Run-wide register of offer urls. Duplicates (repeated on several result pages, cities, brands or
+    categories) are collapsed before they are downloaded. Exact hash set is used by default,
+    bloom_capacity switches to a bloom filter sized for given number of urls."""
+
+    def __init__(self, bloom_capacity: int | None = None, error_rate: float = 0.001):
+        self.urls = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else HashSet()
+        self.total = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+
+    def is_new(self, url: str) -> bool:
+        key = normalize_url(url)
+        with self.lock:
+            self.total += 1
+            if self.urls.add(key):
+                return True
+            self.duplicates += 1
+            return False
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicates / self.total if self.total else 0.0
+
+    def report(self) -> str:
+        return f"Offer urls found: {self.total}, duplicates skipped: {self.duplicates} ({self.ratio:.1%})"
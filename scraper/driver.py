@@ -0,0 +1,226 @@
+import os
+from contextlib import nullcontext
+from operator import itemgetter
+from types import ModuleType
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Iterator
+from scraper.seen import SeenIndex
+from scraper.checkpoint import Checkpoint
+from scraper.pipeline import Pipeline, async_iterate
+from scraper.sinks import open_sink
+from scraper.merge import count_records, drop_replaced_rows
+from scraper.dedup import UrlDeduplicator
+
+if TYPE_CHECKING:
+    from tqdm import tqdm
+
+### scraping driver ###
+"""Walk of the result pages, parallel download of the offer pages and writing of the records, shared by
+all the projects. A site is the functions module of a project, it provides only what differs between sites:
+    search_pages(search_criteria, number_of_pages) - urls of the result pages of a search
+    page_offers(page_url, health) - (offer url, listing info) of all the listings of a result page
+    shallow_page_offers(page_url, health) - optional, the same with all the offer data read from the result page
+    download_offer_page(offer_url) and ENGINES - download of an offer page and its parse functions by engine name
+    offer_record(offer_url, listing info, parsed offer page, health) - record of the offer (with url and row()),
+        the parsed offer page is None in shallow mode
+    OUTPUT_COLUMNS and KEY - typed columns of the output files and the column identifying offers
+    seen_key(offer_url) - optional, key of the offer in the seen index (offer url by default)
+    selector_health() - optional, monitor of the selectors (page_done() after every result page,
+        finish() at the end of the walk) passed to page_offers and offer_record, None otherwise
+Functions of the site are looked up on every run, so they can be replaced (e.g. in tests).
+Site modules bind the driver functions to themselves, e.g. download_data = partial(driver.download_data, site)."""
+
+
+def seen_key(site: ModuleType, offer_url: str) -> str:
+    key = getattr(site, "seen_key", None)
+    return offer_url if key is None else key(offer_url)
+
+
+def discover_offers(site: ModuleType, search_pages: Iterable[str], checkpoint: Checkpoint | None,
+                    seen: SeenIndex | None, refetch_after_days: float | None, dedup: UrlDeduplicator,
+                    pbar: "tqdm | None", shallow: bool = False, health=None) -> Iterator[tuple[str, str, object]]:
+    """Function walks result pages and yields (page url, offer url, listing info) of offers to download.
+    It runs in the pipeline producer thread, so next result pages are requested while offers from
+    the previous ones are still downloaded. The walk stops at the first result page without listings.
+    Offers already journaled in the checkpoint, stored in the file (incremental mode) or found earlier
+    during the run (on other result pages or in other jobs sharing the deduplicator) are skipped,
+    result pages left without offers are journaled as done. Checkpoint, seen index, progress bar and selector health monitor are optional."""
+
+    page_offers = site.shallow_page_offers if shallow else site.page_offers
+    for page_num, page_url in enumerate(search_pages, start=1):
+        if checkpoint is not None and checkpoint.page_done(page_url):
+            if pbar is not None:
+                pbar.write(f"Page {page_num} has already been downloaded >>>")
+            continue
+
+        offer_list = page_offers(page_url, health)
+        if not offer_list:
+            if pbar is not None:
+                pbar.write(f"Page {page_num} has no offers, there are no more result pages >>>")
+            break
+
+        offers = []
+        for offer_url, listing_info in offer_list:
+            if not dedup.is_new(offer_url) or (checkpoint is not None and checkpoint.offer_done(offer_url)):
+                continue
+            if seen is not None and seen.should_skip(seen_key(site, offer_url), refetch_after_days):
+                continue
+            offers.append((page_url, offer_url, listing_info))
+
+        if health is not None:
+            health.page_done()
+        # nothing is left to write for a page whose offers were all skipped, so it is journaled right away
+        # (pages with offers are journaled by the writer once their rows are flushed)
+        if not offers and checkpoint is not None:
+            checkpoint.complete([("page", page_url)])
+
+        if pbar is not None:
+            pbar.set_description(f"Page {page_num}")
+            pbar.total += len(offers)
+            pbar.refresh()
+        yield from offers
+
+    # fewer result pages than sampled or an empty first page
+    if health is not None:
+        health.finish()
+
+
+def scrape_offers(site: ModuleType, search_criteria, number_of_pages: int, workers: int = 8,
+                  parse_workers: int | None = None, pipeline: Pipeline | None = None,
+                  dedup: UrlDeduplicator | None = None, engine: str = "html", shallow: bool = False,
+                  checkpoint: Checkpoint | None = None, seen: SeenIndex | None = None,
+                  refetch_after_days: float | None = None, pbar: "tqdm | None" = None) -> Iterator[tuple[str, object]]:
+    """Function scrapes offers of a site matching search_criteria and lazily yields (result page url, offer)
+    pairs in listing order. Result pages are discovered ahead of the offer downloads, offer pages are
+    downloaded and parsed in parallel (see iter_offers and download_data for the description of the options).
+    Checkpoint and seen index only filter the offers, journaling them is left to the caller."""
+
+    if engine not in site.ENGINES:
+        raise ValueError(f"Unknown extraction engine: {engine}, available engines: {list(site.ENGINES)}")
+    if shallow and not hasattr(site, "shallow_page_offers"):
+        raise ValueError("Shallow mode is not supported by the site")
+    dedup = UrlDeduplicator() if dedup is None else dedup
+    selector_health = getattr(site, "selector_health", None)
+    health = selector_health() if selector_health is not None else None
+
+    # pipeline can be shared between concurrent downloads (see orchestrator.py)
+    with (Pipeline(site.download_offer_page, site.ENGINES[engine], io_workers=workers, parse_workers=parse_workers)
+          if pipeline is None and not shallow else nullcontext(pipeline)) as pipeline:
+
+        search_pages = site.search_pages(search_criteria, number_of_pages)
+        offers = discover_offers(site, search_pages, checkpoint, seen, refetch_after_days, dedup, pbar, shallow,
+                                 health)
+        if shallow:
+            # listings already contain all the data, offer pages are not downloaded
+            results = ((offer, None) for offer in offers)
+        else:
+            results = pipeline.run(offers, key=itemgetter(1), parse=site.ENGINES[engine])
+
+        for (page_url, offer_url, listing_info), offer_data in results:
+            yield page_url, site.offer_record(offer_url, listing_info, offer_data, health)
+
+
+def iter_offers(site: ModuleType, search_criteria, number_of_pages: int, workers: int = 8,
+                parse_workers: int | None = None, engine: str = "html", pipeline: Pipeline | None = None,
+                dedup: UrlDeduplicator | None = None, shallow: bool = False) -> Iterator:
+    """Function lazily yields offer records of a site matching search_criteria from number_of_pages
+    result pages, so they can be streamed into any sink or analysis without an intermediate file.
+    Pages are downloaded only as fast as the records are consumed (up to the pipeline queue size ahead),
+    closing the generator stops the scraping. Options are the same as in download_data."""
+    for _, offer in scrape_offers(site, search_criteria, number_of_pages, workers, parse_workers, pipeline, dedup,
+                                  engine, shallow):
+        yield offer
+
+
+def aiter_offers(site: ModuleType, search_criteria, number_of_pages: int, **options) -> AsyncIterator:
+    """Async variant of iter_offers (async for offer in aiter_offers(...)),
+    scraping runs in worker threads and does not block the event loop"""
+    return async_iterate(iter_offers(site, search_criteria, number_of_pages, **options))
+
+
+def download_data(site: ModuleType, file_name: str, search_criteria, number_of_pages: int, workers: int = 8,
+                  parse_workers: int | None = None, incremental: bool = False,
+                  refetch_after_days: float | None = None, resume: bool = False,
+                  pipeline: Pipeline | None = None, dedup: UrlDeduplicator | None = None,
+                  engine: str = "html", shallow: bool = False) -> None:
+    """Function writes offers of a site matching search_criteria to file_name, output format depends
+    on the file extension (csv, csv.gz, jsonl, jsonl.gz, parquet or sqlite - history store keeping only
+    new and changed offers, see history.py). Offer pages are downloaded by worker threads and parsed by
+    parse_workers processes (None - one per CPU core, 0 - pages are parsed in the main process),
+    engine picks the parse function of the site (e.g. "json" reads the data embedded in the pages),
+    shallow=True builds rows from result pages only, where the site supports it.
+    In incremental mode offers already stored in the file (tracked in file_name.seen.sqlite index)
+    are skipped and only new rows are appended, refetch_after_days allows to scrape again offers stored
+    earlier than given number of days ago - once the run is finished their older rows are dropped from
+    csv and jsonl files, so every offer keeps one (its latest) row (the sqlite history store keeps all
+    the versions of offers). Progress is journaled in file_name.checkpoint, resume=True
+    continues an interrupted run from the last finished offer, appending to the existing file.
+    Duplicated offer urls are downloaded once, dedup allows to share the register of urls between
+    several downloads. Offers are scraped by scrape_offers, this function only writes them to the file."""
+
+    report_dedup = dedup is None
+    dedup = UrlDeduplicator() if dedup is None else dedup
+    append = (incremental or resume) and os.path.exists(file_name) and os.path.getsize(file_name) > 0
+    # rows of offers scraped again are appended after old_rows rows of the file, keys of all the written
+    # rows are kept to drop the older rows at the end
+    replace = (append and incremental and refetch_after_days is not None
+               and file_name.removesuffix(".gz").endswith((".csv", ".jsonl")))
+    old_rows = count_records(file_name) if replace else 0
+    key_index = [column.name for column in site.OUTPUT_COLUMNS].index(site.KEY)
+    written = set()
+
+    with (SeenIndex(f"{file_name}.seen.sqlite") if incremental else nullcontext()) as seen, \
+         Checkpoint(f"{file_name}.checkpoint", resume=resume) as checkpoint, \
+         open_sink(file_name, site.OUTPUT_COLUMNS, append=append, key=site.KEY) as sink:
+
+        # rows are written in batches, offers are journaled (and marked as seen)
+        # only once their rows are flushed to the file
+        pending = []
+
+        def commit() -> None:
+            checkpoint.complete(pending)
+            if seen is not None:
+                seen.add([seen_key(site, url) for kind, url in pending if kind == "offer"])
+            pending.clear()
+
+        sink.on_flush = commit
+
+        if append:
+            print(f"\nNew offers will be appended to file: {file_name}\n")
+        else:
+            print(f"\nFile: {file_name} has been created.\n")
+
+        # progress bar is imported only here, the lazy api and the workers do not need it
+        from tqdm import tqdm
+        pbar = tqdm(total=0, unit=" offers")
+
+        offers = scrape_offers(site, search_criteria, number_of_pages, workers, parse_workers, pipeline, dedup,
+                               engine, shallow, checkpoint, seen, refetch_after_days, pbar)
+
+        current_page = None
+        for page_url, offer in offers:
+
+            # results are ordered, so the previous page is complete once the next one starts
+            if page_url != current_page:
+                if current_page is not None:
+                    pending.append(("page", current_page))
+                current_page = page_url
+
+            row = offer.row()
+            sink.write(row)
+            pending.append(("offer", offer.url))
+            if replace:
+                written.add(str(row[key_index]))
+
+            pbar.update()
+
+        if current_page is not None:
+            pending.append(("page", current_page))
+
+        pbar.close()
+
+    if written:
+        replaced = drop_replaced_rows(file_name, site.OUTPUT_COLUMNS, site.KEY, written, old_rows)
+        print(f"\n{replaced} older rows of offers scraped again have been dropped\n")
+
+    if report_dedup:
+        print(f"\n{dedup.report()}\n")
@@ -0,0 +1,416 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterable
+from scraper.dedup import normalize_url
+from scraper.merge import StreamingMerger
+from scraper.sinks import Column
+
+### crawl frontier ###
+"""Work queue of result page and offer urls shared by many worker processes or hosts. Workers lease
+batches of urls, acknowledge them once their rows are written to the worker's own shard file and
+give failed urls back for a retry. Leases of a worker which died expire and their urls are handed out
+again, urls failing max_attempts times are set aside. Every url is queued only once, so no page is fetched
+twice unless its worker lost the lease. Shards of all the workers are merged into one file afterwards.
+SqliteFrontier works for processes of one machine, RedisFrontier for many machines."""
+
+PENDING, LEASED, DONE, FAILED = range(4)
+
+
+@dataclass(slots=True)
+class Task:
+    """Queued url - kind is "page" (result page) or "offer", payload carries data already
+    scraped from the result page (json text)"""
+    kind: str
+    url: str
+    payload: str | None = None
+
+
+class Frontier(ABC):
+    """Interface of the frontiers"""
+
+    @abstractmethod
+    def add(self, tasks: Iterable[Task]) -> int:
+        """Queues urls which have never been queued before, returns the number of queued urls"""
+
+    @abstractmethod
+    def lease(self, worker: str, count: int, lease_seconds: float = 300.0) -> list[Task]:
+        """Hands out up to count urls (offers first) for lease_seconds, expired leases are requeued first"""
+
+    @abstractmethod
+    def ack(self, worker: str, urls: Iterable[str]) -> None:
+        """Marks urls leased by worker as done. Urls whose lease the worker has lost (it expired
+        and the urls were handed out again) are ignored"""
+
+    @abstractmethod
+    def fail(self, worker: str, urls: Iterable[str]) -> None:
+        """Gives urls leased by worker back to the queue, or sets them aside after max_attempts failures.
+        Urls whose lease the worker has lost are ignored"""
+
+    @abstractmethod
+    def finished(self) -> bool:
+        """True when there are no queued nor leased urls"""
+
+    @abstractmethod
+    def stats(self) -> dict[str, int]:
+        """Numbers of pending, leased, done and failed urls"""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SqliteFrontier(Frontier):
+    """Frontier stored in a sqlite file, shared by the processes of one machine
+    (every lease runs in an exclusive transaction, so a url is never leased twice at a time)"""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS tasks (url TEXT UNIQUE NOT NULL, kind TEXT NOT NULL, "
+                                    "payload TEXT, priority INTEGER NOT NULL, state INTEGER NOT NULL DEFAULT 0, "
+                                    "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, priority)")
+
+    def transaction(self):
+        """Exclusive transaction - other processes wait for it instead of reading stale state"""
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def add(self, tasks: Iterable[Task]) -> int:
+        rows = [(normalize_url(task.url), task.kind, task.payload, 0 if task.kind == "offer" else 1)
+                for task in tasks]
+        with self.lock, self.transaction():
+            before = self.connection.total_changes
+            self.connection.executemany("INSERT OR IGNORE INTO tasks (url, kind, payload, priority) "
+                                        "VALUES (?, ?, ?, ?)", rows)
+            return self.connection.total_changes - before
+
+    def lease(self, worker: str, count: int, lease_seconds: float = 300.0) -> list[Task]:
+        now = time.time()
+        with self.lock, self.transaction():
+            self.connection.execute("UPDATE tasks SET attempts = attempts + 1, worker = NULL, "
+                                    "state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END "
+                                    "WHERE state = ? AND lease_until < ?",
+                                    (self.max_attempts, FAILED, PENDING, LEASED, now))
+            rows = self.connection.execute("SELECT rowid, kind, url, payload FROM tasks WHERE state = ? "
+                                           "ORDER BY priority, rowid LIMIT ?", (PENDING, count)).fetchall()
+            self.connection.executemany("UPDATE tasks SET state = ?, worker = ?, lease_until = ? WHERE rowid = ?",
+                                        [(LEASED, worker, now + lease_seconds, rowid) for rowid, *_ in rows])
+        return [Task(kind, url, payload) for _, kind, url, payload in rows]
+
+    def ack(self, worker: str, urls: Iterable[str]) -> None:
+        with self.lock, self.transaction():
+            self.connection.executemany("UPDATE tasks SET state = ?, payload = NULL "
+                                        "WHERE url = ? AND state = ? AND worker = ?",
+                                        [(DONE, url, LEASED, worker) for url in urls])
+
+    def fail(self, worker: str, urls: Iterable[str]) -> None:
+        with self.lock, self.transaction():
+            self.connection.executemany("UPDATE tasks SET attempts = attempts + 1, worker = NULL, "
+                                        "state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END "
+                                        "WHERE url = ? AND state = ? AND worker = ?",
+                                        [(self.max_attempts, FAILED, PENDING, url, LEASED, worker) for url in urls])
+
+    def finished(self) -> bool:
+        with self.lock:
+            query = "SELECT EXISTS (SELECT 1 FROM tasks WHERE state IN (?, ?))"
+            return not self.connection.execute(query, (PENDING, LEASED)).fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        return {name: counts.get(state, 0) for state, name in enumerate(("pending", "leased", "done", "failed"))}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def text(value) -> str | None:
+    return value.decode("utf8") if isinstance(value, bytes) else value
+
+
+class RedisFrontier(Frontier):
+    """Frontier stored in Redis (or a server speaking its protocol), shared by workers on many machines.
+    Keys of one crawl start with name: set of all queued urls, list of pending urls, sorted set of leases
+    (scored by their expiry), hashes of tasks, attempts and lease owners (workers), set of failed urls
+    and counter of done urls.
+    Every hand over of urls (queueing, leasing, requeueing expired leases) is a MULTI / EXEC transaction
+    watching the keys it has read, so it is applied completely or not at all - a worker dying in the middle
+    loses no url, and when another worker changes the watched keys first the transaction is retried.
+    Client is any object with redis-py api, e.g. LocalRedis stand-in in tests."""
+
+    def __init__(self, client, name: str = "frontier", max_attempts: int = 3):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.keys = {key: f"{name}:{key}" for key in ("seen", "pending", "leases", "tasks", "attempts", "owners",
+                                                      "failed", "done")}
+
+    @classmethod
+    def from_url(cls, url: str, name: str = "frontier", max_attempts: int = 3) -> "RedisFrontier":
+        """Frontier in Redis server at url (redis://host:port/db), requires redis package"""
+        import redis
+        return cls(redis.Redis.from_url(url), name, max_attempts)
+
+    def add(self, tasks: Iterable[Task]) -> int:
+        tasks = {normalize_url(task.url): task for task in tasks}
+
+        def queue(pipe) -> int:
+            new = [url for url in tasks if not pipe.sismember(self.keys["seen"], url)]
+            pipe.multi()
+            for url in new:
+                task = tasks[url]
+                pipe.sadd(self.keys["seen"], url)
+                pipe.hset(self.keys["tasks"], url, json.dumps([task.kind, task.payload]))
+                # offers are taken from the head of the list, result pages are appended to its end
+                if task.kind == "offer":
+                    pipe.lpush(self.keys["pending"], url)
+                else:
+                    pipe.rpush(self.keys["pending"], url)
+            return len(new)
+        return self.client.transaction(queue, self.keys["seen"], value_from_callable=True)
+
+    def requeue(self, pipe, urls: list[str]) -> None:
+        """Queues commands giving leased urls back (or setting them aside after max_attempts failures),
+        called inside a transaction watching the leases"""
+        attempts = pipe.hmget(self.keys["attempts"], urls) if urls else []
+        pipe.multi()
+        for url, attempt in zip(urls, attempts):
+            pipe.zrem(self.keys["leases"], url)
+            pipe.hdel(self.keys["owners"], url)
+            pipe.hincrby(self.keys["attempts"], url, 1)
+            if int(attempt or 0) + 1 >= self.max_attempts:
+                pipe.sadd(self.keys["failed"], url)
+            else:
+                pipe.rpush(self.keys["pending"], url)
+
+    def lease(self, worker: str, count: int, lease_seconds: float = 300.0) -> list[Task]:
+        now = time.time()
+
+        def requeue_expired(pipe) -> None:
+            self.requeue(pipe, [text(url) for url in pipe.zrangebyscore(self.keys["leases"], 0, now)])
+        self.client.transaction(requeue_expired, self.keys["leases"])
+
+        def take(pipe) -> list[Task]:
+            urls = [text(url) for url in pipe.lrange(self.keys["pending"], 0, count - 1)]
+            tasks = [json.loads(text(task)) for task in pipe.hmget(self.keys["tasks"], urls)] if urls else []
+            pipe.multi()
+            if urls:
+                pipe.ltrim(self.keys["pending"], len(urls), -1)
+                pipe.zadd(self.keys["leases"], {url: now + lease_seconds for url in urls})
+                for url in urls:
+                    pipe.hset(self.keys["owners"], url, worker)
+            return [Task(kind, url, payload) for url, (kind, payload) in zip(urls, tasks)]
+        return self.client.transaction(take, self.keys["pending"], value_from_callable=True)
+
+    def held(self, pipe, worker: str, urls: list[str]) -> list[str]:
+        """Urls of which worker still holds the lease"""
+        owners = pipe.hmget(self.keys["owners"], urls) if urls else []
+        return [url for url, owner in zip(urls, owners) if text(owner) == worker]
+
+    def ack(self, worker: str, urls: Iterable[str]) -> None:
+        urls = list(urls)
+
+        def acknowledge(pipe) -> None:
+            done = self.held(pipe, worker, urls)
+            pipe.multi()
+            if done:
+                pipe.zrem(self.keys["leases"], *done)
+                pipe.hdel(self.keys["owners"], *done)
+                pipe.hdel(self.keys["tasks"], *done)
+                pipe.incr(self.keys["done"], len(done))
+        self.client.transaction(acknowledge, self.keys["leases"])
+
+    def fail(self, worker: str, urls: Iterable[str]) -> None:
+        urls = list(urls)
+
+        def requeue_failed(pipe) -> None:
+            self.requeue(pipe, self.held(pipe, worker, urls))
+        self.client.transaction(requeue_failed, self.keys["leases"])
+
+    def finished(self) -> bool:
+        return not self.client.llen(self.keys["pending"]) and not self.client.zcard(self.keys["leases"])
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.client.llen(self.keys["pending"]), "leased": self.client.zcard(self.keys["leases"]),
+                "done": int(self.client.get(self.keys["done"]) or 0), "failed": self.client.scard(self.keys["failed"])}
+
+
+class LocalRedis:
+    """In-process stand-in of a Redis server implementing the commands used by RedisFrontier
+    (for tests and for workers running as threads of one process)"""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+        self.lock = threading.RLock()
+
+    def transaction(self, function, *watches: str, value_from_callable: bool = False):
+        """Runs function(pipe) and executes the commands it queued after pipe.multi(). The lock is held
+        for the whole transaction, so watched keys can not change in the meantime"""
+        with self.lock:
+            pipe = LocalPipeline(self)
+            result = function(pipe)
+            values = pipe.execute()
+        return result if value_from_callable else values
+
+    def sismember(self, key: str, member: str) -> bool:
+        with self.lock:
+            return member in self.data.get(key, ())
+
+    def sadd(self, key: str, *members: str) -> int:
+        with self.lock:
+            values = self.data.setdefault(key, set())
+            added = len(set(members) - values)
+            values.update(members)
+            return added
+
+    def scard(self, key: str) -> int:
+        with self.lock:
+            return len(self.data.get(key, ()))
+
+    def hset(self, key: str, field: str, value: str) -> int:
+        with self.lock:
+            values = self.data.setdefault(key, {})
+            new = field not in values
+            values[field] = value
+            return int(new)
+
+    def hget(self, key: str, field: str) -> str | None:
+        with self.lock:
+            return self.data.get(key, {}).get(field)
+
+    def hmget(self, key: str, fields: list[str]) -> list[str | None]:
+        with self.lock:
+            values = self.data.get(key, {})
+            return [values.get(field) for field in fields]
+
+    def hdel(self, key: str, *fields: str) -> int:
+        with self.lock:
+            values = self.data.get(key, {})
+            return sum(values.pop(field, None) is not None for field in fields)
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self.lock:
+            values = self.data.setdefault(key, {})
+            values[field] = int(values.get(field, 0)) + amount
+            return values[field]
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self.lock:
+            self.data[key] = int(self.data.get(key, 0)) + amount
+            return self.data[key]
+
+    def get(self, key: str):
+        with self.lock:
+            value = self.data.get(key)
+            return None if value is None else str(value)
+
+    def lpush(self, key: str, *values: str) -> int:
+        with self.lock:
+            items = self.data.setdefault(key, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def rpush(self, key: str, *values: str) -> int:
+        with self.lock:
+            items = self.data.setdefault(key, [])
+            items.extend(values)
+            return len(items)
+
+    def lpop(self, key: str) -> str | None:
+        with self.lock:
+            items = self.data.get(key)
+            return items.pop(0) if items else None
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        with self.lock:
+            items = self.data.get(key, [])
+            return items[start:end + 1 if end >= 0 else len(items) + end + 1]
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self.lock:
+            if key in self.data:
+                self.data[key] = self.lrange(key, start, end)
+            return True
+
+    def llen(self, key: str) -> int:
+        with self.lock:
+            return len(self.data.get(key, ()))
+
+    def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        with self.lock:
+            scores = self.data.setdefault(key, {})
+            added = len(set(mapping) - set(scores))
+            scores.update(mapping)
+            return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self.lock:
+            scores = self.data.get(key, {})
+            return sum(scores.pop(member, None) is not None for member in members)
+
+    def zrangebyscore(self, key: str, min: float, max: float) -> list[str]:
+        with self.lock:
+            scores = self.data.get(key, {})
+            return sorted((member for member, score in scores.items() if min <= score <= max), key=scores.get)
+
+    def zcard(self, key: str) -> int:
+        with self.lock:
+            return len(self.data.get(key, ()))
+
+
+class LocalPipeline:
+    """Transaction of LocalRedis - commands run at once until multi() is called,
+    later ones are queued and run by execute()"""
+
+    def __init__(self, client: LocalRedis):
+        self.client = client
+        self.queued: list | None = None
+
+    def multi(self) -> None:
+        self.queued = []
+
+    def execute(self) -> list:
+        queued, self.queued = self.queued or [], None
+        return [command(*args) for command, args in queued]
+
+    def __getattr__(self, name: str):
+        command = getattr(self.client, name)
+        if self.queued is None:
+            return command
+
+        def queue(*args):
+            self.queued.append((command, args))
+            return self
+        return queue
+
+
+def shard_name(file_name: str, worker: str) -> str:
+    """Output file of one worker: data.csv -> data.<worker>.csv (data.csv.gz -> data.<worker>.csv.gz)"""
+    directory, base = os.path.split(file_name)
+    stem, dot, extension = base.partition(".")
+    return os.path.join(directory, f"{stem}.{worker}{dot}{extension}")
+
+
+def merge_shards(shards: Iterable[str], merged_file: str, key: str, columns: list[Column] | None = None) -> None:
+    """Streams shards of all the workers into merged_file, rows repeated in several shards
+    (offers retried after an expired lease) are written once by key column (e.g. id of housing offers,
+    url of car offers), columns are the typed columns of the site (OUTPUT_COLUMNS)"""
+    with StreamingMerger(merged_file, key=key, columns=columns) as merger:
+        for shard in shards:
+            if os.path.exists(shard):
+                merger.add(shard)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterator
+from scraper.sinks import Column, Sink, clean_value
+
+
+class HistoryStore:
+    """Change data capture store of scraped offers (sqlite). Every row is compared with the latest stored
+    version of its offer by a content hash and only new or changed offers are stored as new versions,
+    so the store grows with the number of changes instead of the number of runs."""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS versions (offer_id TEXT NOT NULL, "
+                                    "scraped_at REAL NOT NULL, hash BLOB NOT NULL, data TEXT NOT NULL, "
+                                    "PRIMARY KEY (offer_id, scraped_at)) WITHOUT ROWID")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS versions_scraped_at ON versions (scraped_at)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS latest (offer_id TEXT PRIMARY KEY, "
+                                    "hash BLOB NOT NULL, last_seen REAL NOT NULL) WITHOUT ROWID")
+
+    @staticmethod
+    def row_hash(data: dict) -> bytes:
+        content = json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    def record(self, offers: list[tuple[str, dict]], scraped_at: float | None = None) -> int:
+        """Stores (offer id, row) pairs which differ from the latest versions of the offers,
+        every offer is marked as seen at scraped_at. Returns the number of stored versions."""
+
+        scraped_at = time.time() if scraped_at is None else scraped_at
+        with self.lock, self.connection:
+            ids = list(dict.fromkeys(offer_id for offer_id, _ in offers))
+            latest = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                query = f"SELECT offer_id, hash FROM latest WHERE offer_id IN ({','.join('?' * len(chunk))})"
+                latest.update(self.connection.execute(query, chunk).fetchall())
+
+            versions = []
+            for offer_id, data in offers:
+                digest = self.row_hash(data)
+                if latest.get(offer_id) != digest:
+                    versions.append((offer_id, scraped_at, digest, json.dumps(data, ensure_ascii=False)))
+                    latest[offer_id] = digest
+
+            self.connection.executemany("INSERT OR REPLACE INTO versions (offer_id, scraped_at, hash, data) "
+                                        "VALUES (?, ?, ?, ?)", versions)
+            self.connection.executemany("INSERT OR REPLACE INTO latest (offer_id, hash, last_seen) VALUES (?, ?, ?)",
+                                        [(offer_id, latest[offer_id], scraped_at) for offer_id in ids])
+        return len(versions)
+
+    def history(self, offer_id: str) -> list[tuple[float, dict]]:
+        """All stored versions of the offer as (time of scraping, row) pairs, oldest first"""
+        with self.lock:
+            rows = self.connection.execute("SELECT scraped_at, data FROM versions WHERE offer_id = ? "
+                                           "ORDER BY scraped_at", (offer_id,)).fetchall()
+        return [(scraped_at, json.loads(data)) for scraped_at, data in rows]
+
+    def price_history(self, offer_id: str, column: str = "price") -> list[tuple[float, object]]:
+        """Price changes of the offer as (time of scraping, price) pairs - versions in which
+        only other columns changed are left out"""
+        changes = []
+        for scraped_at, data in self.history(offer_id):
+            price = data.get(column)
+            if not changes or changes[-1][1] != price:
+                changes.append((scraped_at, price))
+        return changes
+
+    def changes(self, since: float = 0.0) -> Iterator[tuple[str, float, dict]]:
+        """Versions stored after given time (offer id, time of scraping, row), for downstream processing
+        of the changes only"""
+        with self.lock:
+            rows = self.connection.execute("SELECT offer_id, scraped_at, data FROM versions WHERE scraped_at > ? "
+                                           "ORDER BY scraped_at", (since,)).fetchall()
+        for offer_id, scraped_at, data in rows:
+            yield offer_id, scraped_at, json.loads(data)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class HistorySink(Sink):
+    """Output writing rows into a history store instead of a snapshot file (chosen by .sqlite extension).
+    Rows are keyed by the key column, all rows of one run share the same time of scraping."""
+
+    def __init__(self, path: str, columns: list[Column], append: bool = False, key: str = "id", **kwargs):
+        super().__init__(path, columns, append, **kwargs)
+        self.names = [column.name for column in columns]
+        lowered = [name.lower() for name in self.names]
+        if key.lower() not in lowered:
+            raise ValueError(f"History store requires {key} column to identify offers")
+        self.key_index = lowered.index(key.lower())
+        self.store = HistoryStore(path)
+        self.scraped_at = time.time()
+        self.changed = 0
+
+    def _write_batch(self, rows: list[list]) -> None:
+        offers = [(str(row[self.key_index]), dict(zip(self.names, map(clean_value, row)))) for row in rows]
+        self.changed += self.store.record(offers, self.scraped_at)
+
+    def close(self) -> None:
+        super().close()
+        self.store.close()
+
@@ -0,0 +1,102 @@
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+
+@dataclass
+class HostPolicy:
+    """Limits of a single host. The scheduler never exceeds rate (requests / sec) and max_in_flight,
+    but starts lower and adapts between the minimum and maximum values depending on host health."""
+    rate: float = 4.0
+    max_in_flight: int = 16
+    min_rate: float = 0.25
+    min_in_flight: int = 1
+    initial_in_flight: int = 4
+    latency_target: float = 3.0     # seconds, slower responses are treated as a sign of overload
+    cooldown: float = 5.0           # seconds between two consecutive back offs
+
+
+### per host limits ###
+"""Scrapers of all the sites may run at the same time, each host gets its own budget.
+Hosts that are not listed below use default HostPolicy values."""
+
+HOST_POLICIES = {
+    "www.otomoto.pl": HostPolicy(rate=4.0, max_in_flight=12),
+    "www.otodom.pl": HostPolicy(rate=4.0, max_in_flight=12),
+    "nofluffjobs.com": HostPolicy(rate=6.0, max_in_flight=16),
+}
+
+
+class HostLimiter:
+    """Token bucket (requests / sec) combined with an adaptive in-flight limit.
+    Limits are decreased multiplicatively on 429 / 503 responses, errors or high latency,
+    and increased additively while the host responds quickly (AIMD)."""
+
+    def __init__(self, policy: HostPolicy):
+        self.policy = policy
+        self.rate = policy.rate
+        self.limit = float(min(policy.initial_in_flight, policy.max_in_flight))
+        self.in_flight = 0
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.last_backoff = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Blocks until there is a free in-flight slot and a token in the bucket"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def release(self, latency: float, healthy: bool) -> None:
+        """Frees the slot and adapts the limits to the outcome of the request"""
+        policy = self.policy
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not healthy or latency > policy.latency_target:
+                if now - self.last_backoff >= policy.cooldown:
+                    self.limit = max(float(policy.min_in_flight), self.limit / 2)
+                    self.rate = max(policy.min_rate, self.rate / 2)
+                    self.last_backoff = now
+            else:
+                self.limit = min(float(policy.max_in_flight), self.limit + 1 / self.limit)
+                self.rate = min(policy.rate, self.rate + policy.rate / 20)
+            self.condition.notify_all()
+
+
+class HostScheduler:
+    """Keeps one HostLimiter per host, so every request to given domain shares the same budget"""
+
+    def __init__(self, policies: dict[str, HostPolicy] | None = None):
+        self.policies = dict(policies or {})
+        self.limiters: dict[str, HostLimiter] = {}
+        self.lock = threading.Lock()
+
+    def configure(self, host: str, policy: HostPolicy) -> None:
+        with self.lock:
+            self.policies[host] = policy
+            self.limiters.pop(host, None)
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(self.policies.get(host, HostPolicy()))
+            return self.limiters[host]
+
+
+SCHEDULER = HostScheduler(HOST_POLICIES)
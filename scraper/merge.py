@@ -0,0 +1,144 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Iterator
+from scraper.sinks import Column, Sink, open_sink
+
+
+def read_rows(path: str) -> tuple[list[str], Iterator[list]]:
+    """Function opens csv (csv.gz) or jsonl (jsonl.gz) file and returns its header
+    together with a lazy iterator over the rows. Empty files have no header and no rows."""
+    opener = gzip.open if path.endswith(".gz") else open
+    file = opener(path, 'rt', encoding='utf8', newline='')
+
+    if path.removesuffix(".gz").endswith(".jsonl"):
+        first = file.readline()
+        if not first:
+            file.close()
+            return [], iter(())
+        header = list(json.loads(first))
+
+        def rows() -> Iterator[list]:
+            with file:
+                yield list(json.loads(first).values())
+                for line in file:
+                    yield list(json.loads(line).values())
+        return header, rows()
+
+    reader = csv.reader(file)
+    header = next(reader, [])
+    if not header:
+        file.close()
+        return [], iter(())
+
+    def rows() -> Iterator[list]:
+        with file:
+            yield from reader
+    return header, rows()
+
+
+def count_records(file_name: str) -> int:
+    """Number of rows of an output file, counted as a stream (pandas is not needed for it),
+    parquet files are not read - the number is stored in their metadata"""
+    if file_name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(file_name).metadata.num_rows
+    _, rows = read_rows(file_name)
+    return sum(1 for _ in rows)
+
+
+def drop_replaced_rows(path: str, columns: list[Column], key: str, keys: set[str], old_rows: int) -> int:
+    """Function rewrites csv or jsonl file without those of its first old_rows rows whose key is in keys -
+    older rows of offers scraped again and appended to the file, so every offer keeps only its latest row.
+    The file is streamed into a temporary file, which replaces it only when some rows were dropped.
+    Returns the number of dropped rows."""
+    header, rows = read_rows(path)
+    key_index = [name.lower() for name in header].index(key.lower())
+    directory, name = os.path.split(path)
+    temporary = os.path.join(directory, f"~{name}")
+    dropped = 0
+    with open_sink(temporary, columns, batch_size=10_000) as sink:
+        for number, row in enumerate(rows):
+            if number < old_rows and str(row[key_index]) in keys:
+                dropped += 1
+                continue
+            sink.write(row)
+    if dropped:
+        os.replace(temporary, path)
+    else:
+        os.remove(temporary)
+    return dropped
+
+
+class HashSet:
+    """Compact set of keys - only 64 bit hashes of the keys are kept in memory"""
+
+    def __init__(self):
+        self.hashes: set[int] = set()
+
+    def add(self, key: str) -> bool:
+        """Adds the key, returns False when it has already been added before"""
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+        if digest in self.hashes:
+            return False
+        self.hashes.add(digest)
+        return True
+
+
+class StreamingMerger:
+    """Merges row files into a single output file, copying rows in batches, so memory usage does
+    not depend on the number or size of merged files. Rows with already merged key are skipped.
+    Files can be added while other files are still being downloaded (add is thread-safe).
+    Empty files (e.g. jsonl files of jobs which found no offers) are skipped.
+    Columns are typed columns of the merged file (lists are kept only when read from jsonl files),
+    by default columns of the first merged file are taken as strings."""
+
+    def __init__(self, file_name: str, key: str | None = "id", batch_size: int = 10_000,
+                 columns: list[Column] | None = None):
+        self.file_name = file_name
+        self.key = key
+        self.batch_size = batch_size
+        self.columns = columns
+        self.seen = HashSet()
+        self.sink: Sink | None = None
+        self.header: list[str] | None = None
+        self.rows = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+
+    def add(self, path: str) -> None:
+        header, rows = read_rows(path)
+        if not header:
+            return
+        with self.lock:
+            if self.sink is None:
+                self.header = header
+                columns = self.columns or [Column(name) for name in header]
+                if [column.name for column in columns] != header:
+                    raise ValueError(f"{path} has different columns than the merged file")
+                self.sink = open_sink(self.file_name, columns, key=self.key, batch_size=self.batch_size)
+            elif header != self.header:
+                raise ValueError(f"{path} has different columns than already merged files")
+
+            lowered = [name.lower() for name in header]
+            key_index = lowered.index(self.key.lower()) if self.key and self.key.lower() in lowered else None
+
+            for row in rows:
+                if key_index is not None and not self.seen.add(str(row[key_index])):
+                    self.duplicates += 1
+                    continue
+                self.sink.write(row)
+                self.rows += 1
+
+    def close(self) -> None:
+        if self.sink is not None:
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
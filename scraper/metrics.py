@@ -0,0 +1,212 @@
+import bisect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator
+
+### instrumentation ###
+"""Every stage of the scraper (fetch, parse, extractors, writes) reports its duration to one registry,
+requests additionally report their host, size, retries and errors. Stages running in parser processes
+are collected there and merged into the registry of the main process together with the parsed rows.
+At the end of a run the summary is saved as json and optionally as a Prometheus textfile."""
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Latency histogram - cumulative buckets (exported to Prometheus) and a fixed size
+    random sample of the observations (reservoir sampling) used for the percentiles"""
+
+    def __init__(self, sample_size: int = 10_000):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.sample: list[float] = []
+        self.sample_size = sample_size
+        self.random = random.Random(0)
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.sample) < self.sample_size:
+            self.sample.append(value)
+        else:
+            position = self.random.randrange(self.count)
+            if position < self.sample_size:
+                self.sample[position] = value
+
+    def percentile(self, q: float) -> float:
+        if not self.sample:
+            return 0.0
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self) -> dict:
+        mean = self.sum / self.count if self.count else 0.0
+        return {"count": self.count, "sum": round(self.sum, 6), "mean": round(mean, 6),
+                "p50": round(self.percentile(50), 6), "p95": round(self.percentile(95), 6),
+                "p99": round(self.percentile(99), 6), "max": round(self.max, 6)}
+
+
+class HostStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.time_to_first_byte = Histogram()
+        self.requests = 0
+        self.bytes = 0
+        self.retries = 0
+        self.errors = 0
+
+    def summary(self) -> dict:
+        return {"requests": self.requests, "bytes": self.bytes, "retries": self.retries, "errors": self.errors,
+                "latency": self.latency.summary(), "time_to_first_byte": self.time_to_first_byte.summary()}
+
+
+class Metrics:
+    """Thread-safe registry of stage timings and per host request statistics"""
+
+    def __init__(self):
+        self.stages: dict[str, Histogram] = {}
+        self.hosts: dict[str, HostStats] = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_request(self, host: str, seconds: float, time_to_first_byte: float | None = None,
+                       size: int = 0, retries: int = 0, error: bool = False) -> None:
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostStats()
+            stats = self.hosts[host]
+            stats.requests += 1
+            stats.bytes += size
+            stats.retries += retries
+            stats.errors += error
+            stats.latency.observe(seconds)
+            if time_to_first_byte is not None:
+                stats.time_to_first_byte.observe(time_to_first_byte)
+
+    def drain(self) -> dict[str, list[float]]:
+        """Returns stage observations recorded so far (in a parser process) and clears them"""
+        with self.lock:
+            observations = {stage: histogram.sample for stage, histogram in self.stages.items()}
+            self.stages = {}
+        return observations
+
+    def merge(self, observations: dict[str, list[float]]) -> None:
+        for stage, values in observations.items():
+            for value in values:
+                self.observe(stage, value)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages = {}
+            self.hosts = {}
+            self.started = time.time()
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {"started": self.started, "duration": round(time.time() - self.started, 3),
+                    "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+                    "hosts": {host: stats.summary() for host, stats in self.hosts.items()}}
+
+    def report(self) -> str:
+        """Human readable table of the stage timings (milliseconds) and host statistics"""
+        summary = self.summary()
+        lines = [f"{'stage':<28}{'count':>9}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+        for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["sum"]):
+            lines.append(f"{stage:<28}{stats['count']:>9}{stats['sum']:>10.2f}{stats['p50'] * 1000:>10.1f}"
+                         f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+        for host, stats in summary["hosts"].items():
+            lines.append(f"{host}: {stats['requests']} requests, {stats['bytes'] / 1024 ** 2:.1f} MiB, "
+                         f"{stats['retries']} retries, {stats['errors']} errors, "
+                         f"p95 latency {stats['latency']['p95'] * 1000:.0f} ms")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+        with self.lock:
+            lines = ["# TYPE scraper_stage_seconds histogram"]
+            for stage, histogram in self.stages.items():
+                lines += histogram_lines("scraper_stage_seconds", f'stage="{stage}"', histogram)
+
+            lines.append("# TYPE scraper_request_seconds histogram")
+            for host, stats in self.hosts.items():
+                lines += histogram_lines("scraper_request_seconds", f'host="{host}"', stats.latency)
+
+            for name, attribute in (("requests", "requests"), ("downloaded_bytes", "bytes"),
+                                    ("retries", "retries"), ("errors", "errors")):
+                lines.append(f"# TYPE scraper_{name}_total counter")
+                lines += [f'scraper_{name}_total{{host="{host}"}} {getattr(stats, attribute)}'
+                          for host, stats in self.hosts.items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_file: str | None = None, prometheus_file: str | None = None) -> None:
+        """Saves json summary and / or Prometheus textfile (written atomically,
+        so a textfile collector never reads a half written file)"""
+        if json_file is not None:
+            with open(json_file, 'w', encoding='utf8') as file:
+                json.dump(self.summary(), file, indent=2)
+        if prometheus_file is not None:
+            temporary = f"{prometheus_file}.tmp"
+            with open(temporary, 'w', encoding='utf8') as file:
+                file.write(self.prometheus())
+            os.replace(temporary, prometheus_file)
+
+
+def histogram_lines(name: str, labels: str, histogram: Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+METRICS = Metrics()
+
+
+def timed(stage: str | None = None) -> Callable:
+    """Decorator reporting duration of every call of the function as given stage (function name by default)"""
+
+    def decorator(function: Callable) -> Callable:
+        name = stage or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def collect(function: Callable, *args) -> tuple[object, dict[str, list[float]]]:
+    """Runs function in a parser process and returns its result together with the stage timings
+    recorded meanwhile, so they can be merged into the metrics of the main process"""
+    return function(*args), METRICS.drain()
@@ -0,0 +1,63 @@
+from typing import Callable, Iterable, Iterator
+import pandas as pd
+from scraper.sinks import Column
+
+### normalization ###
+"""Scraped values are raw texts ("89900PLN", "148 000 km", "54,2 m²"). Normalization turns them into typed
+columns, parsing whole columns at once with vectorized pandas string operations (compiled regular expressions
+running over the column) instead of Python code called row by row. Original columns are kept, typed columns
+are added next to them. Every site describes only its typed columns (see normalize.py of the projects):
+typed column name -> function computing it from the frame of scraped offers (with the typed columns
+computed before it), a tuple of names takes the columns of the frame returned by the function."""
+
+NUMBER = r"(\d[\d\s]*(?:[.,]\d+)?)"
+
+TypedColumns = dict[str | tuple[str, ...], Callable[[pd.DataFrame], pd.Series | pd.DataFrame]]
+
+
+def to_number(column: pd.Series) -> pd.Series:
+    """Function extracts the first number of every text in the column ("148 000 km" -> 148000.0,
+    "6,8 l/100km" -> 6.8), texts without a number (nan, "", "NA") become NaN"""
+    extracted = column.astype("string").str.extract(NUMBER, expand=False)
+    extracted = extracted.str.replace(r"\s", "", regex=True).str.replace(",", ".", regex=False)
+    return pd.to_numeric(extracted, errors="coerce").astype("float64")
+
+
+def normalize_frame(typed_columns: TypedColumns, frame: pd.DataFrame) -> pd.DataFrame:
+    """Function adds typed columns to a frame of scraped offers (columns of the output file)"""
+    normalized = frame.copy()
+    for names, compute in typed_columns.items():
+        values = compute(normalized)
+        if isinstance(names, tuple):
+            for name in names:
+                normalized[name] = values[name]
+        else:
+            normalized[names] = values
+    return normalized
+
+
+def normalize_records(typed_columns: TypedColumns, columns: list[Column], offers: Iterable,
+                      batch_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    """Pipeline step - function groups offer records (e.g. from iter_offers) into frames of batch_size rows
+    with the output columns of the site and yields them normalized"""
+    names = [column.name for column in columns]
+    batch = []
+    for offer in offers:
+        batch.append(offer.row())
+        if len(batch) >= batch_size:
+            yield normalize_frame(typed_columns, pd.DataFrame(batch, columns=names))
+            batch = []
+    if batch:
+        yield normalize_frame(typed_columns, pd.DataFrame(batch, columns=names))
+
+
+def normalize_csv(typed_columns: TypedColumns, source: str, destination: str, chunksize: int = 100_000) -> int:
+    """Function normalizes csv file (e.g. merged dataset) chunk by chunk, so memory usage does not depend
+    on the size of the file. Returns the number of normalized rows."""
+    rows = 0
+    chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize)
+    for number, chunk in enumerate(chunks):
+        normalize_frame(typed_columns, chunk).to_csv(destination, mode='w' if number == 0 else 'a',
+                                                     header=number == 0, index=False)
+        rows += len(chunk)
+    return rows
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from types import ModuleType
+from scraper.merge import StreamingMerger
+from scraper.pipeline import Pipeline
+from scraper.dedup import UrlDeduplicator
+
+
+@dataclass
+class Job:
+    """Single scraping job - search criteria (the same as download_data accepts),
+    number of result pages and the output file of the job"""
+    search_criteria: object
+    number_of_pages: int
+    file_name: str
+
+
+def run_jobs(site: ModuleType, jobs: list[Job], merged_file: str | None = None, key: str | None = None,
+             max_jobs: int = 4, workers: int = 8, parse_workers: int | None = None, max_in_flight: int = 32,
+             bloom_capacity: int | None = None, **options) -> list[Job]:
+    """Function runs up to max_jobs jobs of a site (functions module of the project, providing download_data,
+    download_offer_page and parse_offer_page) at the same time. All the jobs share one pipeline:
+    a pool of parser processes and a global budget of max_in_flight concurrently downloaded pages
+    (requests to each host are additionally limited by the host scheduler) and a register of offer urls,
+    so offers repeated in several jobs are downloaded only once (bloom_capacity switches the register
+    to a bloom filter for very large crawls). Every job writes its own file,
+    finished files are streamed into merged_file (deduplicated by key column) while other jobs still run,
+    with the typed columns of the site (OUTPUT_COLUMNS).
+    Remaining download_data options (e.g. incremental, resume) are passed to every job.
+    Returns the list of failed jobs."""
+
+    failed = []
+    dedup = UrlDeduplicator(bloom_capacity)
+    with Pipeline(site.download_offer_page, site.parse_offer_page, io_workers=workers, parse_workers=parse_workers,
+                  max_in_flight=max_in_flight) as pipeline, \
+         ThreadPoolExecutor(max_workers=max_jobs) as executor, \
+         (StreamingMerger(merged_file, key=key, columns=site.OUTPUT_COLUMNS) if merged_file else nullcontext()) as merger:
+
+        futures = {executor.submit(site.download_data, job.file_name, job.search_criteria, job.number_of_pages,
+                                   pipeline=pipeline, dedup=dedup, **options): job for job in jobs}
+
+        for future in as_completed(futures):
+            job = futures[future]
+            # a file which can not be merged fails only its job
+            try:
+                future.result()
+                if merger is not None:
+                    merger.add(job.file_name)
+            except Exception as error:
+                print(f"\nJob {job.file_name} has failed: {error!r}\n")
+                failed.append(job)
+
+    print(f"\nFinished {len(jobs) - len(failed)} of {len(jobs)} jobs. {dedup.report()}\n")
+    return failed
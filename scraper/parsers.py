@@ -0,0 +1,190 @@
+import json
+import re
+import threading
+from functools import lru_cache
+from typing import Iterator
+from scraper.metrics import timed
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+### parser backends ###
+"""Html is parsed with lxml by default. Documents are wrapped in Node objects exposing the small
+subset of BeautifulSoup api used by the extractors (find, find_all, text, attribute access),
+while the lookups run as compiled XPath expressions in C instead of Python tree walks.
+BeautifulSoup is used as a fallback when lxml is not installed or when it is selected explicitly."""
+
+BACKENDS = ("lxml", "bs4")
+BACKEND = "lxml" if lxml is not None else "bs4"
+
+
+def set_backend(name: str) -> None:
+    """Function selects html parser backend used by parse_html"""
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend: {name}, available backends: {BACKENDS}")
+    if name == "lxml" and lxml is None:
+        raise ImportError("lxml backend requires lxml package to be installed")
+    BACKEND = name
+
+
+def class_condition(class_: str) -> str:
+    """Multi-class values match the whole class attribute, single class matches any of element classes
+    (the same semantics as class_ argument in BeautifulSoup)"""
+    if " " in class_:
+        return f"[@class='{class_}']"
+    return f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')]"
+
+
+LOCAL = threading.local()
+
+
+@lru_cache(maxsize=None)
+def selector_expression(name: str | None, class_: str | None, attrs: tuple, first: bool) -> str:
+    """Function translates find / find_all arguments to an XPath expression"""
+    expression = f".//{name or '*'}"
+    if class_ is not None:
+        expression += class_condition(class_)
+    for key, value in attrs:
+        expression += f"[@{key}]" if value is True else f"[@{key}='{value}']"
+    if first:
+        expression = f"({expression})[1]"
+    return expression
+
+
+def compile_selector(name: str | None, class_: str | None, attrs: tuple, first: bool):
+    """Compiled XPath expressions (as well as lxml parsers) are not shared between threads,
+    every thread compiles the selectors it uses once and then reuses them"""
+    selectors = LOCAL.__dict__.setdefault("selectors", {})
+    key = (name, class_, attrs, first)
+    if key not in selectors:
+        selectors[key] = etree.XPath(selector_expression(name, class_, attrs, first))
+    return selectors[key]
+
+
+class Node:
+    """lxml element with BeautifulSoup-like api"""
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def name(self) -> str:
+        return self.element.tag
+
+    @property
+    def text(self) -> str:
+        return self.element.text_content()
+
+    def get(self, key: str, default=None):
+        value = self.element.get(key)
+        if value is None:
+            return default
+        return value.split() if key == "class" else value
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def find(self, name: str | None = None, class_: str | None = None, **attrs) -> "Node | None":
+        found = compile_selector(name, class_, tuple(sorted(attrs.items())), True)(self.element)
+        return Node(found[0]) if found else None
+
+    def find_all(self, name: str | None = None, class_: str | None = None, **attrs) -> list["Node"]:
+        found = compile_selector(name, class_, tuple(sorted(attrs.items())), False)(self.element)
+        return [Node(element) for element in found]
+
+
+def html_parser(encoding: str | None):
+    parsers = LOCAL.__dict__.setdefault("parsers", {})
+    if encoding not in parsers:
+        parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+    return parsers[encoding]
+
+
+@timed()
+def parse_html(content: bytes, encoding: str | None = "utf-8") -> Node:
+    """Function parses raw page content with the selected backend. All scraped sites serve utf-8,
+    encoding=None lets the parser detect it from the document itself"""
+    if BACKEND == "lxml":
+        return Node(lxml.html.document_fromstring(content, parser=html_parser(encoding)))
+
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, "lxml" if lxml is not None else "html.parser", from_encoding=encoding)
+
+
+def walk(document) -> Iterator[tuple[str, object]]:
+    """Function visits every element of the document once, in document order. It yields ("start", node)
+    when an element is entered and ("end", node) when all of its descendants were visited"""
+    if isinstance(document, Node):
+        for event, element in etree.iterwalk(document.element, events=("start", "end")):
+            if isinstance(element.tag, str):
+                yield event, Node(element)
+        return
+
+    stack = [(document, iter(document.children))]
+    yield "start", document
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield "end", node
+        elif child.name is not None:
+            yield "start", child
+            stack.append((child, iter(child.children)))
+
+
+### embedded json ###
+"""Sites embed the state of the page as json in script elements (e.g. __NEXT_DATA__ of Next.js sites).
+Scripts are found with a regular expression, so the data is read without parsing the html into a tree,
+json is decoded with orjson when it is installed. The json is not a public api - its structure 
+may change at any time, so every key is treated as optional."""
+
+
+@lru_cache(maxsize=None)
+def script_pattern(script_id: str) -> re.Pattern:
+    return re.compile(rb'<script[^>]*id="' + re.escape(script_id.encode()) + rb'"[^>]*>(.*?)</script>', re.S)
+
+
+def script_content(content: bytes, script_id: str) -> bytes | None:
+    """Function returns raw content of the script element with given id"""
+    match = script_pattern(script_id).search(content)
+    return None if match is None else match.group(1)
+
+
+def load_json(text: bytes | str):
+    """Function decodes json (with orjson when available), None is returned for invalid json"""
+    try:
+        return orjson.loads(text) if orjson is not None else json.loads(text)
+    except ValueError:
+        return None
+
+
+@timed()
+def next_data(content: bytes) -> dict | None:
+    """Function returns the json embedded in __NEXT_DATA__ script, None when the page has no (valid) json"""
+    text = script_content(content, "__NEXT_DATA__")
+    return None if text is None else load_json(text)
+
+
+def dig(data, *keys, default=None):
+    """Function follows keys (dict keys or list indexes) into nested json,
+    default is returned when any of them is missing or the value is null"""
+    for key in keys:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return default if data is None else data
@@ -0,0 +1,181 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from queue import Queue
+from typing import AsyncIterator, Callable, Iterable, Iterator
+from scraper.metrics import METRICS, collect
+
+DONE = object()
+
+
+class Pipeline:
+    """Scraping pipeline separating network I/O from html parsing.
+    I/O threads download raw pages into a bounded queue, a pool of parser processes turns them
+    into rows and a single consumer (the writer) receives the rows in the same order as the input items.
+    At most queue_size items are processed at the same time, so a slow stage holds back the others
+    instead of piling up pages in memory. parse_workers=0 parses pages in the pipeline thread.
+    One pipeline can serve several runs at the same time (e.g. concurrent jobs), they share the parser
+    processes and max_in_flight - the global limit of pages downloaded at the same time."""
+
+    def __init__(self, fetch: Callable, parse: Callable, io_workers: int = 8,
+                 parse_workers: int | None = None, queue_size: int = 64, max_in_flight: int | None = None):
+        self.fetch = fetch
+        self.parse = parse
+        self.io_workers = io_workers
+        self.queue_size = queue_size
+        self.budget = threading.Semaphore(max_in_flight) if max_in_flight else nullcontext()
+        self.pool = None
+        if parse_workers != 0:
+            # worker processes are spawned (not forked) as the parent process runs I/O threads
+            self.pool = ProcessPoolExecutor(max_workers=parse_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+
+    def _submit(self, parse: Callable, content: bytes) -> Future:
+        if self.pool is not None:
+            # stages timed in the parser process come back with the result (see collect)
+            return self.pool.submit(collect, parse, content)
+        future = Future()
+        try:
+            future.set_result(parse(content))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def run(self, items: Iterable, key: Callable | None = None, parse: Callable | None = None,
+            return_exceptions: bool = False) -> Iterator[tuple[object, object]]:
+        """Yields (item, parsed result) pairs in the order of items. Items are consumed lazily in a separate
+        producer thread (so a generator discovering items runs ahead of the downloads), key function
+        picks the url to download from an item, parse replaces the parse function of the pipeline for this run
+        (it has to be picklable). Exceptions raised while discovering, downloading or parsing are re-raised
+        in the consumer, with return_exceptions the exception of a failed item is yielded as its result instead
+        (item, exception), so one bad item does not stop the others"""
+
+        parse = self.parse if parse is None else parse
+
+        window = threading.Semaphore(self.queue_size)
+        to_download = Queue(maxsize=self.queue_size)
+        downloaded = Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        results: dict[int, tuple[object, Future]] = {}
+        ready = threading.Condition()
+        state = {"total": None, "error": None}
+
+        def feed() -> None:
+            count = 0
+            try:
+                for item in items:
+                    while not window.acquire(timeout=0.5):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    to_download.put((count, item))
+                    count += 1
+            except Exception as error:
+                state["error"] = error
+            finally:
+                for _ in range(self.io_workers):
+                    to_download.put(DONE)
+                with ready:
+                    state["total"] = count
+                    ready.notify_all()
+
+        def download() -> None:
+            while (job := to_download.get()) is not DONE:
+                index, item = job
+                if stop.is_set():
+                    continue
+                try:
+                    with self.budget:
+                        content = self.fetch(item if key is None else key(item))
+                    downloaded.put((index, item, content))
+                except Exception as error:
+                    downloaded.put((index, item, error))
+            downloaded.put(DONE)
+
+        def dispatch() -> None:
+            finished = 0
+            while finished < self.io_workers:
+                job = downloaded.get()
+                if job is DONE:
+                    finished += 1
+                    continue
+                index, item, content = job
+                if stop.is_set():
+                    continue
+                if isinstance(content, Exception):
+                    future = Future()
+                    future.set_exception(content)
+                else:
+                    try:
+                        future = self._submit(parse, content)
+                    except RuntimeError as error:
+                        # consumer stopped and the parser pool has already been shut down
+                        if stop.is_set():
+                            continue
+                        # broken parser pool (crashed worker, script without __main__ guard) - the error
+                        # takes the place of the item, so the consumer re-raises it instead of waiting for it
+                        future = Future()
+                        future.set_exception(error)
+                with ready:
+                    results[index] = (item, future)
+                    ready.notify_all()
+
+        threads = [threading.Thread(target=feed, daemon=True),
+                   threading.Thread(target=dispatch, daemon=True)]
+        threads += [threading.Thread(target=download, daemon=True) for _ in range(self.io_workers)]
+        for thread in threads:
+            thread.start()
+
+        next_index = 0
+        try:
+            while True:
+                with ready:
+                    while next_index not in results and (state["total"] is None or next_index < state["total"]):
+                        ready.wait()
+                    if next_index not in results:
+                        break
+                    item, future = results.pop(next_index)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    if not return_exceptions:
+                        raise
+                    result = error
+                else:
+                    if self.pool is not None:
+                        result, observations = result
+                        METRICS.merge(observations)
+                yield item, result
+                window.release()
+                next_index += 1
+            if state["error"] is not None:
+                raise state["error"]
+        finally:
+            stop.set()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+async def async_iterate(iterator: Iterator) -> AsyncIterator:
+    """Turns a blocking iterator into an async one - every next item is produced in a worker thread,
+    so the event loop keeps running while pages are downloaded. The iterator is closed
+    when the async iteration stops (also early)."""
+    loop = asyncio.get_running_loop()
+    try:
+        while (item := await loop.run_in_executor(None, next, iterator, DONE)) is not DONE:
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await loop.run_in_executor(None, close)
@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+import time
+
+
+class SeenIndex:
+    """Persistent index of already scraped offers (sqlite table offer id -> time of scraping).
+    Incremental runs consult it to skip offers which are already stored in the output file,
+    optionally re-scraping the ones older than given number of days."""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS seen "
+                                    "(offer_id TEXT PRIMARY KEY, scraped_at REAL NOT NULL) WITHOUT ROWID")
+
+    def should_skip(self, offer_id: str, refetch_after_days: float | None = None) -> bool:
+        """Offer is skipped when it was scraped before (and not earlier than refetch_after_days ago)"""
+        with self.lock:
+            row = self.connection.execute("SELECT scraped_at FROM seen WHERE offer_id = ?", (offer_id,)).fetchone()
+        if row is None:
+            return False
+        if refetch_after_days is None:
+            return True
+        return time.time() - row[0] < refetch_after_days * 24 * 3600
+
+    def add(self, offer_ids: list[str]) -> None:
+        """Marks offers as scraped, should be called once their rows are written (and flushed)"""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO seen (offer_id, scraped_at) VALUES (?, ?)",
+                                        [(offer_id, now) for offer_id in offer_ids])
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,154 @@
+import time
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from scraper.limiter import SCHEDULER
+from scraper.cache import ResponseCache, CacheMissError
+from scraper.metrics import METRICS, timed
+
+### transport settings ###
+"""All the scraper requests go through one shared, pooled session. Connections are kept alive
+and reused between requests (no new TCP + TLS handshake per offer), responses are compressed
+and transient errors (429, 5xx, dropped connections) are retried with exponential backoff.
+Retries are made by fetch, not inside the session, so every attempt waits for its turn in the host
+scheduler - a retried request never exceeds the limits of its host."""
+
+TIMEOUT = (5, 30)            # (connect, read) in seconds
+POOL_SIZE = 32
+RETRIES = 5
+BACKOFF_FACTOR = 0.5         # sleeps 0.5, 1, 2, 4 ... seconds between retries
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "pl-PL,pl;q=0.9,en;q=0.8",
+    "Connection": "keep-alive",
+}
+
+
+def create_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """Function creates a session with connection pools sized for concurrent workers.
+    The session makes no retries of its own, failed requests are retried by fetch"""
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = create_session()
+
+
+CACHE: ResponseCache | None = None
+
+
+def use_cache(cache: ResponseCache | None) -> None:
+    """Function turns on (or off, when None is given) the on-disk response cache for all the requests"""
+    global CACHE
+    CACHE = cache
+
+
+def cached_response(url: str, entry: dict, body: bytes) -> requests.Response:
+    """Function rebuilds a response object from a cache entry"""
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = entry["encoding"]
+    response._content = body
+    return response
+
+
+def retry_delay(response: requests.Response | None, retry: int) -> float:
+    """Backoff before the retry-th retry (0.5, 1, 2, 4 ... seconds), a longer Retry-After (in seconds)
+    of a throttling response is respected"""
+    delay = BACKOFF_FACTOR * 2 ** (retry - 1)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after is not None else delay
+    except ValueError:
+        return delay
+
+
+def fetch(url: str, **kwargs) -> requests.Response:
+    """Function downloads given url with the shared session. Every attempt waits for its turn in the host
+    scheduler, which limits requests / sec and in-flight requests per domain and adapts these limits
+    to host latency and throttling responses. Transient errors (RETRY_STATUSES, dropped connections,
+    timeouts) are retried up to RETRIES times with exponential backoff, the backoff is slept outside
+    of the host limits. When retries are exhausted the last response is returned (the same way a bare
+    requests.get would) or the last error is raised.
+    Latency, time to first byte, downloaded (compressed) bytes, retries and errors are reported to metrics."""
+
+    kwargs.setdefault("timeout", TIMEOUT)
+    limiter = SCHEDULER.limiter(url)
+    start = time.perf_counter()
+    response, retries = None, 0
+    try:
+        while True:
+            response, healthy = None, False
+            limiter.acquire()
+            attempt_start = time.perf_counter()
+            try:
+                response = SESSION.get(url, **kwargs)
+                healthy = response.status_code not in THROTTLE_STATUSES
+            except (requests.ConnectionError, requests.Timeout):
+                if retries >= RETRIES:
+                    raise
+            finally:
+                limiter.release(time.perf_counter() - attempt_start, healthy)
+            if response is not None and (response.status_code not in RETRY_STATUSES or retries >= RETRIES):
+                return response
+            retries += 1
+            time.sleep(retry_delay(response, retries))
+    finally:
+        latency = time.perf_counter() - start
+        METRICS.observe("fetch", latency)
+        if response is None:
+            METRICS.record_request(urlsplit(url).netloc, latency, retries=retries, error=True)
+        else:
+            size = response.raw.tell() if hasattr(response.raw, "tell") else len(response.content)
+            METRICS.record_request(urlsplit(url).netloc, latency, response.elapsed.total_seconds(), size,
+                                   retries=retries, error=response.status_code >= 400)
+
+
+@timed("download")
+def get_page(url: str, **kwargs) -> requests.Response:
+    """Function returns response for given url. When the cache is turned on, fresh cached responses
+    are served from disk, stale ones are revalidated with a conditional request (ETag / Last-Modified)
+    and new 200 responses are stored. In offline mode CacheMissError is raised for urls not in cache."""
+
+    if CACHE is None:
+        return fetch(url, **kwargs)
+
+    entry = CACHE.get(url)
+    if entry is not None and (CACHE.offline or CACHE.is_fresh(entry)):
+        body = CACHE.load_body(entry)
+        if body is not None:
+            return cached_response(url, entry, body)
+        # evicted after the entry was read
+        entry = None
+    if CACHE.offline:
+        raise CacheMissError(url)
+
+    headers = kwargs.get("headers", {})
+    if entry is not None:
+        kwargs["headers"] = {**CACHE.validators(entry), **headers}
+    response = fetch(url, **kwargs)
+
+    if response.status_code == 304 and entry is not None:
+        body = CACHE.load_body(entry)
+        if body is not None:
+            return cached_response(url, CACHE.refresh(url, entry), body)
+        # evicted during the revalidation, the page is downloaded again
+        response = fetch(url, **(kwargs | {"headers": headers}))
+    if response.status_code == 200:
+        CACHE.store(url, response.content, response.headers, response.encoding)
+    return response
@@ -0,0 +1,162 @@
+import gzip
+import json
+import math
+from abc import ABC, abstractmethod
+from csv import writer
+from dataclasses import dataclass
+from typing import Callable
+from scraper.metrics import METRICS
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str = "string"        # "string" or "list" (list of strings)
+
+
+def clean_value(value):
+    """Missing values (nan) are stored as nulls in the typed formats"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class Sink(ABC):
+    """Output file receiving scraped rows. Rows are buffered and written in batches (row groups),
+    on_flush callback is called every time buffered rows are safely written to the file.
+    Formats implement _write_batch."""
+
+    def __init__(self, path: str, columns: list[Column], append: bool = False,
+                 batch_size: int = 50, on_flush: Callable[[], None] | None = None):
+        self.path = path
+        self.columns = columns
+        self.append = append
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.buffer: list[list] = []
+
+    def write(self, row: list) -> None:
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            with METRICS.timer("write"):
+                self._write_batch(self.buffer)
+            self.buffer = []
+        if self.on_flush is not None:
+            self.on_flush()
+
+    @abstractmethod
+    def _write_batch(self, rows: list[list]) -> None:
+        """Writes a batch of rows to the file"""
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CsvSink(Sink):
+    """Csv file (gzip compressed when the name ends with .gz). Lists are written as text"""
+
+    def __init__(self, path: str, columns: list[Column], append: bool = False, **kwargs):
+        super().__init__(path, columns, append, **kwargs)
+        mode = 'a' if append else 'w'
+        if path.endswith(".gz"):
+            self.file = gzip.open(path, mode + 't', encoding='utf8', newline='')
+        else:
+            self.file = open(path, mode, encoding='utf8', newline='')
+        self.writer = writer(self.file)
+        if not append:
+            self.writer.writerow([column.name for column in columns])
+
+    def _write_batch(self, rows: list[list]) -> None:
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self.file.close()
+
+
+class JsonlSink(Sink):
+    """Json lines file, one object per row with lists kept as json arrays"""
+
+    def __init__(self, path: str, columns: list[Column], append: bool = False, **kwargs):
+        super().__init__(path, columns, append, **kwargs)
+        mode = 'a' if append else 'w'
+        if path.endswith(".gz"):
+            self.file = gzip.open(path, mode + 't', encoding='utf8')
+        else:
+            self.file = open(path, mode, encoding='utf8')
+        self.names = [column.name for column in columns]
+
+    def _write_batch(self, rows: list[list]) -> None:
+        lines = (json.dumps(dict(zip(self.names, map(clean_value, row))), ensure_ascii=False) for row in rows)
+        self.file.write("".join(f"{line}\n" for line in lines))
+        self.file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(Sink):
+    """Parquet file with typed schema (list columns are stored as list<string>).
+    Every batch is written as a separate row group, so memory usage does not grow with the file."""
+
+    def __init__(self, path: str, columns: list[Column], append: bool = False, batch_size: int = 10_000, **kwargs):
+        if append:
+            raise ValueError("Parquet files cannot be appended, use csv or jsonl output for incremental or resumed runs")
+        super().__init__(path, columns, append, batch_size=batch_size, **kwargs)
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        types = {"string": pa.string(), "list": pa.list_(pa.string())}
+        self.schema = pa.schema([(column.name, types[column.type]) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def _write_batch(self, rows: list[list]) -> None:
+        data = {}
+        for number, column in enumerate(self.columns):
+            values = [clean_value(row[number]) for row in rows]
+            if column.type == "list":
+                data[column.name] = [None if value is None else [str(item) for item in value] for value in values]
+            else:
+                data[column.name] = [None if value is None else str(value) for value in values]
+        self.writer.write_table(self.pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self) -> None:
+        super().close()
+        self.writer.close()
+
+
+SINKS = {
+    ".csv": CsvSink,
+    ".csv.gz": CsvSink,
+    ".jsonl": JsonlSink,
+    ".jsonl.gz": JsonlSink,
+    ".parquet": ParquetSink,
+}
+
+
+def open_sink(file_name: str, columns: list[Column], append: bool = False, key: str | None = None,
+              **kwargs) -> Sink:
+    """Function picks the output format by file extension (csv, csv.gz, jsonl, jsonl.gz, parquet
+    or sqlite - history store of offer changes, see history.py). Key is the column identifying offers
+    (KEY of the site), the history store keeps the versions of offers by it ("id" by default)"""
+    for extension in sorted(SINKS, key=len, reverse=True):
+        if file_name.endswith(extension):
+            return SINKS[extension](file_name, columns, append=append, **kwargs)
+    if file_name.endswith(".sqlite"):
+        from scraper.history import HistorySink
+        return HistorySink(file_name, columns, append=append, **({"key": key} if key else {}), **kwargs)
+    raise ValueError(f"Unsupported output format: {file_name}, available formats: {list(SINKS) + ['.sqlite']}")
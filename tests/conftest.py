@@ -0,0 +1,23 @@
+import importlib
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = ROOT / "benchmarks" / "fixtures"
+# modules of the site projects, every project has its own functions, elements, ... on the module search path
+SITE_MODULES = ("functions", "elements", "errors", "health", "normalize", "performance", "schema")
+
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def site(monkeypatch):
+    """Imports functions module of a site project (cars, housing, job_offers). Projects use the same module
+    names, so the modules of other projects are dropped for the time of the test"""
+    def load(directory: str):
+        monkeypatch.syspath_prepend(str(ROOT / directory))
+        for name in SITE_MODULES:
+            monkeypatch.delitem(sys.modules, name, raising=False)
+        return importlib.import_module("functions")
+    return load
@@ -0,0 +1,47 @@
+import pytest
+from scraper.cache import ResponseCache
+
+URL = "https://example.com/offer/1"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache"), ttl=3600)
+
+
+def test_stored_response_is_served(cache):
+    cache.store(URL, b"<html></html>", {"ETag": '"1"'}, "utf-8")
+    entry = cache.get(URL)
+    assert cache.load_body(entry) == b"<html></html>"
+    assert cache.validators(entry) == {"If-None-Match": '"1"'}
+
+
+def test_body_evicted_after_the_entry_was_read_is_a_miss(cache):
+    cache.store(URL, b"<html></html>", {}, "utf-8")
+    entry = cache.get(URL)
+    cache._object_path(entry["digest"]).unlink()
+    assert cache.load_body(entry) is None
+    assert cache.get(URL) is None
+
+
+def test_evicted_entry_is_a_miss(cache):
+    cache.store(URL, b"<html></html>", {}, "utf-8")
+    cache._entry_path(URL).unlink()
+    assert cache.get(URL) is None
+
+
+def test_evicted_body_is_downloaded_again(cache, monkeypatch):
+    session = pytest.importorskip("scraper.session")
+    cache.store(URL, b"<html>old</html>", {}, "utf-8")
+    original_load_body = cache.load_body
+
+    def load_body(entry):
+        # another thread evicts the body between get and load_body
+        cache._object_path(entry["digest"]).unlink(missing_ok=True)
+        return original_load_body(entry)
+
+    monkeypatch.setattr(cache, "load_body", load_body)
+    monkeypatch.setattr(session, "fetch", lambda url, **kwargs: session.cached_response(
+        url, {"headers": {}, "encoding": "utf-8"}, b"<html>new</html>"))
+    monkeypatch.setattr(session, "CACHE", cache)
+    assert session.get_page(URL).content == b"<html>new</html>"
@@ -0,0 +1,23 @@
+from scraper.checkpoint import Checkpoint
+
+
+def test_resumed_run_skips_recorded_pages_and_offers(tmp_path):
+    path = str(tmp_path / "data.csv.checkpoint")
+    with Checkpoint(path) as checkpoint:
+        checkpoint.complete([("offer", "https://example.com/offer/1"), ("page", "https://example.com/page/1")])
+
+    with Checkpoint(path, resume=True) as checkpoint:
+        assert checkpoint.offer_done("https://example.com/offer/1")
+        assert checkpoint.page_done("https://example.com/page/1")
+        assert not checkpoint.offer_done("https://example.com/offer/2")
+
+
+def test_fresh_run_starts_a_new_journal(tmp_path):
+    path = str(tmp_path / "data.csv.checkpoint")
+    with Checkpoint(path) as checkpoint:
+        checkpoint.complete([("offer", "https://example.com/offer/1")])
+
+    with Checkpoint(path) as checkpoint:
+        assert not checkpoint.offer_done("https://example.com/offer/1")
+    with Checkpoint(path, resume=True) as checkpoint:
+        assert not checkpoint.offer_done("https://example.com/offer/1")
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import pytest
+from conftest import ROOT
+from scraper.__main__ import main, parse_arguments, search_criteria
+
+
+def test_defaults_of_the_site():
+    args = parse_arguments(["cars"])
+    assert (args.format, args.workers, args.engine, args.pages) == ("csv", 8, "html", None)
+    assert search_criteria(args) == [("audi", "audi"), ("bmw", "bmw"), ("volkswagen", "volkswagen")]
+
+
+@pytest.mark.parametrize("argv", [["boats"], ["cars", "--format", "xlsx"], ["jobs", "--engine", "xml"],
+                                  ["housing", "--market", "rental"], ["cars", "--pages", "two"]])
+def test_wrong_arguments_are_rejected(argv, capsys):
+    with pytest.raises(SystemExit):
+        parse_arguments(argv)
+    assert "usage: python -m scraper" in capsys.readouterr().err
+
+
+def test_housing_jobs_are_cities_and_markets(site):
+    site("housing")
+    args = parse_arguments(["housing", "--search", "warszawa", "krakow", "--market", "primary", "--limit", "36"])
+    assert search_criteria(args) == [("warszawa_pierwotny", ["pierwotny", "warszawa", 36]),
+                                     ("krakow_pierwotny", ["pierwotny", "krakow", 36])]
+
+
+def test_dry_run_lists_the_jobs(site, monkeypatch, capsys):
+    pytest.importorskip("requests")
+    site("job_offers")
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    assert main(["jobs", "--search", "backend", "devops", "--pages", "3", "--format", "parquet", "--dry-run"]) == 0
+    assert "2 jobs (3 pages each) would be merged into TEST_DATA.parquet" in capsys.readouterr().out
+
+
+def test_sqlite_output_is_available_for_every_site():
+    for name in ("cars", "housing", "jobs"):
+        assert parse_arguments([name, "--format", "sqlite"]).format == "sqlite"
+
+
+def test_arguments_are_parsed_without_importing_the_scraper():
+    code = ("import sys; from scraper.__main__ import parse_arguments; parse_arguments(['cars']); "
+            "print(sorted({'requests', 'functions', 'pandas', 'pyarrow'} & set(sys.modules)))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
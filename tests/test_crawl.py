@@ -0,0 +1,98 @@
+import csv
+import pytest
+from scraper.frontier import SqliteFrontier, Task, merge_shards, shard_name
+
+OFFERS = [f"https://example.com/offer/{n}" for n in range(10)]
+
+
+@pytest.fixture
+def cars(site, monkeypatch):
+    """Cars project with pages served from memory, offer 7 can not be parsed"""
+    pytest.importorskip("requests")
+    functions = site("cars")
+    downloaded = []
+
+    def download_offer_page(url: str) -> bytes:
+        downloaded.append(url)
+        return url.encode()
+
+    def parse_offer_page(content: bytes) -> list:
+        url = content.decode()
+        if url.endswith("/7") and functions.POISONED:
+            raise ValueError(f"broken offer {url}")
+        return [url] + [""] * (len(functions.OFFER_COLUMNS) - 1)
+
+    monkeypatch.setattr(functions, "POISONED", True, raising=False)
+    monkeypatch.setattr(functions, "download_offer_page", download_offer_page)
+    monkeypatch.setitem(functions.ENGINES, "html", parse_offer_page)
+    functions.downloaded = downloaded
+    return functions
+
+
+def read_column(file_name) -> list[str]:
+    with open(file_name, encoding="utf8", newline="") as file:
+        return [row[0] for row in list(csv.reader(file))[1:]]
+
+
+def test_poisoned_offer_fails_alone(cars, tmp_path):
+    with SqliteFrontier(str(tmp_path / "frontier.sqlite"), max_attempts=3) as frontier:
+        frontier.add(Task("offer", url) for url in OFFERS)
+        written = cars.crawl_worker(frontier, str(tmp_path / "data.csv"), "worker", workers=4, parse_workers=0,
+                                    poll_interval=0)
+        assert frontier.stats() == {"pending": 0, "leased": 0, "done": 9, "failed": 1}
+
+    assert written == 9
+    assert sorted(read_column(tmp_path / "data.csv")) == sorted(url for url in OFFERS if not url.endswith("/7"))
+    # only the poisoned offer is retried
+    assert len(cars.downloaded) == 9 + 3
+
+
+def test_leases_of_crashed_worker_are_taken_over(cars, tmp_path):
+    cars.POISONED = False
+    with SqliteFrontier(str(tmp_path / "frontier.sqlite"), max_attempts=3) as frontier:
+        frontier.add(Task("offer", url) for url in OFFERS)
+        # the worker dies right after leasing its batch
+        frontier.lease("crashed", 4, lease_seconds=0)
+        written = cars.crawl_worker(frontier, str(tmp_path / "data.csv"), "worker", workers=4, parse_workers=0,
+                                    poll_interval=0)
+        assert frontier.stats()["done"] == 10
+
+    assert written == 10
+    assert sorted(read_column(tmp_path / "data.csv")) == sorted(OFFERS)
+
+
+def test_resumed_download_continues_interrupted_run(cars, tmp_path, monkeypatch):
+    pytest.importorskip("tqdm")
+    pages = {1: OFFERS[:5], 2: OFFERS[5:]}
+    monkeypatch.setattr(cars, "get_all_page_listings", lambda url: pages.get(int(url.rsplit("=", 1)[-1]), []))
+    monkeypatch.setattr(cars, "extract_offer_url", lambda offer: offer)
+    file_name = str(tmp_path / "data.csv")
+
+    # the run is interrupted by the poisoned offer, offers written so far are journaled
+    with pytest.raises(ValueError):
+        cars.download_data(file_name, "audi", 3, workers=1, parse_workers=0)
+    assert read_column(file_name) == OFFERS[:7]
+
+    cars.POISONED = False
+    cars.downloaded.clear()
+    cars.download_data(file_name, "audi", 3, workers=1, parse_workers=0, resume=True)
+    assert read_column(file_name) == OFFERS
+    assert cars.downloaded == OFFERS[7:]
+
+
+def test_shards_are_merged_by_offer_url(cars, tmp_path):
+    cars.POISONED = False
+    file_name = str(tmp_path / "data.csv")
+    with SqliteFrontier(str(tmp_path / "frontier.sqlite")) as frontier:
+        frontier.add(Task("offer", url) for url in OFFERS)
+        cars.crawl_worker(frontier, shard_name(file_name, "first"), "first", parse_workers=0, batch_size=5,
+                          poll_interval=0)
+    # a worker which lost its leases wrote some of the offers into its shard as well
+    with open(shard_name(file_name, "second"), "w", encoding="utf8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow([column.name for column in cars.OUTPUT_COLUMNS])
+        writer.writerows([url] + [""] * (len(cars.OFFER_COLUMNS) - 1) + [url] for url in OFFERS[:3])
+
+    shards = [shard_name(file_name, worker) for worker in ("first", "second")]
+    merge_shards(shards, file_name, key="url", columns=cars.OUTPUT_COLUMNS)
+    assert sorted(read_column(file_name)) == sorted(OFFERS)
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+from scraper.dedup import BloomFilter, UrlDeduplicator, normalize_url
+from scraper.orchestrator import Job, run_jobs
+
+
+def test_tracking_parameters_fragments_and_slashes_are_dropped():
+    assert (normalize_url("HTTPS://www.Otodom.pl/pl/oferta/abc/?utm_source=x&b=2&a=1#photos")
+            == normalize_url("https://www.otodom.pl/pl/oferta/abc?a=1&b=2")
+            == "https://www.otodom.pl/pl/oferta/abc?a=1&b=2")
+
+
+def test_duplicates_are_counted():
+    dedup = UrlDeduplicator()
+    urls = ["https://a.pl/1", "https://a.pl/1/", "https://a.pl/2?ref=home", "https://a.pl/2"]
+    assert [dedup.is_new(url) for url in urls] == [True, False, True, False]
+    assert (dedup.total, dedup.duplicates, dedup.ratio) == (4, 2, 0.5)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    assert all(bloom.add(f"https://a.pl/{number}") for number in range(1000))
+    assert not any(bloom.add(f"https://a.pl/{number}") for number in range(1000))
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    for number in range(10_000):
+        bloom.add(f"https://a.pl/{number}")
+    # probed urls are added as well, so only a few of them are checked
+    false_positives = sum(not bloom.add(f"https://b.pl/{number}") for number in range(1000))
+    assert false_positives < 30
+    # about 9.6 bits per url at 1% false positive rate
+    assert len(bloom.bits) < 10_000 * 1.25
+
+
+def test_bloom_filter_size_at_default_error_rate():
+    # about 14.4 bits (1.8 bytes) per url at 0.1% false positive rate
+    assert 1.75 < len(BloomFilter(capacity=10_000).bits) / 10_000 < 1.85
+
+
+def test_jobs_share_the_register_of_urls(tmp_path):
+    registers = []
+
+    def download_data(file_name, search_criteria, number_of_pages, pipeline=None, dedup=None, **options):
+        registers.append(dedup)
+        dedup.is_new("https://a.pl/offer/1")
+
+    site = SimpleNamespace(download_data=download_data, download_offer_page=lambda url: b"",
+                           parse_offer_page=lambda content: [])
+    jobs = [Job(city, 1, str(tmp_path / f"{city}.csv")) for city in ("warszawa", "krakow")]
+    assert run_jobs(site, jobs, parse_workers=0, bloom_capacity=100) == []
+    assert registers[0] is registers[1]
+    assert registers[0].duplicates == 1
+    assert isinstance(registers[0].urls, BloomFilter)
@@ -0,0 +1,97 @@
+import csv
+from dataclasses import dataclass
+from types import SimpleNamespace
+import pytest
+from scraper import driver
+from scraper.merge import read_rows
+from scraper.sinks import Column
+
+PAGES = {"page/1": ["offer/1", "offer/2"], "page/2": ["offer/2", "offer/3"]}
+
+
+@dataclass
+class Record:
+    url: str
+    title: str
+
+    def row(self) -> list:
+        return [self.url.rsplit("/", 1)[-1], self.title]
+
+
+def make_site(downloaded: list) -> SimpleNamespace:
+    """Site with result and offer pages served from memory, offers are tracked in the seen index by id"""
+
+    def download_offer_page(url: str) -> bytes:
+        downloaded.append(url)
+        return f"title {downloaded.count(url)} of {url}".encode()
+
+    return SimpleNamespace(
+        search_pages=lambda search_criteria, number_of_pages: [f"page/{n}" for n in range(1, number_of_pages + 1)],
+        page_offers=lambda page_url, health: [(url, None) for url in PAGES.get(page_url, [])],
+        download_offer_page=download_offer_page,
+        ENGINES={"html": bytes.decode},
+        offer_record=lambda offer_url, listing_info, title, health: Record(offer_url, title),
+        OUTPUT_COLUMNS=[Column("id"), Column("title")], KEY="id",
+        seen_key=lambda offer_url: offer_url.rsplit("/", 1)[-1])
+
+
+def read(path) -> list[list[str]]:
+    with open(path, encoding="utf8", newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_offers_of_all_result_pages_are_yielded_once():
+    downloaded = []
+    offers = list(driver.iter_offers(make_site(downloaded), None, 3, parse_workers=0))
+    assert offers == [Record("offer/1", "title 1 of offer/1"), Record("offer/2", "title 1 of offer/2"),
+                      Record("offer/3", "title 1 of offer/3")]
+    assert downloaded == ["offer/1", "offer/2", "offer/3"]
+
+
+def test_unknown_engine_and_shallow_mode_are_rejected():
+    site = make_site([])
+    with pytest.raises(ValueError, match="engine"):
+        next(driver.iter_offers(site, None, 1, engine="json"))
+    with pytest.raises(ValueError, match="Shallow"):
+        next(driver.iter_offers(site, None, 1, shallow=True))
+
+
+def test_incremental_download_skips_offers_by_seen_key(tmp_path):
+    pytest.importorskip("tqdm")
+    downloaded = []
+    site = make_site(downloaded)
+    file_name = str(tmp_path / "offers.csv")
+    driver.download_data(site, file_name, None, 1, parse_workers=0, incremental=True)
+    downloaded.clear()
+
+    driver.download_data(site, file_name, None, 2, parse_workers=0, incremental=True)
+    assert downloaded == ["offer/3"]
+    assert [row[0] for row in read(file_name)] == ["id", "1", "2", "3"]
+
+
+@pytest.mark.parametrize("extension", ["csv", "jsonl.gz"])
+def test_offers_scraped_again_keep_only_their_latest_row(tmp_path, extension):
+    pytest.importorskip("tqdm")
+    downloaded = []
+    site = make_site(downloaded)
+    file_name = str(tmp_path / f"offers.{extension}")
+    driver.download_data(site, file_name, None, 1, parse_workers=0, incremental=True)
+
+    # every stored offer is older than 0 days, so all of them are scraped again
+    driver.download_data(site, file_name, None, 2, parse_workers=0, incremental=True, refetch_after_days=0)
+    header, rows = read_rows(file_name)
+    assert sorted(rows) == [["1", "title 2 of offer/1"], ["2", "title 2 of offer/2"], ["3", "title 1 of offer/3"]]
+
+
+def test_page_with_all_offers_skipped_is_journaled(tmp_path):
+    pytest.importorskip("tqdm")
+    downloaded = []
+    site = make_site(downloaded)
+    file_name = str(tmp_path / "offers.csv")
+    driver.download_data(site, file_name, None, 1, parse_workers=0, incremental=True)
+
+    # offers of the first page are already stored, the page is done without writing anything,
+    # so a resumed run does not request it again
+    driver.download_data(site, file_name, None, 1, parse_workers=0, incremental=True)
+    with open(f"{file_name}.checkpoint", encoding="utf8") as journal:
+        assert journal.read().splitlines() == ["page\tpage/1"]
@@ -0,0 +1,36 @@
+import importlib.util
+from string import Template
+import pytest
+from conftest import FIXTURES
+
+
+@pytest.fixture
+def jobs(site):
+    pytest.importorskip("requests")
+    if importlib.util.find_spec("lxml") is None:
+        pytest.importorskip("bs4")
+    return site("job_offers")
+
+
+def offer_page(n: int = 1) -> bytes:
+    template = Template((FIXTURES / "job_offers" / "offer.html").read_text(encoding="utf8"))
+    return template.substitute(n=n).encode("utf8")
+
+
+def test_json_engine_gives_the_same_row_as_html_engine(jobs):
+    content = offer_page()
+    assert jobs.parse_offer_json(content) == jobs.parse_offer_page(content)
+
+
+def test_json_engine_fills_missing_columns_with_html_defaults(jobs):
+    content = offer_page().replace(b'"nices"', b'"unknown"').replace(b'"details": [', b'"other": [')
+    row = dict(zip(jobs.OFFER_SCHEMA.columns, jobs.parse_offer_json(content)))
+    assert row["requirements_secondary"] == ["No secondary requirements"]
+    assert row["specs"] == []
+
+
+def test_pages_without_app_state_are_parsed_as_html(jobs):
+    content = offer_page()
+    start = content.index(b"<script")
+    content = content[:start] + content[content.index(b"</script>") + len(b"</script>"):]
+    assert jobs.parse_offer_json(content) == jobs.parse_offer_page(content)
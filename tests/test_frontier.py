@@ -0,0 +1,107 @@
+import time
+import pytest
+from scraper.frontier import Frontier, SqliteFrontier, RedisFrontier, LocalRedis, Task
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def frontier(request, tmp_path):
+    if request.param == "sqlite":
+        frontier = SqliteFrontier(str(tmp_path / "frontier.sqlite"), max_attempts=3)
+    else:
+        frontier = RedisFrontier(LocalRedis(), max_attempts=3)
+    with frontier:
+        yield frontier
+
+
+def offers(count: int) -> list[Task]:
+    return [Task("offer", f"https://example.com/offer/{n}") for n in range(count)]
+
+
+def test_urls_are_queued_once(frontier):
+    assert frontier.add(offers(3)) == 3
+    assert frontier.add(offers(4)) == 1
+    assert frontier.stats()["pending"] == 4
+
+
+def test_offers_are_leased_before_result_pages(frontier):
+    frontier.add([Task("page", "https://example.com/page/1")] + offers(2))
+    assert [task.kind for task in frontier.lease("worker", 3)] == ["offer", "offer", "page"]
+
+
+def test_leased_urls_are_not_handed_out_again(frontier):
+    frontier.add(offers(4))
+    first = {task.url for task in frontier.lease("first", 3)}
+    second = {task.url for task in frontier.lease("second", 3)}
+    assert len(first) == 3 and len(second) == 1 and not first & second
+    assert frontier.lease("third", 3) == []
+    assert not frontier.finished()
+
+
+def test_acknowledged_urls_are_finished(frontier):
+    frontier.add(offers(2))
+    frontier.ack("worker", (task.url for task in frontier.lease("worker", 2)))
+    assert frontier.finished()
+    assert frontier.stats()["done"] == 2
+
+
+def test_expired_leases_are_requeued(frontier):
+    frontier.add(offers(2))
+    leased = {task.url for task in frontier.lease("crashed", 2, lease_seconds=0.01)}
+    time.sleep(0.05)
+    assert {task.url for task in frontier.lease("worker", 2)} == leased
+
+
+def test_failed_urls_are_retried_and_set_aside_after_max_attempts(frontier):
+    frontier.add(offers(1))
+    for _ in range(2):
+        frontier.fail("worker", (task.url for task in frontier.lease("worker", 1)))
+        assert frontier.stats()["pending"] == 1
+    frontier.fail("worker", (task.url for task in frontier.lease("worker", 1)))
+    assert frontier.stats()["failed"] == 1
+    assert frontier.lease("worker", 1) == []
+    assert frontier.finished()
+
+
+def test_acks_of_a_worker_which_lost_its_lease_are_ignored(frontier):
+    frontier.add(offers(1))
+    [task] = frontier.lease("slow", 1, lease_seconds=0.01)
+    time.sleep(0.05)
+    assert frontier.lease("worker", 1) == [task]
+    # the slow worker comes back after its lease was handed out again
+    frontier.ack("slow", [task.url])
+    frontier.fail("slow", [task.url])
+    assert frontier.stats() == {"pending": 0, "leased": 1, "done": 0, "failed": 0}
+    frontier.ack("worker", [task.url])
+    assert frontier.stats()["done"] == 1
+
+
+def test_urls_leased_by_other_workers_can_not_be_acknowledged(frontier):
+    frontier.add(offers(1))
+    [task] = frontier.lease("worker", 1)
+    frontier.ack("other", [task.url])
+    assert frontier.stats()["leased"] == 1
+
+
+def test_redis_lease_is_handed_over_completely_or_not_at_all(monkeypatch):
+    client = LocalRedis()
+    frontier = RedisFrontier(client)
+    frontier.add(offers(2))
+
+    def hmget(*args):
+        raise ConnectionError("worker lost its connection in the middle of the lease")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(client, "hmget", hmget)
+        with pytest.raises(ConnectionError):
+            frontier.lease("crashed", 2)
+    assert frontier.stats() == {"pending": 2, "leased": 0, "done": 0, "failed": 0}
+    assert len(frontier.lease("worker", 2)) == 2
+
+
+def test_frontiers_have_to_implement_the_whole_interface():
+    class QueueOnly(Frontier):
+        def add(self, tasks):
+            return 0
+
+    with pytest.raises(TypeError):
+        QueueOnly()
@@ -0,0 +1,68 @@
+import importlib
+import pytest
+from scraper.parsers import parse_html
+
+OLD = '<li class="old-class"><span class="price">{n} zł</span></li>'
+NEW = '<li data-cy="listing-item"><span data-price="1">{n} zł</span></li>'
+
+
+@pytest.fixture
+def housing(site):
+    """Health monitor and css styles of the housing project"""
+    site("housing")
+    return importlib.import_module("health"), importlib.import_module("elements"), importlib.import_module("errors")
+
+
+def selectors(elements) -> dict:
+    CssStyle = elements.CssStyle
+    return {"listing": CssStyle("li", "old-class", fallbacks=(CssStyle(None, attrs={"data-cy": "listing-item"}),)),
+            "price": CssStyle("span", "price", fallbacks=(CssStyle(None, attrs={"data-price": "1"}),))}
+
+
+def page(template: str, count: int = 10):
+    return parse_html(f"<html><ul>{''.join(template.format(n=n) for n in range(count))}</ul></html>".encode())
+
+
+def test_fallback_is_tried_first_once_it_matches_more(housing, capsys):
+    health, elements, errors = housing
+    monitor = health.SelectorHealth(selectors(elements), min_checks=5)
+    for listing in monitor.find_all("listing", page(NEW)):
+        assert monitor.find("price", listing) is not None
+    assert monitor.order["price"] == [1, 0]
+    assert monitor.hits["price"] == [0, 10]
+    assert "switched to fallback" in capsys.readouterr().out
+
+    # selectors are checked once, lookups after the check start with the fallback
+    for listing in monitor.find_all("listing", page(NEW)):
+        monitor.find("price", listing)
+    assert monitor.hits["price"] == [0, 20]
+
+
+def test_working_selectors_are_kept(housing):
+    health, elements, errors = housing
+    monitor = health.SelectorHealth(selectors(elements), min_checks=5)
+    for listing in monitor.find_all("listing", page(OLD)):
+        monitor.find("price", listing)
+    monitor.finish()
+    assert monitor.order == {"listing": [0, 1], "price": [0, 1]}
+    assert "price: 100% of 10 lookups" in monitor.report()
+
+
+def test_broken_selectors_abort_the_run(housing):
+    health, elements, errors = housing
+    monitor = health.SelectorHealth(selectors(elements), min_checks=5)
+    listings = monitor.find_all("listing", page('<li class="old-class"><b>{n}</b></li>'))
+    with pytest.raises(errors.HtmlElementNotFoundError):
+        for listing in listings:
+            monitor.find("price", listing)
+
+
+def test_fields_are_checked_after_the_sampled_pages(housing, capsys):
+    health, elements, errors = housing
+    monitor = health.SelectorHealth(selectors(elements), sample_pages=2, abort=False)
+    for _ in range(2):
+        listing = monitor.find_all("listing", page('<li class="old-class"><b>{n}</b></li>', 1))[0]
+        monitor.find("price", listing)
+        monitor.page_done()
+    assert "price" in monitor.checked
+    assert "css classes have probably changed" in capsys.readouterr().out
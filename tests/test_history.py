@@ -0,0 +1,53 @@
+import pytest
+from scraper.history import HistorySink, HistoryStore
+from scraper.merge import StreamingMerger
+from scraper.sinks import Column, open_sink
+
+COLUMNS = [Column("id"), Column("price")]
+
+
+def test_sqlite_output_is_the_history_store(tmp_path):
+    path = str(tmp_path / "ALL_DATA.sqlite")
+    with open_sink(path, COLUMNS) as sink:
+        assert isinstance(sink, HistorySink)
+        sink.write(["1", "500 000 zł"])
+
+    # the second run stores only the changed offer
+    with open_sink(path, COLUMNS, append=True) as sink:
+        sink.write(["1", "480 000 zł"])
+    with open_sink(path, COLUMNS, append=True) as sink:
+        sink.write(["1", "480 000 zł"])
+
+    with HistoryStore(path) as store:
+        assert [row["price"] for _, row in store.history("1")] == ["500 000 zł", "480 000 zł"]
+
+
+def test_offers_are_kept_by_the_key_column(tmp_path):
+    path = str(tmp_path / "TEST_DATA.sqlite")
+    with open_sink(path, [Column("url"), Column("price")], key="url") as sink:
+        sink.write(["https://example.com/offer/1", "89900PLN"])
+    with HistoryStore(path) as store:
+        assert store.history("https://example.com/offer/1")[0][1]["price"] == "89900PLN"
+
+    with pytest.raises(ValueError, match="url column"):
+        open_sink(str(tmp_path / "other.sqlite"), [Column("id")], key="url")
+
+
+@pytest.mark.parametrize("directory", ["cars", "housing", "job_offers"])
+def test_files_of_every_site_are_merged_into_the_history_store(site, tmp_path, directory):
+    pytest.importorskip("requests")
+    functions = site(directory)
+    columns = functions.OUTPUT_COLUMNS
+    key_index = [column.name for column in columns].index(functions.KEY)
+    job_file = str(tmp_path / "d_job.jsonl")
+    with open_sink(job_file, columns) as sink:
+        for number in ("1", "2", "1"):
+            row = [[] if column.type == "list" else "" for column in columns]
+            row[key_index] = number
+            sink.write(row)
+
+    with StreamingMerger(str(tmp_path / "merged.sqlite"), key=functions.KEY, columns=columns) as merger:
+        merger.add(job_file)
+    assert (merger.rows, merger.duplicates) == (2, 1)
+    with HistoryStore(str(tmp_path / "merged.sqlite")) as store:
+        assert [offer_id for offer_id, _, _ in store.changes()] == ["1", "2"]
@@ -0,0 +1,61 @@
+import asyncio
+from string import Template
+from types import SimpleNamespace
+import pytest
+from conftest import FIXTURES
+
+PAGES = 2
+OFFERS_PER_PAGE = 3
+
+
+@pytest.fixture
+def cars(site, monkeypatch):
+    """Cars project with result and offer pages served from the benchmark fixtures"""
+    functions = site("cars")
+    fixtures = {name: Template((FIXTURES / "cars" / f"{name}.html").read_text(encoding="utf8"))
+                for name in ("results", "listing", "offer")}
+    requested = []
+
+    def get_page(url: str, **kwargs):
+        requested.append(url)
+        if "/oferta/" in url:
+            content = fixtures["offer"].safe_substitute(n=url.rsplit("-", 1)[-1])
+        else:
+            page = int(url.rsplit("=", 1)[-1])
+            listings = "".join(fixtures["listing"].safe_substitute(page=page, n=n, id=f"{page}{n}")
+                               for n in range(OFFERS_PER_PAGE)) if page <= PAGES else ""
+            content = fixtures["results"].safe_substitute(page=page, listings=listings)
+        return SimpleNamespace(content=content.encode())
+
+    monkeypatch.setattr(functions, "get_page", get_page)
+    functions.requested = requested
+    return functions
+
+
+def test_offers_are_yielded_as_records(cars):
+    offers = list(cars.iter_offers("audi", PAGES + 1, workers=2, parse_workers=0))
+    assert len(offers) == PAGES * OFFERS_PER_PAGE
+    assert all(isinstance(offer, cars.Offer) for offer in offers)
+    assert offers[0].url.endswith("strona-1-oferta-0-ID10.html")
+    assert (offers[0].brand, offers[0].model) == ("Audi", "A4")
+
+
+def test_closed_iterator_stops_scraping(cars):
+    from scraper.pipeline import Pipeline
+    with Pipeline(cars.download_offer_page, cars.parse_offer_page, io_workers=1, parse_workers=0,
+                  queue_size=2) as pipeline:
+        offers = cars.iter_offers("audi", PAGES + 1, pipeline=pipeline)
+        first = next(offers)
+        offers.close()
+    assert first.url
+    # only a few offers are downloaded ahead of the consumer, the rest of the crawl is not downloaded
+    assert len([url for url in cars.requested if "/oferta/" in url]) < PAGES * OFFERS_PER_PAGE
+
+
+def test_async_iteration(cars):
+    async def collect() -> list:
+        return [offer async for offer in cars.aiter_offers("audi", PAGES + 1, workers=2, parse_workers=0)]
+
+    offers = asyncio.run(collect())
+    assert [offer.url for offer in offers] == [offer.url for offer in cars.iter_offers("audi", PAGES + 1,
+                                                                                       parse_workers=0)]
@@ -0,0 +1,67 @@
+import threading
+from scraper.limiter import HostLimiter, HostPolicy, HostScheduler
+
+
+def test_limits_are_halved_on_unhealthy_response():
+    limiter = HostLimiter(HostPolicy(rate=4.0, initial_in_flight=4, cooldown=60))
+    limiter.acquire()
+    limiter.release(latency=0.1, healthy=False)
+    assert limiter.limit == 2
+    assert limiter.rate == 2
+
+
+def test_slow_response_is_a_sign_of_overload():
+    limiter = HostLimiter(HostPolicy(initial_in_flight=4, latency_target=1.0))
+    limiter.acquire()
+    limiter.release(latency=2.0, healthy=True)
+    assert limiter.limit == 2
+
+
+def test_back_offs_are_spaced_by_cooldown():
+    limiter = HostLimiter(HostPolicy(initial_in_flight=8, cooldown=60))
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(latency=0.1, healthy=False)
+    assert limiter.limit == 4
+
+
+def test_limits_grow_additively_up_to_the_policy():
+    policy = HostPolicy(rate=1000.0, max_in_flight=5, initial_in_flight=4, cooldown=0)
+    limiter = HostLimiter(policy)
+    limiter.acquire()
+    limiter.release(latency=0.1, healthy=False)
+    for _ in range(200):
+        limiter.acquire()
+        limiter.release(latency=0.1, healthy=True)
+    assert limiter.limit == policy.max_in_flight
+    assert limiter.rate == policy.rate
+
+
+def test_limits_never_drop_below_the_minimum():
+    policy = HostPolicy(rate=8.0, min_rate=2.0, min_in_flight=1, initial_in_flight=4, cooldown=0)
+    limiter = HostLimiter(policy)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(latency=0.1, healthy=False)
+    assert limiter.limit == policy.min_in_flight
+    assert limiter.rate == policy.min_rate
+
+
+def test_in_flight_requests_are_limited():
+    limiter = HostLimiter(HostPolicy(rate=1000.0, initial_in_flight=1))
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.2)
+    limiter.release(latency=0.1, healthy=True)
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_hosts_have_separate_limiters():
+    scheduler = HostScheduler({"a.pl": HostPolicy(rate=1.0)})
+    limiter = scheduler.limiter("https://a.pl/offer/1")
+    assert scheduler.limiter("https://a.pl/offer/2") is limiter
+    assert limiter.policy.rate == 1.0
+    assert scheduler.limiter("https://b.pl/offer/1").policy == HostPolicy()
@@ -0,0 +1,59 @@
+import pytest
+from scraper.merge import StreamingMerger, count_records
+from scraper.sinks import Column, open_sink
+
+COLUMNS = [Column("id"), Column("tags", "list")]
+
+
+def write_file(path, rows) -> str:
+    with open_sink(str(path), COLUMNS) as sink:
+        for row in rows:
+            sink.write(row)
+    return str(path)
+
+
+def test_merged_rows_are_deduplicated_by_key(tmp_path):
+    first = write_file(tmp_path / "first.jsonl", [["1", ["a"]], ["2", ["b"]]])
+    second = write_file(tmp_path / "second.jsonl", [["2", ["b"]], ["3", []]])
+    with StreamingMerger(str(tmp_path / "merged.jsonl"), key="id", columns=COLUMNS) as merger:
+        merger.add(first)
+        merger.add(second)
+    assert (merger.rows, merger.duplicates) == (3, 1)
+
+
+def test_parquet_merge_keeps_typed_columns(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    first = write_file(tmp_path / "first.jsonl", [["1", ["a", "b"]], ["2", []]])
+    with StreamingMerger(str(tmp_path / "merged.parquet"), key="id", columns=COLUMNS) as merger:
+        merger.add(first)
+
+    table = parquet.read_table(tmp_path / "merged.parquet")
+    assert str(table.schema.field("tags").type.value_type) == "string"
+    assert table.column("tags").to_pylist() == [["a", "b"], []]
+
+
+def test_files_with_other_columns_are_rejected(tmp_path):
+    with open_sink(str(tmp_path / "other.jsonl"), [Column("url")]) as sink:
+        sink.write(["https://example.com"])
+    with StreamingMerger(str(tmp_path / "merged.jsonl"), columns=COLUMNS) as merger:
+        with pytest.raises(ValueError):
+            merger.add(str(tmp_path / "other.jsonl"))
+
+
+def test_empty_files_are_skipped(tmp_path):
+    empty = write_file(tmp_path / "empty.jsonl", [])
+    (tmp_path / "empty.csv").write_text("")
+    first = write_file(tmp_path / "first.jsonl", [["1", ["a"]]])
+    with StreamingMerger(str(tmp_path / "merged.jsonl"), columns=COLUMNS) as merger:
+        merger.add(empty)
+        merger.add(str(tmp_path / "empty.csv"))
+        merger.add(first)
+    assert merger.rows == 1
+
+
+@pytest.mark.parametrize("extension", ["csv", "jsonl.gz", "parquet"])
+def test_records_are_counted(tmp_path, extension):
+    if extension == "parquet":
+        pytest.importorskip("pyarrow")
+    path = write_file(tmp_path / f"offers.{extension}", [["1", ["a"]], ["2", []], ["3", ["b"]]])
+    assert count_records(path) == 3
@@ -0,0 +1,80 @@
+import json
+from scraper.metrics import BUCKETS, METRICS, Histogram, Metrics, timed
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.observe(value / 1000)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["p50"] == 0.051
+    assert summary["p99"] == 0.1
+    assert summary["max"] == 0.1
+
+
+def test_histogram_buckets():
+    histogram = Histogram()
+    for value in (0.0001, 0.001, 0.3, 100.0):
+        histogram.observe(value)
+    assert histogram.buckets[0] == 1
+    assert histogram.buckets[BUCKETS.index(0.001)] == 1
+    assert histogram.buckets[BUCKETS.index(0.5)] == 1
+    assert histogram.buckets[-1] == 1
+
+
+def test_sample_size_is_bounded():
+    histogram = Histogram(sample_size=100)
+    for value in range(10_000):
+        histogram.observe(value)
+    assert len(histogram.sample) == 100
+    assert histogram.count == 10_000
+
+
+def test_observations_of_parser_processes_are_merged():
+    worker, main = Metrics(), Metrics()
+    with worker.timer("parse"):
+        pass
+    observations = worker.drain()
+    assert worker.stages == {}
+    main.merge(observations)
+    assert main.stages["parse"].count == 1
+
+
+def test_requests_are_counted_per_host():
+    metrics = Metrics()
+    metrics.record_request("a.pl", 0.2, time_to_first_byte=0.1, size=1024, retries=2)
+    metrics.record_request("a.pl", 0.4, error=True)
+    stats = metrics.summary()["hosts"]["a.pl"]
+    assert (stats["requests"], stats["bytes"], stats["retries"], stats["errors"]) == (2, 1024, 2, 1)
+    assert stats["time_to_first_byte"]["count"] == 1
+
+
+def test_prometheus_export(tmp_path):
+    metrics = Metrics()
+    metrics.observe("fetch", 0.003)
+    metrics.observe("fetch", 7.0)
+    metrics.record_request("a.pl", 0.2, size=10)
+    metrics.export(json_file=str(tmp_path / "metrics.json"), prometheus_file=str(tmp_path / "metrics.prom"))
+
+    lines = (tmp_path / "metrics.prom").read_text(encoding="utf8").splitlines()
+    assert "# TYPE scraper_stage_seconds histogram" in lines
+    assert 'scraper_stage_seconds_bucket{stage="fetch",le="0.005"} 1' in lines
+    assert 'scraper_stage_seconds_bucket{stage="fetch",le="10.0"} 2' in lines
+    assert 'scraper_stage_seconds_bucket{stage="fetch",le="+Inf"} 2' in lines
+    assert 'scraper_stage_seconds_count{stage="fetch"} 2' in lines
+    assert 'scraper_downloaded_bytes_total{host="a.pl"} 10' in lines
+    assert not (tmp_path / "metrics.prom.tmp").exists()
+
+    summary = json.loads((tmp_path / "metrics.json").read_text(encoding="utf8"))
+    assert summary["stages"]["fetch"]["count"] == 2
+
+
+def test_timed_reports_the_function_name():
+    @timed()
+    def extract_price():
+        return 1
+
+    before = METRICS.stages["extract_price"].count if "extract_price" in METRICS.stages else 0
+    assert extract_price() == 1
+    assert METRICS.stages["extract_price"].count == before + 1
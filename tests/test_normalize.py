@@ -0,0 +1,69 @@
+import importlib
+import math
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+
+@pytest.fixture
+def project(site):
+    """Imports functions and normalize modules of a site project"""
+    def load(directory: str):
+        return site(directory), importlib.import_module("normalize")
+    return load
+
+
+def test_cars(project):
+    functions, normalize = project("cars")
+    frame = pd.DataFrame([["89900PLN", "2017", "148 000 km", "190 KM", "6,8 l/100km"],
+                          ["12 500 EUR", float("nan"), "", "", ""]],
+                         columns=["Cena", "Rok produkcji", "Przebieg", "Moc", "Spalanie W Mieście"])
+    normalized = normalize.normalize(frame)
+    assert normalized["price_value"].tolist() == [89900.0, 12500.0]
+    assert normalized["price_currency"].tolist() == ["PLN", "EUR"]
+    assert normalized["year"].tolist() == [2017, pd.NA]
+    assert normalized["mileage_km"][0] == 148000.0 and math.isnan(normalized["mileage_km"][1])
+    assert normalized["power_hp"][0] == 190
+    assert normalized["city_consumption_l_100km"][0] == 6.8
+    # original columns are kept
+    assert normalized["Cena"].tolist() == frame["Cena"].tolist()
+
+
+def test_housing(project):
+    functions, normalize = project("housing")
+    offers = [functions.Offer(*[("NA" if name != "id" else str(number)) for name in functions.OFFER_COLUMNS])
+              for number in range(3)]
+    offers[0].price, offers[0].area, offers[0].floor, offers[0].rooms = "650 000 zł", "52 m²", "parter", "3"
+    offers[1].floor, offers[1].year, offers[1].price = "2/4", "199", "Zapytaj o cenę"
+
+    frames = list(normalize.normalize_offers(offers, batch_size=2))
+    assert [len(frame) for frame in frames] == [2, 1]
+    frame = pd.concat(frames, ignore_index=True)
+    assert frame["price_value"][0] == 650000.0 and math.isnan(frame["price_value"][1])
+    assert frame["price_per_m2"][0] == 12500.0
+    assert frame["floor_number"].tolist()[:2] == [0, 2]
+    assert frame["rooms_count"][0] == 3
+    # implausible years are dropped
+    assert frame["year_built"].isna().all()
+
+
+def test_job_offers_salary_ranges(project):
+    functions, normalize = project("job_offers")
+    frame = pd.DataFrame({"salary": ["['15000–20000PLN', '12 000 – 16 000 PLN']", "['25000PLN']", "[]"]})
+    normalized = normalize.normalize(frame)
+    assert normalized["salary_min"][:2].tolist() == [12000.0, 25000.0]
+    assert normalized["salary_max"][:2].tolist() == [20000.0, 25000.0]
+    assert normalized["salary_currency"][0] == "PLN"
+    assert math.isnan(normalized["salary_min"][2])
+
+
+def test_file_is_normalized_in_chunks(project, tmp_path):
+    functions, normalize = project("cars")
+    source, destination = tmp_path / "cars.csv", tmp_path / "cars_normalized.csv"
+    rows = [[f"{price}PLN"] + [""] * (len(functions.OFFER_COLUMNS) - 1) for price in range(5)]
+    pd.DataFrame(rows, columns=functions.OFFER_COLUMNS).to_csv(source, index=False)
+
+    assert normalize.normalize_file(str(source), str(destination), chunksize=2) == 5
+    normalized = pd.read_csv(destination)
+    assert normalized["price_value"].tolist() == [0, 1, 2, 3, 4]
+    assert list(normalized.columns[:len(functions.OFFER_COLUMNS)]) == functions.OFFER_COLUMNS
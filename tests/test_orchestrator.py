@@ -0,0 +1,56 @@
+import csv
+from types import SimpleNamespace
+from scraper.orchestrator import Job, run_jobs
+from scraper.sinks import Column, open_sink
+
+COLUMNS = [Column("id"), Column("city")]
+OFFERS = {"warszawa": ["1", "2"], "krakow": ["2", "3"], "broken": None, "empty": []}
+
+
+def download_data(file_name, search_criteria, number_of_pages, pipeline=None, **options):
+    if OFFERS[search_criteria] is None:
+        raise RuntimeError("result page has changed")
+    columns = [Column("url")] if search_criteria == "other" else COLUMNS
+    with open_sink(file_name, columns) as sink:
+        for offer_id in OFFERS.get(search_criteria, ["4"]):
+            sink.write([offer_id, search_criteria][:len(columns)])
+
+
+SITE = SimpleNamespace(download_data=download_data, download_offer_page=lambda url: b"",
+                       parse_offer_page=lambda content: [], OUTPUT_COLUMNS=COLUMNS)
+
+
+def read(path):
+    with open(path, encoding="utf8", newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_failed_job_does_not_stop_the_others(tmp_path):
+    jobs = [Job(city, 1, str(tmp_path / f"{city}.csv")) for city in OFFERS]
+    failed = run_jobs(SITE, jobs, merged_file=str(tmp_path / "merged.csv"), key="id", parse_workers=0)
+    assert [job.search_criteria for job in failed] == ["broken"]
+    merged = read(tmp_path / "merged.csv")
+    assert merged[0] == ["id", "city"]
+    # offer 2 is found by both jobs, it is merged once
+    assert sorted(row[0] for row in merged[1:]) == ["1", "2", "3"]
+
+
+def test_jobs_without_merged_file(tmp_path):
+    jobs = [Job(city, 1, str(tmp_path / f"{city}.csv")) for city in ("warszawa", "krakow")]
+    assert run_jobs(SITE, jobs, parse_workers=0) == []
+    assert len(read(tmp_path / "krakow.csv")) == 3
+
+
+def test_empty_job_is_skipped_by_the_merge(tmp_path):
+    # jsonl files of jobs which found no offers are empty
+    jobs = [Job(city, 1, str(tmp_path / f"{city}.jsonl")) for city in ("empty", "warszawa")]
+    assert run_jobs(SITE, jobs, merged_file=str(tmp_path / "merged.csv"), key="id", parse_workers=0) == []
+    assert len(read(tmp_path / "merged.csv")) == 3
+
+
+def test_file_which_can_not_be_merged_fails_only_its_job(tmp_path):
+    jobs = [Job(city, 1, str(tmp_path / f"{city}.csv")) for city in ("other", "warszawa", "krakow")]
+    failed = run_jobs(SITE, jobs, merged_file=str(tmp_path / "merged.csv"), key="id", max_jobs=1,
+                      parse_workers=0)
+    assert [job.search_criteria for job in failed] == ["other"]
+    assert sorted(row[0] for row in read(tmp_path / "merged.csv")[1:]) == ["1", "2", "3"]
@@ -0,0 +1,58 @@
+import os
+import random
+import time
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from scraper.pipeline import Pipeline
+
+
+def fetch(url: int) -> int:
+    # later items are often downloaded first
+    time.sleep(random.uniform(0, 0.01))
+    return url
+
+
+def parse(content: int) -> int:
+    if content < 0:
+        raise ValueError(content)
+    return content * 10
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_results_keep_the_order_of_items(parse_workers):
+    with Pipeline(fetch, parse, io_workers=8, parse_workers=parse_workers) as pipeline:
+        assert list(pipeline.run(range(50))) == [(n, n * 10) for n in range(50)]
+
+
+def test_key_picks_the_downloaded_url():
+    with Pipeline(fetch, parse, io_workers=4, parse_workers=0) as pipeline:
+        items = [("page", n) for n in range(5)]
+        assert [result for _, result in pipeline.run(items, key=lambda item: item[1])] == [0, 10, 20, 30, 40]
+
+
+def test_errors_are_raised_in_the_consumer():
+    with Pipeline(fetch, parse, io_workers=4, parse_workers=0) as pipeline:
+        results = pipeline.run([1, 2, -3, 4])
+        assert [next(results), next(results)] == [(1, 10), (2, 20)]
+        with pytest.raises(ValueError):
+            next(results)
+
+
+def test_errors_of_single_items_can_be_returned():
+    with Pipeline(fetch, parse, io_workers=4, parse_workers=0) as pipeline:
+        results = list(pipeline.run([1, -2, 3], return_exceptions=True))
+    assert [item for item, _ in results] == [1, -2, 3]
+    assert isinstance(results[1][1], ValueError)
+    assert (results[0][1], results[2][1]) == (10, 30)
+
+
+def crash(content: int) -> int:
+    if content == 3:
+        os._exit(1)
+    return content
+
+
+def test_crashed_parser_process_is_raised_instead_of_waiting_forever():
+    with Pipeline(fetch, crash, io_workers=4, parse_workers=1) as pipeline:
+        with pytest.raises(BrokenProcessPool):
+            list(pipeline.run(range(20)))
@@ -0,0 +1,32 @@
+import time
+from scraper.seen import SeenIndex
+
+
+def test_unknown_offer_is_not_skipped(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite")) as seen:
+        assert not seen.should_skip("https://example.com/offer/1")
+
+
+def test_scraped_offer_is_skipped(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite")) as seen:
+        seen.add(["https://example.com/offer/1"])
+        assert seen.should_skip("https://example.com/offer/1")
+        assert not seen.should_skip("https://example.com/offer/2")
+
+
+def test_index_persists_between_runs(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite")) as seen:
+        seen.add(["1", "2"])
+    with SeenIndex(str(tmp_path / "seen.sqlite")) as seen:
+        assert seen.should_skip("1") and seen.should_skip("2")
+
+
+def test_old_offers_are_fetched_again(tmp_path):
+    with SeenIndex(str(tmp_path / "seen.sqlite")) as seen:
+        seen.add(["fresh"])
+        with seen.connection:
+            seen.connection.execute("INSERT INTO seen (offer_id, scraped_at) VALUES (?, ?)",
+                                    ("stale", time.time() - 10 * 24 * 3600))
+        assert seen.should_skip("fresh", refetch_after_days=7)
+        assert not seen.should_skip("stale", refetch_after_days=7)
+        assert seen.should_skip("stale")
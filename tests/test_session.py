@@ -0,0 +1,97 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+
+session = pytest.importorskip("scraper.session")
+from scraper.metrics import METRICS
+
+
+def closed_port() -> int:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        return listener.getsockname()[1]
+
+
+@pytest.fixture
+def quick_retries(monkeypatch):
+    monkeypatch.setattr(session, "RETRIES", 2)
+    monkeypatch.setattr(session, "BACKOFF_FACTOR", 0)
+
+
+@pytest.fixture
+def server():
+    """Local server answering with the queued statuses (200 once they run out)"""
+    statuses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{httpd.server_address[1]}", statuses
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired, self.outcomes = 0, []
+
+    def acquire(self) -> None:
+        self.acquired += 1
+
+    def release(self, latency: float, healthy: bool) -> None:
+        self.outcomes.append(healthy)
+
+
+def test_retries_of_failed_requests_are_recorded(quick_retries):
+    METRICS.reset()
+    host = f"127.0.0.1:{closed_port()}"
+
+    with pytest.raises(session.requests.ConnectionError):
+        session.fetch(f"http://{host}/offer", timeout=1)
+
+    stats = METRICS.hosts[host]
+    assert (stats.requests, stats.retries, stats.errors) == (1, 2, 1)
+
+
+def test_every_retry_waits_for_the_host_limiter(quick_retries, server, monkeypatch):
+    host, statuses = server
+    statuses.extend([503, 429])
+    limiter = CountingLimiter()
+    monkeypatch.setattr(session, "SCHEDULER", SimpleNamespace(limiter=lambda url: limiter))
+    METRICS.reset()
+
+    response = session.fetch(f"http://{host}/offer")
+    assert response.status_code == 200
+    assert limiter.acquired == 3
+    # throttled attempts slow the host down
+    assert limiter.outcomes == [False, False, True]
+    assert METRICS.hosts[host].retries == 2
+
+
+def test_last_response_is_returned_when_retries_are_exhausted(quick_retries, server, monkeypatch):
+    host, statuses = server
+    statuses.extend([500] * 5)
+    limiter = CountingLimiter()
+    monkeypatch.setattr(session, "SCHEDULER", SimpleNamespace(limiter=lambda url: limiter))
+
+    assert session.fetch(f"http://{host}/offer").status_code == 500
+    assert limiter.acquired == 3
+
+
+def test_retry_after_of_throttling_response_is_respected():
+    throttled = SimpleNamespace(headers={"Retry-After": "7"})
+    assert session.retry_delay(throttled, 1) == 7
+    assert session.retry_delay(SimpleNamespace(headers={"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"}), 2) == \
+        2 * session.BACKOFF_FACTOR
+    assert session.retry_delay(None, 3) == 4 * session.BACKOFF_FACTOR
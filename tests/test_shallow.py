@@ -0,0 +1,67 @@
+import csv
+import json
+from types import SimpleNamespace
+import pytest
+
+ITEM = {"slug": "mieszkanie-3-pokoje-ID4abc", "title": "Mieszkanie 3 pokoje",
+        "totalPrice": {"value": 650000, "currency": "PLN"}, "rentPrice": None,
+        "location": {"address": {"city": {"name": "Warszawa"}, "street": {"name": "Puławska", "number": "12"}},
+                     "reverseGeocoding": {"locations": [{"locationLevel": "district", "name": "Mokotów"}]}},
+        "areaInSquareMeters": 52.5, "roomsNumber": "THREE", "floorNumber": "GROUND", "isPrivateOwner": True}
+
+LISTING = """<li class="css-p74l73 es62z2j17"><a href="/pl/oferta/mieszkanie-ID4xyz">
+<div class="css-jeloly es62z2j12">Kawalerka</div><span class="css-rmqm02 eclomwz0">400 000 zł</span>
+<p><span class="css-17o293g es62z2j9">Kraków, Krowodrza, ul. Wrocławska</span></p></a></li>"""
+
+
+def next_data_page(items: list) -> bytes:
+    data = {"props": {"pageProps": {"data": {"searchAds": {"items": items}}}}}
+    return f'<html><script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></html>'.encode()
+
+
+@pytest.fixture
+def housing(site, monkeypatch):
+    functions = site("housing")
+    pages = {}
+    # result pages after the last one have no listings
+    monkeypatch.setattr(functions, "get_page",
+                        lambda url, **kwargs: SimpleNamespace(content=pages.get(url, next_data_page([]))))
+    return functions, pages
+
+
+def test_listing_is_read_from_next_data(housing):
+    functions, pages = housing
+    pages["https://results/1"] = next_data_page([ITEM, {"title": "listing without slug"}])
+    [(offer_url, (main_info, location_info, offer_id, details))] = functions.get_listing_data("https://results/1")
+    assert offer_url == "https://www.otodom.pl/pl/oferta/mieszkanie-3-pokoje-ID4abc"
+    assert main_info == {"Tytuł": "Mieszkanie 3 pokoje", "Cena": "650 000 zł"}
+    assert location_info == {"Miasto": "Warszawa", "Dzielnica": "Mokotów", "Ulica": "Puławska 12"}
+    assert details == {"Powierzchnia": "52,5 m²", "Liczba pokoi": "3", "Piętro": "parter",
+                       "Typ ogłoszeniodawcy": "prywatny"}
+
+
+def test_page_without_next_data_falls_back_to_css(housing):
+    functions, pages = housing
+    pages["https://results/1"] = f"<html><ul>{LISTING}</ul></html>".encode()
+    [(offer_url, (main_info, location_info, offer_id, details))] = functions.get_listing_data("https://results/1")
+    assert offer_url.endswith("/pl/oferta/mieszkanie-ID4xyz")
+    assert main_info["Cena"] == "400 000 zł"
+    assert details == {}
+
+
+def test_shallow_download_does_not_fetch_offer_pages(housing, tmp_path, monkeypatch):
+    functions, pages = housing
+    from elements import MarketType, SearchCriteria
+    pages[SearchCriteria(MarketType.SECONDARY, "warszawa", 24).generate_url(1)] = next_data_page([ITEM])
+
+    def download_offer_page(offer_url):
+        raise AssertionError("offer page downloaded in shallow mode")
+
+    monkeypatch.setattr(functions, "download_offer_page", download_offer_page)
+    file_name = str(tmp_path / "offers.csv")
+    functions.download_data(file_name, [MarketType.SECONDARY, "warszawa", 24], 2, shallow=True)
+    with open(file_name, encoding="utf8", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 1
+    assert rows[0]["price"] == "650 000 zł"
+    assert rows[0]["area"] == "52,5 m²"
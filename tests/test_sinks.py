@@ -0,0 +1,87 @@
+import csv
+import gzip
+import json
+import pytest
+from scraper.sinks import Column, CsvSink, JsonlSink, Sink, open_sink
+
+COLUMNS = [Column("id"), Column("price"), Column("tags", "list")]
+ROWS = [["1", 100.0, ["a", "b"]], ["2", float("nan"), []]]
+
+
+def write(path, rows=ROWS, **kwargs):
+    with open_sink(str(path), COLUMNS, **kwargs) as sink:
+        for row in rows:
+            sink.write(row)
+
+
+def test_sink_is_picked_by_extension(tmp_path):
+    with open_sink(str(tmp_path / "offers.csv.gz"), COLUMNS) as sink:
+        assert isinstance(sink, CsvSink)
+    with open_sink(str(tmp_path / "offers.jsonl"), COLUMNS) as sink:
+        assert isinstance(sink, JsonlSink)
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "offers.xlsx"), COLUMNS)
+
+
+def test_csv_gz(tmp_path):
+    write(tmp_path / "offers.csv.gz")
+    with gzip.open(tmp_path / "offers.csv.gz", "rt", encoding="utf8", newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["id", "price", "tags"]
+    assert rows[1] == ["1", "100.0", "['a', 'b']"]
+    assert len(rows) == 3
+
+
+def test_csv_append_does_not_repeat_the_header(tmp_path):
+    write(tmp_path / "offers.csv", ROWS[:1])
+    write(tmp_path / "offers.csv", ROWS[1:], append=True)
+    with open(tmp_path / "offers.csv", encoding="utf8", newline="") as file:
+        rows = list(csv.reader(file))
+    assert [row[0] for row in rows] == ["id", "1", "2"]
+
+
+def test_jsonl_gz_keeps_lists_and_nulls(tmp_path):
+    write(tmp_path / "offers.jsonl.gz")
+    with gzip.open(tmp_path / "offers.jsonl.gz", "rt", encoding="utf8") as file:
+        records = [json.loads(line) for line in file]
+    assert records == [{"id": "1", "price": 100.0, "tags": ["a", "b"]}, {"id": "2", "price": None, "tags": []}]
+
+
+def test_parquet_is_typed(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    write(tmp_path / "offers.parquet", batch_size=1)
+    file = pq.ParquetFile(tmp_path / "offers.parquet")
+    assert file.num_row_groups == 2
+    table = file.read()
+    assert table.schema.field("tags").type.value_type == "string"
+    assert table.to_pylist() == [{"id": "1", "price": "100.0", "tags": ["a", "b"]},
+                                 {"id": "2", "price": None, "tags": []}]
+
+
+def test_parquet_cannot_be_appended(tmp_path):
+    pytest.importorskip("pyarrow")
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "offers.parquet"), COLUMNS, append=True)
+
+
+def test_on_flush_is_called_once_rows_are_written(tmp_path):
+    path = tmp_path / "offers.jsonl"
+    flushed = []
+
+    def on_flush():
+        with open(path, encoding="utf8") as file:
+            flushed.append(len(file.readlines()))
+
+    with open_sink(str(path), COLUMNS, batch_size=2, on_flush=on_flush) as sink:
+        for row in ROWS + ROWS[:1]:
+            sink.write(row)
+        assert flushed == [2]
+    assert flushed == [2, 3]
+
+
+def test_formats_have_to_implement_batch_writes(tmp_path):
+    class IncompleteSink(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteSink(str(tmp_path / "offers.txt"), COLUMNS)